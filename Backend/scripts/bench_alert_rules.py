@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark de l'évaluation des règles d'alerte
+
+Compare, pour un capteur portant de nombreuses règles de seuil, le
+parcours de toutes les règles à chaque mesure et l'index trié qui ne
+retourne que les règles franchies depuis la mesure précédente.
+
+Mesure ensuite le débit (mesures par seconde sur un cœur) de la machine
+d'états sur des règles surveillées, simples et composites, avec les
+règles compilées et avec l'interprétation de la condition à chaque appel.
+
+Usage:
+    python scripts/bench_alert_rules.py [--rules 10000] [--readings 10000] [--watched 200]
+"""
+
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from shared.models.alert import Alerte
+from services.alert_service.services.rule_index import OPERATORS, CompositeRule, Rule, RuleIndex, Term
+from services.alert_service.services.rule_state import OK_STATE, step
+
+
+def _recovered(condition: str, seuil: float, hysteresis: float, valeur: float) -> bool:
+    """La condition est fausse même décalée de l'hystérésis, sans règle compilée"""
+    if condition == "eq":
+        return abs(valeur - seuil) > hysteresis
+    shift = -hysteresis if condition in ("gt", "gte") else hysteresis
+    return not OPERATORS[condition](valeur, seuil + shift)
+
+
+class InterpretedRule:
+    """Règle sans compilation : condition recherchée à chaque évaluation"""
+
+    def __init__(self, rule: Rule):
+        self.condition, self.seuil = rule.condition, rule.seuil
+        self.hysteresis, self.duree_minimale = rule.hysteresis, rule.duree_minimale
+
+    def matches(self, valeur: float) -> bool:
+        return OPERATORS[self.condition](valeur, self.seuil)
+
+    def recovered(self, valeur: float) -> bool:
+        return _recovered(self.condition, self.seuil, self.hysteresis, valeur)
+
+
+class InterpretedComposite:
+    def __init__(self, rule: CompositeRule):
+        self.terms, self.combinaison = rule.terms, rule.combinaison
+        self.hysteresis, self.duree_minimale = rule.hysteresis, rule.duree_minimale
+
+    def _combine(self, results) -> bool:
+        return all(results) if self.combinaison == "and" else any(results)
+
+    def matches(self, valeurs) -> bool:
+        return self._combine(OPERATORS[t.condition](v, t.seuil) for t, v in zip(self.terms, valeurs))
+
+    def recovered(self, valeurs) -> bool:
+        return not self._combine(
+            not _recovered(t.condition, t.seuil, self.hysteresis, v) for t, v in zip(self.terms, valeurs)
+        )
+
+
+def build_index(rules: int, rng: random.Random) -> RuleIndex:
+    index = RuleIndex()
+    index.load(
+        Alerte(
+            id=i, nom=f"regle {i}", capteur_id=1,
+            condition=rng.choice(["lt", "lte", "gte", "gt"]), seuil=round(rng.uniform(0, 100), 1),
+        )
+        for i in range(1, rules + 1)
+    )
+    return index
+
+
+def readings(count: int, rng: random.Random):
+    """Marche aléatoire : une mesure reste proche de la précédente"""
+    valeur = 50.0
+    for _ in range(count):
+        valeur = min(100.0, max(0.0, valeur + rng.gauss(0, 0.5)))
+        yield valeur
+
+
+def bench_scan(index: RuleIndex, values) -> tuple:
+    rules = index.rules(1)
+    firing = set()
+    transitions = 0
+    start = time.perf_counter()
+    for valeur in values:
+        for rule in rules:
+            active = rule.matches(valeur)
+            if active != (rule.id in firing):
+                transitions += 1
+                (firing.add if active else firing.discard)(rule.id)
+    return time.perf_counter() - start, transitions
+
+
+def bench_sorted(index: RuleIndex, values) -> tuple:
+    transitions = 0
+    previous = None
+    start = time.perf_counter()
+    for valeur in values:
+        if previous is None:
+            transitions += len(index.evaluate(1, valeur))
+        else:
+            activated, deactivated = index.transitions(1, previous, valeur)
+            transitions += len(activated) + len(deactivated)
+        previous = valeur
+    return time.perf_counter() - start, transitions
+
+
+def watched_rules(count: int, rng: random.Random) -> list:
+    """Règles surveillées : un quart composites sur deux conditions"""
+    conditions = ["lt", "lte", "eq", "gte", "gt"]
+    rules = []
+    for i in range(count):
+        hysteresis = rng.choice([0.0, 1.0])
+        if i % 4 == 0:
+            terms = [Term(1, rng.choice(conditions), rng.uniform(40, 60)),
+                     Term(2, rng.choice(conditions), rng.uniform(40, 60), "avg", 300)]
+            rules.append(CompositeRule(i, 1, f"r{i}", terms, rng.choice(["and", "or"]), hysteresis))
+        else:
+            rules.append(Rule(i, 1, f"r{i}", rng.choice(conditions), rng.uniform(40, 60), hysteresis))
+    return rules
+
+
+def bench_states(rules: list, values) -> tuple:
+    """Une mesure fait avancer la machine d'états de chaque règle ; retourne (durée, états finaux)"""
+    states = [OK_STATE] * len(rules)
+    composite = [isinstance(rule, (CompositeRule, InterpretedComposite)) for rule in rules]
+    t0 = datetime(2024, 6, 1)
+    start = time.perf_counter()
+    for n, valeur in enumerate(values):
+        horodatage = t0 + timedelta(seconds=n)
+        pair = (valeur, 100.0 - valeur)
+        for i, rule in enumerate(rules):
+            states[i] = step(rule, states[i], pair if composite[i] else valeur, horodatage)
+    return time.perf_counter() - start, states
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark de l'index des règles d'alerte")
+    parser.add_argument("--rules", type=int, default=10000, help="Nombre de règles sur le capteur")
+    parser.add_argument("--readings", type=int, default=10000, help="Nombre de mesures évaluées")
+    parser.add_argument("--watched", type=int, default=200, help="Règles surveillées par mesure (machine d'états)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    index = build_index(args.rules, rng)
+    values = list(readings(args.readings, rng))
+    index.evaluate(1, values[0])  # construction des tableaux triés hors mesure
+
+    scan_time, scan_transitions = bench_scan(index, values)
+    sorted_time, sorted_transitions = bench_sorted(index, values)
+    if scan_transitions != sorted_transitions:
+        print(f"❌ Résultats différents: {scan_transitions} / {sorted_transitions} transitions")
+        sys.exit(1)
+
+    print(f"{args.rules} règles, {args.readings} mesures, {scan_transitions} transitions")
+    for label, elapsed in (("Parcours complet", scan_time), ("Index trié", sorted_time)):
+        print(f"  {label:<18} {elapsed * 1e6 / args.readings:10.1f} µs/mesure")
+    print(f"  Gain               {scan_time / sorted_time:10.1f}x")
+
+    compiled = watched_rules(args.watched, rng)
+    interpreted = [
+        InterpretedComposite(rule) if isinstance(rule, CompositeRule) else InterpretedRule(rule) for rule in compiled
+    ]
+    interpreted_time, interpreted_states = bench_states(interpreted, values)
+    compiled_time, compiled_states = bench_states(compiled, values)
+    if interpreted_states != compiled_states:
+        print("❌ États différents entre règles compilées et interprétées")
+        sys.exit(1)
+
+    print(f"{args.watched} règles surveillées par mesure (machine d'états, un cœur)")
+    for label, elapsed in (("Interprétées", interpreted_time), ("Compilées", compiled_time)):
+        print(f"  {label:<18} {args.readings / elapsed:10.0f} mesures/s")
+    print(f"  Gain               {interpreted_time / compiled_time:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Conseiller d'index PostgreSQL
+
+Lit pg_stat_user_indexes et pg_stat_statements pour signaler les index
+inutilisés ou redondants, en priorité sur les tables très sollicitées en
+écriture où chaque index ralentit l'ingestion. N'exécute rien : les
+DROP INDEX proposés sont à relire avant application. Ils sont en
+CONCURRENTLY sauf sur une table partitionnée ou une hypertable, où
+PostgreSQL le refuse (la suppression verrouille alors la table).
+
+Usage:
+    python scripts/index_advisor.py [--min-size-kb 0] [--top 10] [--json]
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, text
+
+from shared.config import get_settings
+from shared.utils.partitioning import has_timescaledb
+
+# Les index des partitions sont rattachés à l'index de la table parente
+INDEX_STATS = """
+    WITH idx AS (
+        SELECT
+            COALESCE(parent_idx.relid, s.indexrelid) AS indexrelid,
+            s.idx_scan,
+            pg_relation_size(s.indexrelid) AS size
+        FROM pg_stat_user_indexes s
+        LEFT JOIN LATERAL (
+            SELECT i.inhparent AS relid FROM pg_inherits i WHERE i.inhrelid = s.indexrelid
+        ) parent_idx ON true
+    )
+    SELECT
+        t.relname AS table_name,
+        c.relname AS index_name,
+        SUM(idx.idx_scan) AS scans,
+        SUM(idx.size) AS size,
+        ix.indisprimary AS is_primary,
+        ix.indisunique AS is_unique,
+        ix.indpred IS NOT NULL OR ix.indexprs IS NOT NULL AS is_partial,
+        ix.indkey::text AS keys,
+        ix.indoption::text AS options,
+        t.relkind = 'p' AS on_partitioned,
+        pg_get_indexdef(ix.indexrelid) AS definition
+    FROM idx
+    JOIN pg_index ix ON ix.indexrelid = idx.indexrelid
+    JOIN pg_class c ON c.oid = ix.indexrelid
+    JOIN pg_class t ON t.oid = ix.indrelid
+    GROUP BY t.relname, t.relkind, c.relname, ix.indexrelid, ix.indisprimary, ix.indisunique,
+             ix.indpred, ix.indexprs, ix.indkey, ix.indoption
+    ORDER BY t.relname, c.relname
+"""
+
+TABLE_WRITES = """
+    SELECT
+        COALESCE(p.relname, s.relname) AS table_name,
+        SUM(s.n_tup_ins + s.n_tup_upd + s.n_tup_del) AS writes,
+        SUM(s.seq_scan + COALESCE(s.idx_scan, 0)) AS reads
+    FROM pg_stat_user_tables s
+    LEFT JOIN pg_inherits i ON i.inhrelid = s.relid
+    LEFT JOIN pg_class p ON p.oid = i.inhparent
+    GROUP BY COALESCE(p.relname, s.relname)
+    ORDER BY writes DESC
+"""
+
+STATEMENTS = """
+    SELECT query, calls, {total} AS total_ms, {mean} AS mean_ms, rows
+    FROM pg_stat_statements
+    WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+    ORDER BY {total} DESC
+    LIMIT :top
+"""
+
+
+def collect_indexes(conn):
+    """Statistiques d'utilisation des index (partitions agrégées)"""
+    return [dict(row._mapping) for row in conn.execute(text(INDEX_STATS))]
+
+
+def collect_writes(conn):
+    """Lignes écrites et lectures par table (partitions agrégées)"""
+    return {row.table_name: dict(row._mapping) for row in conn.execute(text(TABLE_WRITES))}
+
+
+def collect_hypertables(conn):
+    """Tables converties en hypertables TimescaleDB"""
+    if not has_timescaledb(conn):
+        return set()
+    return set(conn.execute(text("SELECT hypertable_name FROM timescaledb_information.hypertables")).scalars())
+
+
+def drop_statement(index, hypertables):
+    """DROP INDEX, en CONCURRENTLY quand la table l'accepte"""
+    concurrently = not index["on_partitioned"] and index["table_name"] not in hypertables
+    return f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}IF EXISTS {index['index_name']};"
+
+
+def collect_statements(conn, top):
+    """Requêtes les plus coûteuses, ou None si pg_stat_statements est absent"""
+    installed = conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'")).first()
+    if not installed:
+        return None
+    # PostgreSQL 13 a renommé total_time en total_exec_time
+    columns = {row[0] for row in conn.execute(text(
+        "SELECT attname FROM pg_attribute WHERE attrelid = 'pg_stat_statements'::regclass"
+    ))}
+    if "total_exec_time" in columns:
+        query = STATEMENTS.format(total="total_exec_time", mean="mean_exec_time")
+    else:
+        query = STATEMENTS.format(total="total_time", mean="mean_time")
+    try:
+        return [dict(row._mapping) for row in conn.execute(text(query), {"top": top})]
+    except Exception:
+        # Extension créée mais non chargée (shared_preload_libraries)
+        return None
+
+
+def _key(index):
+    """Colonnes et options de tri de l'index (ordre significatif)"""
+    return list(zip(index["keys"].split(), index["options"].split()))
+
+
+def find_unused(indexes, min_size):
+    """Index jamais parcourus depuis la dernière remise à zéro des statistiques"""
+    return [
+        index for index in indexes
+        if not index["scans"] and not index["is_primary"] and not index["is_unique"]
+        and index["size"] >= min_size
+    ]
+
+
+def find_redundant(indexes):
+    """Index dont les colonnes sont un préfixe d'un autre index de la même table"""
+    redundant = []
+    for index in indexes:
+        if index["is_primary"] or index["is_unique"] or index["is_partial"]:
+            continue
+        key = _key(index)
+        for other in indexes:
+            if other is index or other["table_name"] != index["table_name"] or other["is_partial"]:
+                continue
+            other_key = _key(other)
+            # À clé identique, on ne garde que le premier par nom
+            if other_key[:len(key)] == key and (
+                len(other_key) > len(key) or other["index_name"] < index["index_name"]
+            ):
+                redundant.append({**index, "covered_by": other["index_name"]})
+                break
+    return redundant
+
+
+def build_report(conn, min_size, top):
+    indexes = collect_indexes(conn)
+    writes = collect_writes(conn)
+    unused = find_unused(indexes, min_size)
+    redundant = find_redundant(indexes)
+    hypertables = collect_hypertables(conn)
+    # Un même index peut être inutilisé et redondant : une seule suppression
+    to_drop = {i["index_name"]: i for i in unused + redundant}
+    return {
+        "tables": list(writes.values()),
+        "unused": unused,
+        "redundant": redundant,
+        "statements": collect_statements(conn, top),
+        "drop": [
+            drop_statement(index, hypertables)
+            for name, index in sorted(
+                to_drop.items(), key=lambda item: -writes.get(item[1]["table_name"], {}).get("writes", 0)
+            )
+        ],
+    }
+
+
+def _size(nbytes):
+    return f"{nbytes / 1024 / 1024:.1f} Mo" if nbytes >= 1024 * 1024 else f"{nbytes / 1024:.0f} Ko"
+
+
+def print_report(report):
+    print("Tables les plus écrites :")
+    for table in report["tables"][:10]:
+        print(f"  {table['table_name']:<40} écritures={table['writes']:<12} lectures={table['reads']}")
+
+    print("\nIndex inutilisés (idx_scan = 0) :")
+    for index in report["unused"]:
+        print(f"  {index['table_name']}.{index['index_name']} ({_size(index['size'])})")
+    if not report["unused"]:
+        print("  aucun")
+
+    print("\nIndex redondants :")
+    for index in report["redundant"]:
+        print(f"  {index['table_name']}.{index['index_name']} couvert par {index['covered_by']}")
+    if not report["redundant"]:
+        print("  aucun")
+
+    print("\nRequêtes les plus coûteuses :")
+    if report["statements"] is None:
+        print("  pg_stat_statements indisponible")
+    for statement in report["statements"] or []:
+        query = " ".join(statement["query"].split())[:120]
+        print(f"  {statement['total_ms']:>12.0f} ms  {statement['calls']:>8} appels  {query}")
+
+    print("\nSuppressions proposées (à relire, les statistiques doivent couvrir une période représentative) :")
+    for statement in report["drop"]:
+        print(f"  {statement}")
+    if not report["drop"]:
+        print("  aucune")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Conseiller d'index PostgreSQL")
+    parser.add_argument("--min-size-kb", type=int, default=0, help="Taille minimale des index inutilisés signalés")
+    parser.add_argument("--top", type=int, default=10, help="Nombre de requêtes pg_stat_statements affichées")
+    parser.add_argument("--json", action="store_true", help="Sortie JSON")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    if not settings.database_url.startswith("postgresql"):
+        print("Le conseiller d'index nécessite PostgreSQL")
+        sys.exit(1)
+
+    engine = create_engine(settings.database_url)
+    with engine.connect() as conn:
+        report = build_report(conn, args.min_size_kb * 1024, args.top)
+
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,18 +4,29 @@ Alert Service GardenConnect
 from fastapi import FastAPI
 from fastapi.security import OAuth2PasswordBearer
 from contextlib import asynccontextmanager
+import asyncio
 import time
 from shared.config import get_settings
 from shared.database import init_db, close_db, check_database_connection
 from shared.schemas.common import HealthCheckResponse
 from services.alert_service.routes.alerts import router as alerts_router
+from services.alert_service.services.engine import alert_engine, run_incident_check, run_rule_reload
+from services.alert_service.services.notifications import notification_dispatcher
 
 settings = get_settings()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    background_tasks = [
+        asyncio.create_task(alert_engine.run()),
+        asyncio.create_task(run_rule_reload(alert_engine)),
+        asyncio.create_task(run_incident_check(alert_engine)),
+        asyncio.create_task(notification_dispatcher.run()),
+    ]
     yield
+    for task in background_tasks:
+        task.cancel()
     await close_db()
 
 # Configuration OAuth2 pour pointer vers le service d'auth
@@ -44,6 +55,11 @@ async def health_check():
         database=await check_database_connection(),
     )
 
+@app.get("/engine")
+async def engine_status():
+    """Compteurs du moteur d'évaluation"""
+    return {**alert_engine.summary(), **alert_engine.stats, "notifications": notification_dispatcher.stats}
+
 @app.get("/")
 async def root():
     return {"service": "GardenConnect Alert Service", "version": "1.0.0"}
@@ -2,16 +2,113 @@
 Routes pour les alertes
 """
 
-from fastapi import APIRouter
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from sqlmodel import Session
+from shared.database import get_db
+from shared.schemas.alert import (
+    AlerteBacktestRequest,
+    AlerteBacktestResponse,
+    AlerteCreate,
+    AlerteListResponse,
+    AlerteResponse,
+    AlerteUpdate,
+    HistoriqueListResponse,
+    IncidentListResponse,
+)
+from shared.utils.auth import get_current_user
+from services.alert_service.services.alert_service import AlertService
 
 router = APIRouter()
 
-@router.get("/")
-async def get_alerts():
-    """Récupérer toutes les alertes"""
-    return {"alerts": []}
+@router.get("/", response_model=AlerteListResponse)
+async def get_alerts(
+    capteur_id: Optional[int] = Query(None),
+    est_active: Optional[bool] = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """Récupérer les alertes configurées"""
+    service = AlertService(db)
+    return await service.get_alerts(capteur_id, est_active, limit, offset)
 
-@router.post("/")
-async def create_alert():
+@router.post("/", response_model=AlerteResponse)
+async def create_alert(alert_data: AlerteCreate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
     """Créer une nouvelle alerte"""
-    return {"message": "Alert created"}
\ No newline at end of file
+    service = AlertService(db)
+    return await service.create_alert(alert_data)
+
+@router.post("/backtest", response_model=AlerteBacktestResponse)
+async def backtest_rule(rule: AlerteBacktestRequest, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    """Rejouer une règle sur l'historique de son capteur, sans la créer"""
+    service = AlertService(db)
+    return await service.backtest_rule(rule)
+
+@router.get("/historique", response_model=HistoriqueListResponse)
+async def get_history(
+    statut: Optional[str] = Query(None, pattern=r'^(active|resolue)$'),
+    after: Optional[str] = Query(None, description="Curseur : next_cursor de la page précédente"),
+    per_page: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """Déclenchements de toutes les alertes, du plus récent au plus ancien"""
+    service = AlertService(db)
+    return await service.get_history(None, statut, after, per_page)
+
+@router.get("/incidents", response_model=IncidentListResponse)
+async def get_incidents(
+    espace_id: Optional[int] = Query(None),
+    statut: Optional[str] = Query(None, pattern=r'^(ouvert|resolu)$'),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """Incidents : déclenchements regroupés par espace, notifiés une seule fois"""
+    service = AlertService(db)
+    return await service.get_incidents(espace_id, statut, limit, offset)
+
+@router.get("/{alert_id}", response_model=AlerteResponse)
+async def get_alert(alert_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    service = AlertService(db)
+    return await service.get_alert(alert_id)
+
+@router.put("/{alert_id}", response_model=AlerteResponse)
+async def update_alert(alert_id: int, alert_data: AlerteUpdate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    service = AlertService(db)
+    return await service.update_alert(alert_id, alert_data)
+
+@router.delete("/{alert_id}")
+async def delete_alert(alert_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    service = AlertService(db)
+    return await service.delete_alert(alert_id)
+
+@router.get("/{alert_id}/historique", response_model=HistoriqueListResponse)
+async def get_alert_history(
+    alert_id: int,
+    statut: Optional[str] = Query(None, pattern=r'^(active|resolue)$'),
+    after: Optional[str] = Query(None, description="Curseur : next_cursor de la page précédente"),
+    per_page: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """Déclenchements d'une alerte, du plus récent au plus ancien"""
+    service = AlertService(db)
+    await service.get_alert(alert_id)
+    return await service.get_history(alert_id, statut, after, per_page)
+
+@router.get("/{alert_id}/backtest", response_model=AlerteBacktestResponse)
+async def backtest_alert(
+    alert_id: int,
+    date_debut: Optional[datetime] = Query(None),
+    date_fin: Optional[datetime] = Query(None),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """Déclenchements qu'aurait produits une alerte sur la période (12 derniers mois par défaut)"""
+    service = AlertService(db)
+    return await service.backtest_alert(alert_id, date_debut, date_fin)
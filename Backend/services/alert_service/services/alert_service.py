@@ -0,0 +1,296 @@
+"""Service alerts"""
+from datetime import datetime, timedelta
+from typing import Optional
+import numpy as np
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from sqlmodel import Session, func, select
+from shared.config import get_alert_settings
+from shared.models.alert import Alerte, ConditionAlerte, HistoriqueAlerte, Incident
+from shared.models.node import NoeudArduino
+from shared.models.sensor import Capteur
+from shared.models.space import Espace
+from shared.schemas.alert import (
+    AlerteBacktestRequest,
+    AlerteBacktestResponse,
+    AlerteCreate,
+    AlerteListResponse,
+    AlerteResponse,
+    AlerteUpdate,
+    AlerteWithDetails,
+    HistoriqueAlerteResponse,
+    HistoriqueAlerteWithDetails,
+    HistoriqueListResponse,
+    IncidentListResponse,
+    IncidentResponse,
+    IntervalleBacktest,
+)
+from shared.utils.block_store import sensor_series
+from shared.utils.exceptions import ResourceNotFoundException, ValidationException, handle_database_error
+from shared.utils.series import from_us, to_us
+from shared.utils.space_counters import apply_counter_delta, sensor_space_id
+from services.alert_service.services.backtest import replay, window_values
+from services.alert_service.services.engine import notify_rule_change
+
+settings = get_alert_settings()
+
+
+def encode_cursor(declenchee_a: datetime, historique_id: int) -> str:
+    return f"{declenchee_a.isoformat()}_{historique_id}"
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        declenchee_a, historique_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(declenchee_a), int(historique_id)
+    except ValueError:
+        raise ValidationException("Curseur invalide", "after")
+
+
+class AlertService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _check_terms(self, alerte: Alerte):
+        """Capteurs existants, fenêtres cohérentes, combinaison des alertes composites"""
+        for term in [alerte, *alerte.conditions]:
+            if not self.db.get(Capteur, term.capteur_id):
+                raise ResourceNotFoundException("Capteur", term.capteur_id)
+            if (term.agregation is None) != (term.fenetre is None):
+                raise ValidationException("agregation et fenetre doivent être renseignées ensemble", "fenetre")
+            if term.fenetre is not None and term.fenetre > settings.alert_max_window:
+                raise ValidationException(f"Fenêtre maximale: {settings.alert_max_window} secondes", "fenetre")
+        if alerte.conditions and alerte.combinaison is None:
+            alerte.combinaison = "and"
+        self._check_parent(alerte)
+
+    def _check_parent(self, alerte: Alerte):
+        """Alerte parente existante, sans cycle"""
+        parent_id = alerte.alerte_parente_id
+        seen = set()
+        while parent_id is not None:
+            if parent_id == alerte.id or parent_id in seen:
+                raise ValidationException("Une alerte ne peut pas dépendre d'elle-même", "alerte_parente_id")
+            seen.add(parent_id)
+            parent = self.db.get(Alerte, parent_id)
+            if not parent:
+                raise ResourceNotFoundException("Alerte", parent_id)
+            parent_id = parent.alerte_parente_id
+
+    async def get_alerts(
+        self, capteur_id: Optional[int] = None, est_active: Optional[bool] = None, limit: int = 100, offset: int = 0
+    ) -> AlerteListResponse:
+        filters = []
+        if capteur_id is not None:
+            filters.append(Alerte.capteur_id == capteur_id)
+        if est_active is not None:
+            filters.append(Alerte.est_active == est_active)
+        total = self.db.execute(select(func.count()).select_from(Alerte).where(*filters)).scalar_one()
+        # Noms du capteur, du nœud et de l'espace par jointure, conditions en une requête
+        rows = self.db.execute(
+            select(Alerte, Capteur.nom, Capteur.type, Capteur.unite_mesure, NoeudArduino.nom, Espace.nom)
+            .join(Capteur, Capteur.id == Alerte.capteur_id)
+            .join(NoeudArduino, NoeudArduino.id == Capteur.noeud_id)
+            .join(Espace, Espace.id == NoeudArduino.espace_id)
+            .options(selectinload(Alerte.conditions))
+            .where(*filters).order_by(Alerte.id).offset(offset).limit(limit)
+        ).all()
+        return AlerteListResponse(
+            alertes=[
+                AlerteWithDetails(
+                    **AlerteResponse.from_orm(alerte).dict(),
+                    capteur_nom=capteur_nom, capteur_type=capteur_type, capteur_unite=capteur_unite,
+                    noeud_nom=noeud_nom, espace_nom=espace_nom,
+                )
+                for alerte, capteur_nom, capteur_type, capteur_unite, noeud_nom, espace_nom in rows
+            ],
+            total=total,
+            page=offset // limit + 1,
+            per_page=limit,
+        )
+
+    async def get_history(
+        self, alerte_id: Optional[int] = None, statut: Optional[str] = None,
+        after: Optional[str] = None, per_page: int = 50,
+    ) -> HistoriqueListResponse:
+        """
+        Déclenchements du plus récent au plus ancien, par pagination sur
+        curseur (declenchee_a, id) : chaque page parcourt l'index sur
+        declenchee_a à partir du curseur, quel que soit le rang de la page.
+        Les noms affichés viennent de la même requête, par jointure.
+        """
+        query = (
+            select(HistoriqueAlerte, Alerte.nom, Capteur.nom, Capteur.type, NoeudArduino.nom, Espace.nom)
+            .join(Alerte, Alerte.id == HistoriqueAlerte.alerte_id)
+            .join(Capteur, Capteur.id == Alerte.capteur_id)
+            .join(NoeudArduino, NoeudArduino.id == Capteur.noeud_id)
+            .join(Espace, Espace.id == NoeudArduino.espace_id)
+        )
+        if alerte_id is not None:
+            query = query.where(HistoriqueAlerte.alerte_id == alerte_id)
+        if statut is not None:
+            query = query.where(HistoriqueAlerte.statut == statut)
+        if after is not None:
+            declenchee_a, historique_id = decode_cursor(after)
+            # Borne déclenchee_a <= curseur exploitable par l'index, égalités départagées par id
+            query = query.where(
+                HistoriqueAlerte.declenchee_a <= declenchee_a,
+                or_(HistoriqueAlerte.declenchee_a < declenchee_a, HistoriqueAlerte.id < historique_id),
+            )
+
+        rows = self.db.execute(
+            query.order_by(HistoriqueAlerte.declenchee_a.desc(), HistoriqueAlerte.id.desc()).limit(per_page + 1)
+        ).all()
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        last = rows[-1][0] if rows else None
+        return HistoriqueListResponse(
+            historique=[
+                HistoriqueAlerteWithDetails(
+                    **HistoriqueAlerteResponse.from_orm(historique).dict(),
+                    alerte_nom=alerte_nom, capteur_nom=capteur_nom, capteur_type=capteur_type,
+                    noeud_nom=noeud_nom, espace_nom=espace_nom,
+                )
+                for historique, alerte_nom, capteur_nom, capteur_type, noeud_nom, espace_nom in rows
+            ],
+            per_page=per_page,
+            next_cursor=encode_cursor(last.declenchee_a, last.id) if has_next else None,
+        )
+
+    async def get_incidents(
+        self, espace_id: Optional[int] = None, statut: Optional[str] = None, limit: int = 100, offset: int = 0
+    ) -> IncidentListResponse:
+        filters = []
+        if espace_id is not None:
+            filters.append(Incident.espace_id == espace_id)
+        if statut is not None:
+            filters.append(Incident.statut == statut)
+        total = self.db.execute(select(func.count()).select_from(Incident).where(*filters)).scalar_one()
+        incidents = self.db.execute(
+            select(Incident).where(*filters).order_by(Incident.debut.desc(), Incident.id.desc())
+            .offset(offset).limit(limit)
+        ).scalars().all()
+        return IncidentListResponse(
+            incidents=[IncidentResponse.from_orm(incident) for incident in incidents],
+            total=total,
+            page=offset // limit + 1,
+            per_page=limit,
+        )
+
+    async def get_alert(self, alert_id: int) -> Alerte:
+        alerte = self.db.get(Alerte, alert_id)
+        if not alerte:
+            raise ResourceNotFoundException("Alerte", alert_id)
+        return alerte
+
+    async def create_alert(self, alert_data: AlerteCreate) -> Alerte:
+        alerte = Alerte(**alert_data.dict(exclude={"conditions"}))
+        alerte.conditions = [ConditionAlerte(**condition.dict()) for condition in alert_data.conditions]
+        self._check_terms(alerte)
+        self.db.add(alerte)
+        if alerte.est_active:
+            apply_counter_delta(self.db, sensor_space_id(self.db, alerte.capteur_id), alertes_actives=1)
+        self.db.commit()
+        self.db.refresh(alerte)
+        await notify_rule_change(alerte.id)
+        return alerte
+
+    async def update_alert(self, alert_id: int, alert_data: AlerteUpdate) -> Alerte:
+        alerte = await self.get_alert(alert_id)
+        update_data = alert_data.dict(exclude_unset=True)
+        conditions = update_data.pop("conditions", None)
+        toggled = update_data.get("est_active", alerte.est_active) != alerte.est_active
+        for field, value in update_data.items():
+            setattr(alerte, field, value)
+        if conditions is not None:
+            alerte.conditions = [ConditionAlerte(**condition) for condition in conditions]
+        self._check_terms(alerte)
+        if toggled:
+            delta = 1 if alerte.est_active else -1
+            apply_counter_delta(self.db, sensor_space_id(self.db, alerte.capteur_id), alertes_actives=delta)
+        alerte.date_modification = datetime.utcnow()
+        self.db.commit()
+        self.db.refresh(alerte)
+        await notify_rule_change(alerte.id)
+        return alerte
+
+    async def delete_alert(self, alert_id: int):
+        alerte = await self.get_alert(alert_id)
+        if alerte.est_active:
+            apply_counter_delta(self.db, sensor_space_id(self.db, alerte.capteur_id), alertes_actives=-1)
+        self.db.delete(alerte)
+        try:
+            self.db.commit()
+        except IntegrityError as e:
+            self.db.rollback()
+            raise handle_database_error(e)
+        await notify_rule_change(alert_id)
+        return {"message": "Alerte supprimée"}
+
+    async def backtest_alert(
+        self, alert_id: int, date_debut: Optional[datetime] = None, date_fin: Optional[datetime] = None
+    ) -> AlerteBacktestResponse:
+        alerte = await self.get_alert(alert_id)
+        if alerte.conditions:
+            raise ValidationException("Rejeu limité aux règles portant sur un seul capteur", "conditions")
+        return self._backtest(alerte, alerte.hysteresis, alerte.duree_minimale, date_debut, date_fin)
+
+    async def backtest_rule(self, rule: AlerteBacktestRequest) -> AlerteBacktestResponse:
+        if not self.db.get(Capteur, rule.capteur_id):
+            raise ResourceNotFoundException("Capteur", rule.capteur_id)
+        if rule.fenetre is not None and rule.fenetre > settings.alert_max_window:
+            raise ValidationException(f"Fenêtre maximale: {settings.alert_max_window} secondes", "fenetre")
+        return self._backtest(rule, rule.hysteresis, rule.duree_minimale, rule.date_debut, rule.date_fin)
+
+    def _backtest(
+        self, term, hysteresis: float, duree_minimale: int, date_debut: Optional[datetime], date_fin: Optional[datetime]
+    ) -> AlerteBacktestResponse:
+        """
+        Rejouer une règle sur ``[date_debut, date_fin)``. L'historique est lu
+        par tranches en tableaux NumPy, précédé d'une fenêtre pour amorcer les
+        agrégats glissants ; rien n'est écrit dans historique_alertes.
+        """
+        date_fin = date_fin or datetime.utcnow()
+        date_debut = date_debut or date_fin - timedelta(days=settings.alert_backtest_max_days)
+        if date_debut >= date_fin:
+            raise ValidationException("date_debut doit précéder date_fin", "date_debut")
+        if date_fin - date_debut > timedelta(days=settings.alert_backtest_max_days):
+            raise ValidationException(f"Période maximale: {settings.alert_backtest_max_days} jours", "date_debut")
+
+        load_start = date_debut - timedelta(seconds=term.fenetre or 0)
+        chunk = timedelta(days=settings.alert_backtest_chunk_days)
+        parts_ts, parts_valeurs = [], []
+        cursor = load_start
+        while cursor < date_fin:
+            chunk_end = min(cursor + chunk, date_fin)
+            series = sensor_series(self.db, term.capteur_id, cursor, chunk_end)
+            if series is not None:
+                parts_ts.append(series[1])
+                parts_valeurs.append(series[2])
+            cursor = chunk_end
+        ts = np.concatenate(parts_ts) if parts_ts else np.empty(0, dtype=np.int64)
+        valeurs = np.concatenate(parts_valeurs) if parts_valeurs else np.empty(0)
+
+        if term.agregation is not None and len(ts):
+            valeurs = window_values(ts, valeurs, term.agregation, term.fenetre, to_us(load_start))
+        evaluated = ts >= to_us(date_debut)
+        valeurs = np.where(evaluated, valeurs, np.nan)
+        starts, resolved = replay(ts, valeurs, term.condition, term.seuil, hysteresis or 0.0, duree_minimale or 0)
+
+        intervalles = [
+            IntervalleBacktest(declenchee_a=from_us(ts[start]), resolue_a=from_us(ts[end]) if end >= 0 else None)
+            for start, end in zip(starts, resolved)
+        ]
+        duree_active = sum(
+            ((intervalle.resolue_a or date_fin) - intervalle.declenchee_a).total_seconds() for intervalle in intervalles
+        )
+        return AlerteBacktestResponse(
+            capteur_id=term.capteur_id,
+            date_debut=date_debut,
+            date_fin=date_fin,
+            mesures=int(np.count_nonzero(evaluated & ~np.isnan(valeurs))),
+            declenchements=len(intervalles),
+            duree_active=duree_active,
+            intervalles=intervalles,
+        )
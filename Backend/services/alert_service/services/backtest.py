@@ -0,0 +1,99 @@
+"""Rejeu vectorisé d'une règle d'alerte sur l'historique d'un capteur"""
+from typing import Tuple
+
+import numpy as np
+
+from services.alert_service.services.rule_index import OPERATORS
+
+US = 10**6
+
+
+def matches_mask(condition: str, seuil: float, valeurs: np.ndarray) -> np.ndarray:
+    return OPERATORS[condition](valeurs, seuil)
+
+
+def recovered_mask(condition: str, seuil: float, hysteresis: float, valeurs: np.ndarray) -> np.ndarray:
+    """Version vectorisée de ``Rule.recovered``"""
+    if condition == "eq":
+        return np.abs(valeurs - seuil) > hysteresis
+    shift = -hysteresis if condition in ("gt", "gte") else hysteresis
+    return ~OPERATORS[condition](valeurs, seuil + shift)
+
+
+def _sliding_extreme(valeurs: np.ndarray, lo: np.ndarray, func) -> np.ndarray:
+    """min / max de ``valeurs[lo[i]:i + 1]`` pour tout i (table creuse, une passe par puissance de 2)"""
+    hi = np.arange(len(valeurs))
+    lengths = hi - lo + 1
+    levels = np.floor(np.log2(lengths)).astype(np.int64)
+    result = np.empty_like(valeurs)
+    table = valeurs
+    for k in range(int(levels.max()) + 1 if len(levels) else 0):
+        if k:
+            half = 1 << (k - 1)
+            table = func(table[:-half], table[half:])
+        sel = levels == k
+        result[sel] = func(table[lo[sel]], table[hi[sel] - (1 << k) + 1])
+    return result
+
+
+def window_values(ts: np.ndarray, valeurs: np.ndarray, agregation: str, fenetre: int, since: int) -> np.ndarray:
+    """
+    Agrégat glissant à chaque mesure, comme ``SlidingWindow.value`` : fenêtre
+    ``[t - fenetre, t]``, NaN tant que la période chargée ne couvre pas la fenêtre.
+    """
+    span = fenetre * US
+    lo = np.searchsorted(ts, ts - span, side="left")
+    hi = np.arange(len(ts))
+    if agregation == "avg":
+        sums = np.concatenate(([0.0], np.cumsum(valeurs)))
+        result = (sums[hi + 1] - sums[lo]) / (hi + 1 - lo)
+    elif agregation == "rate":
+        elapsed = (ts - ts[lo]).astype(np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result = np.where(elapsed > 0, (valeurs - valeurs[lo]) * 3600 * US / elapsed, np.nan)
+    else:
+        result = _sliding_extreme(valeurs, lo, np.minimum if agregation == "min" else np.maximum)
+    result[ts - since < span] = np.nan
+    return result
+
+
+def replay(
+    ts: np.ndarray, valeurs: np.ndarray, condition: str, seuil: float, hysteresis: float = 0.0, duree_minimale: int = 0,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Rejouer la machine d'états de ``rule_state.step`` sans boucle Python.
+
+    Retourne, pour chaque déclenchement, l'indice du début du dépassement
+    (``declenchee_a``) et celui du retour à la normale (-1 si encore active).
+    Les valeurs NaN ne sont pas évaluées (l'état reste inchangé).
+
+    Une série de mesures vraies consécutives déclenche à sa première mesure
+    distante d'au moins ``duree_minimale`` de son début. Une fois active, la
+    règle ne revient à la normale qu'à la première mesure hors de la bande
+    d'hystérésis ; un déclenchement candidat n'est donc retenu que si une
+    telle mesure le sépare du candidat précédent.
+    """
+    keep = ~np.isnan(valeurs)
+    index = np.flatnonzero(keep)
+    ts, valeurs = ts[keep], valeurs[keep]
+    empty = np.empty(0, dtype=np.int64)
+    if not len(ts):
+        return empty, empty
+
+    matching = matches_mask(condition, seuil, valeurs)
+    starts = np.flatnonzero(matching & ~np.concatenate(([False], matching[:-1])))
+    ends = np.flatnonzero(matching & ~np.concatenate((matching[1:], [False])))
+    fires = np.maximum(np.searchsorted(ts, ts[starts] + duree_minimale * US, side="left"), starts)
+    valid = fires <= ends
+    starts, fires = starts[valid], fires[valid]
+    if not len(fires):
+        return empty, empty
+
+    exits = np.flatnonzero(recovered_mask(condition, seuil, hysteresis, valeurs))
+    exits_before = np.searchsorted(exits, fires)
+    accepted = np.concatenate(([True], exits_before[1:] > exits_before[:-1]))
+    starts, exits_before = starts[accepted], exits_before[accepted]
+    resolved = np.full(len(starts), -1, dtype=np.int64)
+    closed = exits_before < len(exits)
+    resolved[closed] = index[exits[exits_before[closed]]]
+    return index[starts], resolved
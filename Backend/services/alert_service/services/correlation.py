@@ -0,0 +1,209 @@
+"""Regroupement des déclenchements en incidents par espace et suppression des alertes dépendantes"""
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from services.alert_service.services.rule_index import CompositeRule, Rule
+from services.alert_service.services.rule_state import ACTIVE, RuleState
+
+OPEN = "ouvre"  # premier déclenchement : incident créé et notifié
+ATTACH = "rattache"  # compté sur l'incident en cours de l'espace, sans notification
+SUPPRESS = "supprime"  # alerte parente active ou nœud hors ligne : compté comme supprimé
+
+# Statuts de nœud qui rendent ses mesures non significatives
+DOWN_STATUSES = ("erreur", "maintenance")
+
+
+class IncidentState:
+    """Incident ouvert d'un espace, tenu en mémoire et écrit par lots"""
+
+    __slots__ = (
+        "id", "espace_id", "noeud_id", "message", "debut", "derniere_activite", "derniere_arrivee",
+        "alertes", "supprimees", "membres", "noeuds", "dirty",
+    )
+
+    def __init__(self, espace_id: int, debut: datetime, message: str, noeud_id: Optional[int] = None):
+        self.id: Optional[int] = None
+        self.espace_id, self.noeud_id, self.message = espace_id, noeud_id, message
+        self.debut = self.derniere_activite = debut
+        self.derniere_arrivee = debut  # dernier déclenchement ou nœud rattaché
+        self.alertes = 0
+        self.supprimees = 0
+        self.membres: Set[int] = set()  # alertes actives rattachées
+        self.noeuds: Set[int] = set()  # nœuds hors ligne
+        self.dirty = False
+
+    def accepts(self, now: datetime, window: timedelta) -> bool:
+        """Un nouveau déclenchement s'y rattache-t-il ?"""
+        return now - self.derniere_arrivee <= window
+
+    def is_open(self, now: datetime, window: timedelta) -> bool:
+        return bool(self.membres or self.noeuds) or now - self.derniere_activite <= window
+
+
+class Correlator:
+    """
+    Décide, pour chaque alerte qui se déclenche, si elle ouvre un incident,
+    s'y rattache ou est supprimée. Un incident regroupe les déclenchements
+    d'un espace survenus moins de ``window`` après son début ou son dernier
+    rattachement ; au-delà, un nouvel incident est ouvert. Il reste ouvert
+    tant qu'il a des alertes actives ou des nœuds hors ligne, et pendant
+    ``window`` après sa dernière activité.
+    """
+
+    def __init__(self, window: int, node_timeout: int):
+        self.window = timedelta(seconds=window)
+        self.node_timeout = timedelta(seconds=node_timeout)
+        self.sensors: Dict[int, Tuple[int, int]] = {}  # capteur_id -> (noeud_id, espace_id)
+        self.nodes: Dict[int, Tuple[str, int, str]] = {}  # noeud_id -> (nom, espace_id, statut)
+        self.last_seen: Dict[int, datetime] = {}  # noeud_id -> dernière mesure reçue
+        self.down: Dict[int, str] = {}  # noeud_id -> raison
+        self.incidents: Dict[int, IncidentState] = {}  # espace_id -> incident courant
+        self.superseded: List[IncidentState] = []  # remplacés par un incident plus récent, pas encore clos
+        self.member_of: Dict[int, IncidentState] = {}  # alerte_id -> incident
+        self._created: List[IncidentState] = []  # incidents pas encore écrits
+
+    def load_topology(self, rows: Iterable[tuple]):
+        """Lignes (capteur_id, noeud_id, espace_id, nom du nœud, statut du nœud)"""
+        sensors, nodes = {}, {}
+        for capteur_id, noeud_id, espace_id, nom, statut in rows:
+            sensors[capteur_id] = (noeud_id, espace_id)
+            nodes[noeud_id] = (nom, espace_id, statut)
+        for noeud_id in self.down.keys() - nodes.keys():
+            self._node_up(noeud_id)  # nœud supprimé
+        self.sensors, self.nodes = sensors, nodes
+
+    def drain_created(self) -> List[IncidentState]:
+        """Incidents ouverts depuis le dernier appel, à insérer par l'appelant"""
+        created, self._created = self._created, []
+        return created
+
+    def open_incidents(self) -> List[IncidentState]:
+        return [*self.incidents.values(), *self.superseded]
+
+    def adopt(self, incident: IncidentState, membres: Iterable[int] = ()):
+        """Reprendre un incident encore ouvert en base (démarrage, reprise de partitions)"""
+        incident = next((i for i in self.open_incidents() if i.id is not None and i.id == incident.id), incident)
+        current = self.incidents.get(incident.espace_id)
+        if current is None:
+            self.incidents[incident.espace_id] = incident
+        elif current is not incident and incident not in self.superseded:
+            if incident.derniere_arrivee > current.derniere_arrivee:
+                self.superseded.append(current)
+                self.incidents[incident.espace_id] = incident
+            else:
+                self.superseded.append(incident)
+        for alerte_id in membres:
+            incident.membres.add(alerte_id)
+            self.member_of[alerte_id] = incident
+
+    def forget(self, espace_ids: Set[int]) -> List[IncidentState]:
+        """Incidents d'espaces cédés à une autre instance, retirés sans être clos"""
+        gone = [i for i in self.open_incidents() if i.espace_id in espace_ids]
+        for espace_id in espace_ids:
+            self.incidents.pop(espace_id, None)
+        self.superseded = [i for i in self.superseded if i.espace_id not in espace_ids]
+        for alerte_id in [a for a, i in self.member_of.items() if i.espace_id in espace_ids]:
+            del self.member_of[alerte_id]
+        return gone
+
+    def observe(self, capteur_id: int, horodatage: datetime):
+        """Mesure reçue : le nœud est vivant"""
+        noeud_id = self.sensors.get(capteur_id, (None,))[0]
+        if noeud_id is None:
+            return
+        self.last_seen[noeud_id] = max(horodatage, self.last_seen.get(noeud_id, horodatage))
+        if self.down.get(noeud_id) == "silence":
+            self._node_up(noeud_id, horodatage)
+
+    def _rule_nodes(self, rule: Union[Rule, CompositeRule]) -> Set[int]:
+        sensors = rule.sensors() if isinstance(rule, CompositeRule) else {rule.capteur_id}
+        return {self.sensors[c][0] for c in sensors if c in self.sensors}
+
+    def _current(self, espace_id: int, now: datetime, message: str) -> Tuple[IncidentState, bool]:
+        incident = self.incidents.get(espace_id)
+        if incident is not None:
+            if incident.accepts(now, self.window):
+                incident.derniere_arrivee = max(incident.derniere_arrivee, now)
+                return incident, False
+            self.superseded.append(incident)  # clos par ``check`` une fois terminé
+        incident = self.incidents[espace_id] = IncidentState(espace_id, now, message)
+        self._created.append(incident)
+        return incident, True
+
+    def assign(
+        self, rule: Union[Rule, CompositeRule], now: datetime, message: str, states: Dict[int, RuleState]
+    ) -> Tuple[str, Optional[IncidentState]]:
+        """
+        Action pour une alerte qui passe à l'état actif. L'incident retourné
+        peut être nouveau (sans id) : voir ``drain_created``.
+        """
+        espace_id = self.sensors.get(rule.capteur_id, (None, None))[1]
+        if espace_id is None:
+            return OPEN, None  # capteur inconnu de la topologie : pas de regroupement
+        parent = states.get(rule.parent_id) if rule.parent_id else None
+        suppressed = (parent is not None and parent.etat == ACTIVE) or bool(self._rule_nodes(rule) & self.down.keys())
+        incident, created = self._current(espace_id, now, message)
+        incident.membres.add(rule.id)
+        incident.derniere_activite = max(incident.derniere_activite, now)
+        self.member_of[rule.id] = incident
+        if suppressed:
+            incident.supprimees += 1
+            incident.dirty = True
+            return SUPPRESS, incident
+        incident.alertes += 1
+        if created:
+            return OPEN, incident
+        incident.dirty = True
+        return ATTACH, incident
+
+    def release(self, alerte_id: int, now: datetime):
+        """Alerte revenue à la normale ou retirée"""
+        incident = self.member_of.pop(alerte_id, None)
+        if incident is not None:
+            incident.membres.discard(alerte_id)
+            incident.derniere_activite = max(incident.derniere_activite, now)
+            incident.dirty = True
+
+    def _node_down(self, noeud_id: int, reason: str, now: datetime):
+        nom, espace_id, _ = self.nodes[noeud_id]
+        self.down[noeud_id] = reason
+        incident, created = self._current(espace_id, now, f"Nœud {nom} hors ligne ({reason})")
+        if created:
+            incident.noeud_id = noeud_id
+        incident.noeuds.add(noeud_id)
+        incident.derniere_activite = max(incident.derniere_activite, now)
+        incident.dirty = True
+
+    def _node_up(self, noeud_id: int, now: Optional[datetime] = None):
+        del self.down[noeud_id]
+        for incident in self.open_incidents():
+            if noeud_id not in incident.noeuds:
+                continue
+            incident.noeuds.discard(noeud_id)
+            if now is not None:
+                incident.derniere_activite = max(incident.derniere_activite, now)
+            incident.dirty = True
+
+    def check(self, now: datetime) -> Tuple[List[IncidentState], List[IncidentState], List[IncidentState]]:
+        """
+        Passage périodique : nœuds silencieux ou en erreur, incidents à clore.
+        Retourne les incidents (à insérer, à mettre à jour, clos).
+        """
+        for noeud_id, (_, _, statut) in self.nodes.items():
+            silent = noeud_id in self.last_seen and now - self.last_seen[noeud_id] > self.node_timeout
+            reason = statut if statut in DOWN_STATUSES else ("silence" if silent else None)
+            if reason is not None and noeud_id not in self.down:
+                self._node_down(noeud_id, reason, now)
+            elif reason is None and noeud_id in self.down:
+                self._node_up(noeud_id, now)
+
+        created = self.drain_created()
+        closed = []
+        for espace_id, incident in list(self.incidents.items()):
+            if not incident.is_open(now, self.window):
+                del self.incidents[espace_id]
+                closed.append(incident)
+        closed += [i for i in self.superseded if not i.is_open(now, self.window)]
+        self.superseded = [i for i in self.superseded if i not in closed]
+        updated = [i for i in self.open_incidents() if i.dirty and i.id is not None]
+        return created, updated, closed
@@ -0,0 +1,790 @@
+"""Évaluation des alertes à l'arrivée des mesures"""
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from sqlalchemy.orm import selectinload
+from sqlmodel import select
+
+from shared.config import get_alert_settings
+from shared.database import SessionLocal, get_redis
+from shared.models.alert import Alerte, HistoriqueAlerte, Incident
+from shared.models.node import NoeudArduino
+from shared.models.sensor import Capteur, DonneesCapteur
+from shared.utils.sharding import assign_slots, slot_channel, space_slot
+from services.alert_service.services.correlation import ATTACH, OPEN, Correlator, IncidentState
+from services.alert_service.services.membership import ShardMembership
+from services.alert_service.services.notifications import enqueue_notifications
+from services.alert_service.services.rule_index import CompositeRule, Rule, RuleIndex, Term
+from services.alert_service.services.rule_state import ACTIVE, OK_STATE, PENDING, RESOLVED, RuleState, step
+from services.alert_service.services.windows import WindowKey, WindowStore
+
+settings = get_alert_settings()
+logger = logging.getLogger(__name__)
+
+# Dernière valeur de chaque capteur (last_value_cache du service de données)
+LAST_VALUES_KEY = "gardenconnect:capteurs:dernieres_valeurs"
+# Création / modification / suppression d'une alerte
+RULES_CHANNEL = "gardenconnect:alertes:regles"
+# État des règles hors "ok" (alerte_id -> RuleState JSON), repris au redémarrage
+STATES_KEY = "gardenconnect:alertes:etats"
+# Dernière mesure évaluée de chaque partition (slot -> id donnees_capteurs), reprise du nouveau propriétaire
+POSITIONS_KEY = "gardenconnect:alertes:positions"
+
+
+async def notify_rule_change(alerte_id: int):
+    """Demander à toutes les instances de recharger une alerte"""
+    try:
+        redis_conn = await get_redis()
+        await redis_conn.publish(RULES_CHANNEL, json.dumps({"alerte_id": alerte_id}))
+    except Exception as e:
+        logger.warning(f"Publication du changement de règle impossible: {e}")
+
+
+class AlertEngine:
+    """
+    Évalue chaque mesure contre les règles actives de son capteur.
+
+    Les mesures arrivent par le canal Redis du service de données. Chaque
+    règle suit la machine d'états de ``rule_state`` (hystérésis, durée
+    minimale) ; l'état est tenu en mémoire et sauvegardé dans Redis, et
+    seuls le déclenchement et le retour à la normale sont écrits dans
+    historique_alertes. Les règles composites lisent la dernière valeur de
+    chaque capteur et les agrégats des fenêtres glissantes, sans relire
+    donnees_capteurs.
+
+    Les déclenchements passent par le ``Correlator`` : chacun est écrit dans
+    historique_alertes avec son incident, mais seul celui qui ouvre
+    l'incident d'un espace est notifié ; les suivants y sont comptés, et
+    ceux dont l'alerte parente est active ou dont le nœud est hors ligne
+    sont supprimés.
+
+    Plusieurs instances se partagent les espaces : chacune ne reçoit que
+    les mesures des partitions dont elle détient le bail (``ShardMembership``),
+    plus celles lues par ses règles composites. Les règles et incidents d'un
+    espace sont suivis par une seule instance ; l'état d'une alerte parente
+    d'un autre espace est lu dans ``STATES_KEY``. À chaque changement de
+    propriétaire, les états en cours passent par ``STATES_KEY``, et les
+    mesures publiées pendant la transition sont relues en base à partir de
+    la position sauvegardée dans ``POSITIONS_KEY``.
+    """
+
+    def __init__(self, index: RuleIndex = None):
+        self.index = index or RuleIndex()
+        self._states: Dict[int, RuleState] = {}  # alerte_id -> état, hors "ok"
+        self._watched: Dict[int, Set[int]] = {}  # capteur_id -> alertes hors "ok"
+        self._previous: Dict[int, float] = {}  # capteur_id -> dernière valeur évaluée
+        self._latest: Dict[int, float] = {}  # capteur_id -> dernière valeur reçue
+        self._spaces: Dict[int, int] = {}  # capteur_id -> espace_id
+        self._positions: Dict[int, int] = {}  # partition -> id de la dernière mesure évaluée
+        self._replayed: Set[int] = set()  # mesures relues en base, ignorées si reçues ensuite
+        self.windows = WindowStore()
+        self.correlator = Correlator(settings.alert_correlation_window, settings.alert_node_timeout)
+        self.membership = ShardMembership()
+        self.owned: Set[int] = set()  # partitions dont l'instance détient le bail
+        self._channels: Set[str] = set()  # canaux de partitions écoutés
+        self._topology: list = []
+        self.stats = {
+            "mesures": 0, "declenchements": 0, "resolutions": 0,
+            "incidents": 0, "rattachees": 0, "supprimees": 0,
+        }
+
+    def summary(self) -> Dict[str, int]:
+        etats = [state.etat for state in self._states.values()]
+        return {
+            "regles": len(self.index), "en_attente": etats.count(PENDING), "actives": etats.count(ACTIVE),
+            "incidents_ouverts": len(self.correlator.open_incidents()), "noeuds_hors_ligne": len(self.correlator.down),
+            "compilations": self.index.compilations, "partitions": len(self.owned),
+        }
+
+    def _slot(self, capteur_id: Optional[int]) -> Optional[int]:
+        """Partition de l'espace du capteur (None si inconnu de la topologie)"""
+        espace_id = self._spaces.get(capteur_id)
+        return None if espace_id is None else space_slot(espace_id, settings.alert_partitions)
+
+    def owns(self, capteur_id: Optional[int]) -> bool:
+        return self._slot(capteur_id) in self.owned
+
+    def _listened(self) -> Set[int]:
+        """Partitions possédées, et celles des capteurs lus par les règles composites possédées"""
+        slots = set(self.owned)
+        for rule in self.index.composites():
+            if self.owns(rule.capteur_id):
+                slots.update(self._slot(capteur_id) for capteur_id in rule.sensors())
+        slots.discard(None)
+        return slots
+
+    def _sensors_in(self, slots: Set[int]) -> Set[int]:
+        return {capteur_id for capteur_id in self._spaces if self._slot(capteur_id) in slots}
+
+    def _owned_topology(self) -> list:
+        return [row for row in self._topology if self.owns(row[0])]
+
+    def _set_topology(self, rows: list) -> Tuple[Set[int], Set[int]]:
+        """
+        Nouvelle topologie. Retourne les capteurs gagnés et perdus sans
+        changement de bail : nœud déplacé vers un espace d'une autre partition.
+        """
+        before = self._sensors_in(self.owned)
+        self._topology = rows
+        self._spaces = {capteur_id: espace_id for capteur_id, _, espace_id, _, _ in rows}
+        after = self._sensors_in(self.owned)
+        return after - before, before - after
+
+    def _set_state(self, alerte_id: int, capteur_id: int, state: RuleState):
+        if state.etat in (PENDING, ACTIVE):
+            self._states[alerte_id] = state
+            self._watched.setdefault(capteur_id, set()).add(alerte_id)
+            return
+        self._states.pop(alerte_id, None)
+        watched = self._watched.get(capteur_id)
+        if watched is not None:
+            watched.discard(alerte_id)
+            if not watched:
+                del self._watched[capteur_id]
+
+    @staticmethod
+    def _query_topology(db) -> list:
+        return db.execute(
+            select(Capteur.id, Capteur.noeud_id, NoeudArduino.espace_id, NoeudArduino.nom, NoeudArduino.statut)
+            .join(NoeudArduino, NoeudArduino.id == Capteur.noeud_id)
+        ).all()
+
+    @classmethod
+    def _fetch(cls):
+        """Règles actives, déclenchements et incidents en cours, topologie (appelé dans un thread)"""
+        db = SessionLocal()
+        try:
+            alertes = db.execute(
+                select(Alerte).options(selectinload(Alerte.conditions)).where(Alerte.est_active == True)
+            ).scalars().all()
+            return (alertes, *cls._open(db), cls._query_topology(db))
+        finally:
+            db.close()
+
+    @staticmethod
+    def _open(db) -> tuple:
+        """Déclenchements et incidents en cours"""
+        firing = db.execute(
+            select(
+                HistoriqueAlerte.alerte_id, HistoriqueAlerte.id, HistoriqueAlerte.declenchee_a,
+                HistoriqueAlerte.incident_id,
+            )
+            .where(HistoriqueAlerte.statut == ACTIVE, HistoriqueAlerte.resolue_a.is_(None))
+        ).all()
+        incidents = db.execute(select(Incident).where(Incident.fin.is_(None))).scalars().all()
+        return firing, incidents
+
+    @classmethod
+    def _fetch_open(cls) -> tuple:
+        db = SessionLocal()
+        try:
+            return cls._open(db)
+        finally:
+            db.close()
+
+    @classmethod
+    def _fetch_topology(cls) -> list:
+        db = SessionLocal()
+        try:
+            return cls._query_topology(db)
+        finally:
+            db.close()
+
+    def _watches(self, alerte_id: int, capteurs: Set[int]) -> bool:
+        return self.index.sensor_of(alerte_id) in capteurs
+
+    @staticmethod
+    def _incident_state(row: Incident) -> IncidentState:
+        incident = IncidentState(row.espace_id, row.debut, row.message, row.noeud_id)
+        incident.id, incident.derniere_activite = row.id, row.derniere_activite
+        incident.alertes, incident.supprimees = row.nombre_alertes, row.nombre_supprimees
+        return incident
+
+    def _adopt(
+        self, incidents: List[Incident], firing: list, capteurs: Set[int], slots: Set[int] = frozenset(),
+    ) -> List[IncidentState]:
+        """
+        Reprendre les incidents ouverts en base dont des alertes actives
+        portent sur ``capteurs``. Retourne les incidents abandonnés à clore
+        (sans alerte active, inactifs depuis la fenêtre) des espaces des
+        partitions ``slots``.
+        """
+        known = {incident.id for incident in self.correlator.open_incidents()}
+        members: Dict[int, List[int]] = {}
+        arrivals: Dict[int, datetime] = {}
+        for alerte_id, _, declenchee_a, incident_id in firing:
+            if incident_id is not None:
+                members.setdefault(incident_id, []).append(alerte_id)
+                arrivals[incident_id] = max(declenchee_a, arrivals.get(incident_id, declenchee_a))
+        cutoff = datetime.utcnow() - self.correlator.window
+        stale = []
+        for row in incidents:
+            if row.id in known:
+                continue
+            owned = [alerte_id for alerte_id in members.get(row.id, ()) if self._watches(alerte_id, capteurs)]
+            if not owned:
+                in_slots = space_slot(row.espace_id, settings.alert_partitions) in slots
+                if in_slots and row.id not in members and row.derniere_activite < cutoff:
+                    stale.append(self._incident_state(row))
+                continue
+            incident = self._incident_state(row)
+            incident.derniere_arrivee = max(incident.debut, arrivals[row.id])
+            self.correlator.adopt(incident, owned)
+        return stale
+
+    def _firing_states(self, firing: list, capteurs: Set[int], states: Dict[int, RuleState]):
+        """Déclenchements ouverts en base des alertes de ``capteurs``, absents des états"""
+        for alerte_id, historique_id, declenchee_a, _ in firing:
+            if self._watches(alerte_id, capteurs) and (alerte_id not in states or states[alerte_id].etat != ACTIVE):
+                states[alerte_id] = RuleState(ACTIVE, declenchee_a, historique_id)
+
+    async def load(self):
+        """
+        Charger les règles et les déclenchements en cours.
+
+        Chaque instance indexe toutes les règles mais ne suit l'état que de
+        celles de ses partitions. Les états en mémoire sont conservés tant
+        que leur règle existe ; les déclenchements ouverts en base s'y
+        ajoutent, et ceux dont la règle a disparu entre-temps sont clos.
+        """
+        alertes, firing, incidents, topology = await asyncio.to_thread(self._fetch)
+        self.index.load(alertes)
+        gained, lost = self._set_topology(topology)
+        self._drop(lost)
+        await self._sync_windows()
+        states = {
+            alerte_id: state for alerte_id, state in self._states.items()
+            if self.index.get(alerte_id) is not None
+        }
+        now = datetime.utcnow()
+        for alerte_id in list(self.correlator.member_of):
+            if alerte_id not in states:
+                self.correlator.release(alerte_id, now)
+        owned = self._sensors_in(self.owned)
+        stale = self._adopt(incidents, firing, owned, self.owned)
+        if stale:
+            await asyncio.to_thread(self._write_incidents, [], [], stale, now)
+        self._firing_states(firing, owned, states)
+        orphans = [
+            (alerte_id, historique_id) for alerte_id, historique_id, _, _ in firing if self.index.get(alerte_id) is None
+        ]
+        if orphans:
+            await asyncio.to_thread(self._write, [], orphans, [], now)
+        self._states, self._watched = {}, {}
+        for alerte_id, state in states.items():
+            self._set_state(alerte_id, self.index.sensor_of(alerte_id), state)
+        # Prochaine mesure de chaque capteur réévaluée en entier
+        self._previous = {}
+        if gained:
+            await self._take(await get_redis(), gained)
+        logger.info(f"{len(self.index)} règles d'alerte chargées")
+
+    @staticmethod
+    def _recent_readings(keys: Set[WindowKey], now: datetime) -> Dict[int, list]:
+        """Mesures couvrant les nouvelles fenêtres, une requête par capteur (appelé dans un thread)"""
+        spans: Dict[int, int] = {}
+        for capteur_id, duree in keys:
+            spans[capteur_id] = max(spans.get(capteur_id, 0), duree)
+        db = SessionLocal()
+        try:
+            return {
+                capteur_id: db.execute(
+                    select(DonneesCapteur.horodatage, DonneesCapteur.valeur)
+                    .where(
+                        DonneesCapteur.capteur_id == capteur_id,
+                        DonneesCapteur.horodatage >= now - timedelta(seconds=duree),
+                    )
+                    .order_by(DonneesCapteur.horodatage)
+                ).all()
+                for capteur_id, duree in spans.items()
+            }
+        finally:
+            db.close()
+
+    async def _sync_windows(self):
+        """Créer les fenêtres requises par les règles des partitions écoutées, préremplies depuis la base"""
+        listened = self._listened()
+        needed = {key for key in self.index.windows() if self._slot(key[0]) in listened}
+        missing = needed - self.windows.keys()
+        if missing:
+            now = datetime.utcnow()
+            readings = await asyncio.to_thread(self._recent_readings, missing, now)
+            for capteur_id, duree in missing:
+                since = now - timedelta(seconds=duree)
+                self.windows.add(
+                    (capteur_id, duree), since, [(t, v) for t, v in readings.get(capteur_id, ()) if t >= since]
+                )
+        self.windows.retain(needed)
+
+    async def _take(self, redis_conn, capteurs: Set[int], slots: Set[int] = frozenset()):
+        """
+        Reprendre les alertes de ``capteurs`` (partitions ``slots`` prises,
+        ou nœud déplacé) : états sauvegardés dans Redis par l'ancien
+        propriétaire (attentes, alertes actives), complétés par les
+        déclenchements ouverts en base, et incidents en cours.
+        """
+        saved = await redis_conn.hgetall(STATES_KEY)
+        firing, incidents = await asyncio.to_thread(self._fetch_open)
+        states: Dict[int, RuleState] = {}
+        stale = []
+        for field, raw in saved.items():
+            alerte_id = int(field)
+            if self.index.sensor_of(alerte_id) is None:
+                stale.append(alerte_id)
+            elif self._watches(alerte_id, capteurs) and alerte_id not in self._states:
+                states[alerte_id] = RuleState.from_json(raw)
+        if stale:
+            await redis_conn.hdel(STATES_KEY, *stale)
+        self._firing_states(firing, capteurs, states)
+        for alerte_id, state in states.items():
+            if alerte_id not in self._states:
+                self._set_state(alerte_id, self.index.sensor_of(alerte_id), state)
+        self.correlator.load_topology(self._owned_topology())
+        closed = self._adopt(incidents, firing, capteurs, slots)
+        if closed:
+            await asyncio.to_thread(self._write_incidents, [], [], closed, datetime.utcnow())
+
+    def _drop(self, capteurs: Set[int]):
+        """
+        Céder les alertes de ``capteurs`` : les états restent dans ``STATES_KEY``
+        (sauvegardés à chaque changement) pour le nouveau propriétaire, seule
+        la copie en mémoire est oubliée.
+        """
+        now = datetime.utcnow()
+        for alerte_id in [a for a in self._states if self._watches(a, capteurs)]:
+            self._set_state(alerte_id, self.index.sensor_of(alerte_id), OK_STATE)
+            self.correlator.release(alerte_id, now)
+        for capteur_id in [c for c in self._previous if c in capteurs]:
+            del self._previous[capteur_id]
+        self.correlator.load_topology(self._owned_topology())
+
+    async def _resubscribe(self, pubsub):
+        channels = {slot_channel(slot) for slot in self._listened()}
+        if channels - self._channels:
+            await pubsub.subscribe(*(channels - self._channels))
+        if self._channels - channels:
+            await pubsub.unsubscribe(*(self._channels - channels))
+        self._channels = channels
+        await self._sync_windows()
+
+    async def rebalance(self, redis_conn, pubsub) -> Set[int]:
+        """
+        Signaler sa présence, céder les partitions revenant à une autre
+        instance (ou dont le bail a expiré), prendre celles qui lui reviennent
+        et dont le bail est libre. Retourne les partitions prises.
+        """
+        members = await self.membership.heartbeat(redis_conn)
+        wanted = assign_slots(members, settings.alert_partitions).get(self.membership.member_id, set())
+        lost = await self.membership.renew(redis_conn, self.owned)
+        released = self.owned - wanted - lost
+        dropped = lost | released
+        if dropped:
+            # Position sauvegardée avant la libération : le nouveau propriétaire reprend à partir d'elle
+            await self._save_positions(redis_conn, released)
+            capteurs = self._sensors_in(dropped)
+            spaces = {self._spaces[capteur_id] for capteur_id in capteurs}
+            self.owned -= dropped
+            for slot in dropped:
+                self._positions.pop(slot, None)
+            self._drop(capteurs)
+            await self.membership.release(redis_conn, released)
+            # Incidents repris par le nouveau propriétaire : compteurs écrits, sans clôture
+            handed = [i for i in self.correlator.forget(spaces) if i.id is not None]
+            if handed:
+                await asyncio.to_thread(self._write_incidents, [], handed, [], datetime.utcnow())
+        acquired = set()
+        for slot in wanted - self.owned:
+            if await self.membership.acquire(redis_conn, slot):
+                acquired.add(slot)
+        if acquired:
+            self.owned |= acquired
+            await self._take(redis_conn, self._sensors_in(acquired), acquired)
+        if dropped or acquired:
+            logger.info(
+                f"Partitions: {len(self.owned)} possédées, {len(acquired)} prises, {len(dropped)} cédées "
+                f"({len(members)} instances)"
+            )
+        await self._save_positions(redis_conn, self.owned)
+        await self._resubscribe(pubsub)
+        return acquired
+
+    async def _save_positions(self, redis_conn, slots: Iterable[int]):
+        positions = {str(slot): self._positions[slot] for slot in slots if slot in self._positions}
+        if positions:
+            await redis_conn.hset(POSITIONS_KEY, mapping=positions)
+
+    async def _checkpoint(self, alerte_ids: Iterable[int], slot: Optional[int] = None):
+        """Sauvegarder l'état des règles modifiées, et la position de la partition de la mesure"""
+        saved = {str(a): self._states[a].to_json() for a in alerte_ids if a in self._states}
+        cleared = [str(a) for a in alerte_ids if a not in self._states]
+        try:
+            redis_conn = await get_redis()
+            async with redis_conn.pipeline(transaction=False) as pipe:
+                if saved:
+                    pipe.hset(STATES_KEY, mapping=saved)
+                if cleared:
+                    pipe.hdel(STATES_KEY, *cleared)
+                if slot in self._positions:
+                    pipe.hset(POSITIONS_KEY, str(slot), self._positions[slot])
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Sauvegarde de l'état des alertes impossible: {e}")
+
+    async def _remote_states(self, alerte_ids: Set[int]) -> Dict[int, RuleState]:
+        """États d'alertes suivies par d'autres instances (alertes parentes d'un autre espace)"""
+        ids = sorted(alerte_ids)
+        try:
+            redis_conn = await get_redis()
+            raw_states = await redis_conn.hmget(STATES_KEY, [str(a) for a in ids])
+        except Exception as e:
+            logger.warning(f"Lecture de l'état des alertes parentes impossible: {e}")
+            return {}
+        return {a: RuleState.from_json(raw) for a, raw in zip(ids, raw_states) if raw is not None}
+
+    async def reload_rule(self, alerte_id: int):
+        """Recharger une alerte depuis la base"""
+        def fetch():
+            db = SessionLocal()
+            try:
+                return db.get(Alerte, alerte_id, options=[selectinload(Alerte.conditions)])
+            finally:
+                db.close()
+
+        alerte = await asyncio.to_thread(fetch)
+        previous_sensor = self.index.sensor_of(alerte_id)
+        if alerte is None:
+            self.index.remove(alerte_id)
+        else:
+            self.index.upsert(alerte)
+        await self._sync_windows()
+        capteur_id = self.index.sensor_of(alerte_id)
+        if capteur_id is not None:
+            self._previous.pop(capteur_id, None)
+        state = self._states.get(alerte_id)
+        if state is None or capteur_id == previous_sensor:
+            return
+        if previous_sensor is not None:
+            self._set_state(alerte_id, previous_sensor, OK_STATE)
+        if state.etat == ACTIVE:
+            # Règle supprimée, désactivée ou déplacée : clore le déclenchement en cours
+            now = datetime.utcnow()
+            self.correlator.release(alerte_id, now)
+            await asyncio.to_thread(self._write, [], [(alerte_id, state.historique_id)], [], now)
+        self._states.pop(alerte_id, None)
+        await self._checkpoint([alerte_id])
+
+    def _term_value(self, term: Term, now: datetime) -> Optional[float]:
+        if term.agregation is None:
+            return self._latest.get(term.capteur_id)
+        return self.windows.value(term.capteur_id, term.fenetre, term.agregation, now)
+
+    async def handle_reading(
+        self, capteur_id: int, valeur: float, horodatage: datetime, id_: Optional[int] = None, replay: bool = False,
+    ):
+        """
+        Évaluer une mesure. ``replay`` : mesure relue en base à la prise d'une
+        partition, déjà comptée dans les fenêtres préremplies.
+        """
+        if id_ is not None and id_ in self._replayed and not replay:
+            self._replayed.discard(id_)
+            return
+        self.stats["mesures"] += 1
+        if not replay:
+            self.windows.push(capteur_id, horodatage, valeur)
+        self._latest[capteur_id] = valeur
+        observed: Dict[int, Tuple[Union[Rule, CompositeRule], object]] = {}
+        slot = self._slot(capteur_id)
+        # Capteur d'une autre partition : lu seulement pour les règles composites possédées
+        if slot in self.owned:
+            if id_ is not None:
+                self._positions[slot] = max(id_, self._positions.get(slot, id_))
+            self.correlator.observe(capteur_id, horodatage)
+            previous = self._previous.get(capteur_id)
+            self._previous[capteur_id] = valeur
+            if previous is None:
+                # Première mesure depuis le chargement : toutes les règles vraies
+                candidates = self.index.evaluate(capteur_id, valeur)
+            else:
+                # Règles dont le seuil vient d'être franchi vers le haut
+                candidates = self.index.transitions(capteur_id, previous, valeur)[0]
+            observed = {rule.id: (rule, valeur) for rule in candidates}
+            for alerte_id in self._watched.get(capteur_id, ()):
+                rule = self.index.get(alerte_id)
+                if isinstance(rule, Rule):
+                    observed[alerte_id] = (rule, valeur)
+        for rule in self.index.derived(capteur_id):
+            if not self.owns(rule.capteur_id):
+                continue
+            valeurs = [self._term_value(term, horodatage) for term in rule.terms]
+            if None not in valeurs:  # fenêtre pas encore couverte ou capteur sans mesure
+                observed[rule.id] = (rule, valeurs)
+
+        changed = {}
+        for alerte_id, (rule, value) in observed.items():
+            state = self._states.get(alerte_id, OK_STATE)
+            new_state = step(rule, state, value, horodatage)
+            if new_state != state:
+                changed[alerte_id] = (rule, new_state, value)
+        if not changed:
+            return
+
+        states = self._states
+        remote = {
+            rule.parent_id for rule, state, _ in changed.values()
+            if state.etat == ACTIVE and rule.parent_id and not self.owns(self.index.sensor_of(rule.parent_id))
+        }
+        if remote:
+            states = {**self._states, **await self._remote_states(remote)}
+
+        fired, cleared, notified = [], [], set()
+        for alerte_id, (rule, state, value) in changed.items():
+            if state.etat == ACTIVE:
+                message = rule.describe(value)
+                action, incident = self.correlator.assign(rule, state.depuis, message, states)
+                # Historique écrit pour tout déclenchement, notifié seulement à l'ouverture d'un incident
+                fired.append((rule, state.depuis, message, incident))
+                if action == OPEN:
+                    notified.add(alerte_id)
+                else:
+                    self.stats["rattachees" if action == ATTACH else "supprimees"] += 1
+            elif state.etat == RESOLVED:
+                self.correlator.release(alerte_id, horodatage)
+                if state.historique_id is not None:
+                    cleared.append((alerte_id, state.historique_id))
+        created = self.correlator.drain_created()
+        opened = {}
+        if fired or cleared or created:
+            opened = await asyncio.to_thread(self._write, fired, cleared, created, horodatage)
+        notifications = []
+        for rule, depuis, message, incident in fired:
+            if rule.id not in notified:
+                continue
+            notifications.append({
+                "alerte_id": rule.id, "historique_id": opened[rule.id], "valeur": changed[rule.id][2],
+                "message": message, "declenchee_a": depuis.isoformat(),
+                "incident_id": incident.id if incident is not None else None,
+            })
+        for alerte_id, (rule, state, value) in changed.items():
+            if alerte_id in opened:
+                state = state._replace(historique_id=opened[alerte_id])
+            self._set_state(alerte_id, rule.capteur_id, state)
+        await self._checkpoint(changed, slot)
+        # Envoi par le répartiteur de notifications : l'évaluation n'attend pas le SMTP
+        await enqueue_notifications(notifications)
+
+    @staticmethod
+    def _insert_incidents(db, incidents: List[IncidentState]):
+        rows = [
+            Incident(
+                espace_id=incident.espace_id, noeud_id=incident.noeud_id, message=incident.message,
+                debut=incident.debut, derniere_activite=incident.derniere_activite,
+                nombre_alertes=incident.alertes, nombre_supprimees=incident.supprimees,
+            )
+            for incident in incidents
+        ]
+        db.add_all(rows)
+        db.flush()
+        for incident, row in zip(incidents, rows):
+            incident.id = row.id
+
+    def _write(
+        self, fired: List[Tuple[Union[Rule, CompositeRule], datetime, str, Optional[IncidentState]]],
+        cleared: List[Tuple[int, Optional[int]]], created: List[IncidentState], horodatage: datetime,
+    ) -> Dict[int, int]:
+        """Ouvrir les incidents, ouvrir et clore les lignes d'historique ; retourne alerte_id -> historique ouvert"""
+        db = SessionLocal()
+        try:
+            for incident in created:
+                incident.dirty = False
+            self._insert_incidents(db, created)
+            opened = []
+            for rule, depuis, message, incident in fired:
+                historique = HistoriqueAlerte(
+                    alerte_id=rule.id, declenchee_a=depuis, message=message, statut=ACTIVE,
+                    incident_id=incident.id if incident is not None else None,
+                )
+                db.add(historique)
+                opened.append((rule.id, historique))
+            for alerte_id, historique_id in cleared:
+                historique = db.get(HistoriqueAlerte, historique_id) if historique_id else None
+                if historique is not None:
+                    historique.resolue_a = horodatage
+                    historique.statut = RESOLVED
+            db.commit()
+            result = {alerte_id: historique.id for alerte_id, historique in opened}
+        finally:
+            db.close()
+        self.stats["declenchements"] += len(fired)
+        self.stats["resolutions"] += len(cleared)
+        self.stats["incidents"] += len(created)
+        return result
+
+    def _write_incidents(
+        self, created: List[IncidentState], updated: List[IncidentState], closed: List[IncidentState], now: datetime
+    ):
+        """Insérer, mettre à jour les compteurs et clore les incidents (appelé dans un thread)"""
+        db = SessionLocal()
+        try:
+            self._insert_incidents(db, created)
+            for incident in [*updated, *closed]:
+                row = db.get(Incident, incident.id) if incident.id is not None else None
+                if row is None:
+                    continue
+                row.nombre_alertes, row.nombre_supprimees = incident.alertes, incident.supprimees
+                row.derniere_activite = incident.derniere_activite
+                if incident in closed:
+                    row.fin, row.statut = min(incident.derniere_activite, now), "resolu"
+            db.commit()
+        finally:
+            db.close()
+        self.stats["incidents"] += len(created)
+
+    async def check_incidents(self):
+        """Détecter les nœuds hors ligne, écrire les compteurs des incidents et clore les incidents terminés"""
+        gained, lost = self._set_topology(await asyncio.to_thread(self._fetch_topology))
+        self._drop(lost)
+        if gained:
+            await self._take(await get_redis(), gained)
+        now = datetime.utcnow()
+        created, updated, closed = self.correlator.check(now)
+        for incident in [*created, *updated]:
+            incident.dirty = False  # modifications pendant l'écriture reprises au passage suivant
+        if created or updated or closed:
+            await asyncio.to_thread(self._write_incidents, created, updated, closed, now)
+
+    @staticmethod
+    def _readings_after(capteurs: List[int], after_id: int, since: datetime) -> list:
+        """Mesures de ``capteurs`` postérieures à une position, dans l'ordre d'insertion (appelé dans un thread)"""
+        db = SessionLocal()
+        try:
+            return db.execute(
+                select(DonneesCapteur.id, DonneesCapteur.capteur_id, DonneesCapteur.valeur, DonneesCapteur.horodatage)
+                .where(
+                    DonneesCapteur.capteur_id.in_(capteurs),
+                    DonneesCapteur.horodatage >= since,
+                    DonneesCapteur.id > after_id,
+                )
+                .order_by(DonneesCapteur.id)
+            ).all()
+        finally:
+            db.close()
+
+    async def replay(self, slots: Set[int]):
+        """
+        Reprise de partitions (prise de bail, redémarrage) : les mesures
+        publiées depuis la position sauvegardée par l'ancien propriétaire sont
+        relues en base, sur au plus ``alert_replay_window`` ; sans position,
+        seule la dernière valeur connue de chaque capteur est évaluée.
+        """
+        self._replayed.clear()
+        if not slots:
+            return
+        redis_conn = await get_redis()
+        ordered = sorted(slots)
+        saved = await redis_conn.hmget(POSITIONS_KEY, [str(slot) for slot in ordered])
+        positions = {slot: int(raw) for slot, raw in zip(ordered, saved) if raw is not None}
+        for slot, position in positions.items():
+            self._positions[slot] = max(position, self._positions.get(slot, position))
+        capteurs = [c for c in self.index.sensors() if self._slot(c) in positions]
+        if capteurs:
+            since = datetime.utcnow() - timedelta(seconds=settings.alert_replay_window)
+            rows = await asyncio.to_thread(self._readings_after, capteurs, min(positions.values()), since)
+            for id_, capteur_id, valeur, horodatage in rows:
+                if id_ > positions[self._slot(capteur_id)]:
+                    self._replayed.add(id_)
+                    await self.handle_reading(capteur_id, valeur, horodatage, id_, replay=True)
+        await self.catch_up(slots - positions.keys())
+
+    async def catch_up(self, slots: Set[int]):
+        """Évaluer la dernière valeur connue des capteurs surveillés de ces partitions"""
+        capteurs = [c for c in self.index.sensors() if self._slot(c) in slots]
+        if not capteurs:
+            return
+        redis_conn = await get_redis()
+        raw_values = await redis_conn.hmget(LAST_VALUES_KEY, [str(c) for c in capteurs])
+        for capteur_id, raw in zip(capteurs, raw_values):
+            if raw is not None:
+                valeur, horodatage = json.loads(raw)
+                await self.handle_reading(capteur_id, valeur, datetime.fromisoformat(horodatage))
+
+    async def run(self):
+        """Consommer les mesures de ses partitions et les changements de règles (tâche de fond)"""
+        redis_conn = None
+        try:
+            while True:
+                try:
+                    await self.load()
+                    redis_conn = await get_redis()
+                    async with redis_conn.pubsub() as pubsub:
+                        await self._consume(redis_conn, pubsub)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Moteur d'alertes interrompu: {e}")
+                    await asyncio.sleep(5)
+        finally:
+            if redis_conn is not None and self.owned:
+                # Départ : les autres instances reprennent les partitions sans attendre l'expiration des baux
+                try:
+                    await asyncio.shield(self._leave(redis_conn))
+                except Exception as e:
+                    logger.warning(f"Libération des partitions impossible: {e}")
+                self.owned = set()
+
+    async def _leave(self, redis_conn):
+        await self._save_positions(redis_conn, self.owned)
+        await self.membership.leave(redis_conn, self.owned)
+
+    async def _consume(self, redis_conn, pubsub):
+        self._channels = set()
+        await pubsub.subscribe(RULES_CHANNEL)
+        await self.rebalance(redis_conn, pubsub)
+        # Mesures publiées pendant l'arrêt ou la coupure
+        await self.replay(self.owned)
+        next_heartbeat = time.monotonic() + settings.alert_member_heartbeat
+        while True:
+            raw = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if time.monotonic() >= next_heartbeat:
+                acquired = await self.rebalance(redis_conn, pubsub)
+                await self.replay(acquired)
+                next_heartbeat = time.monotonic() + settings.alert_member_heartbeat
+            if raw is None or raw.get("type") != "message":
+                continue
+            channel = raw["channel"]
+            channel = channel.decode() if isinstance(channel, bytes) else channel
+            message = json.loads(raw["data"])
+            if channel == RULES_CHANNEL:
+                await self.reload_rule(message["alerte_id"])
+                await self._resubscribe(pubsub)  # dépendances des règles composites
+            else:
+                await self.handle_reading(
+                    message["capteur_id"], message["valeur"], datetime.fromisoformat(message["horodatage"]),
+                    message.get("id"),
+                )
+
+
+async def run_rule_reload(engine: AlertEngine):
+    """Recharger périodiquement toutes les règles (changement publié mais non reçu)"""
+    while True:
+        await asyncio.sleep(settings.alert_rules_reload_interval)
+        try:
+            await engine.load()
+        except Exception as e:
+            logger.error(f"Erreur de rechargement des règles: {e}")
+
+
+async def run_incident_check(engine: AlertEngine):
+    """Passage périodique du corrélateur (nœuds silencieux, écriture groupée des incidents)"""
+    while True:
+        await asyncio.sleep(settings.alert_incident_interval)
+        try:
+            await engine.check_incidents()
+        except Exception as e:
+            logger.error(f"Erreur de suivi des incidents: {e}")
+
+
+alert_engine = AlertEngine()
@@ -0,0 +1,92 @@
+"""Présence des instances du moteur d'alertes et baux sur les partitions de capteurs"""
+import os
+import socket
+import time
+import uuid
+from typing import Iterable, List, Set
+
+from shared.config import get_alert_settings
+
+settings = get_alert_settings()
+
+# Instances vivantes (score : échéance de présence)
+MEMBERS_KEY = "gardenconnect:alertes:membres"
+# Bail d'une partition : valeur = instance propriétaire, expire sans renouvellement
+LEASE_PREFIX = "gardenconnect:alertes:bail:"
+
+# Renouveler (ou libérer) les baux encore détenus ; retourne les indices perdus
+_RENEW = """
+local lost = {}
+for i, key in ipairs(KEYS) do
+    if redis.call('get', key) == ARGV[1] then
+        redis.call('pexpire', key, ARGV[2])
+    else
+        table.insert(lost, i - 1)
+    end
+end
+return lost
+"""
+_RELEASE = """
+for _, key in ipairs(KEYS) do
+    if redis.call('get', key) == ARGV[1] then
+        redis.call('del', key)
+    end
+end
+return 0
+"""
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class ShardMembership:
+    """
+    Une instance s'annonce dans ``MEMBERS_KEY`` et détient un bail Redis par
+    partition possédée. Le bail garantit un seul propriétaire à la fois :
+    une partition n'est prise qu'une fois libérée ou expirée.
+    """
+
+    def __init__(self, member_id: str = None):
+        self.member_id = member_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+    @staticmethod
+    def _lease_key(slot: int) -> str:
+        return f"{LEASE_PREFIX}{slot}"
+
+    async def heartbeat(self, redis_conn) -> List[str]:
+        """Signaler sa présence ; retourne les instances vivantes"""
+        now = time.time()
+        async with redis_conn.pipeline(transaction=False) as pipe:
+            pipe.zadd(MEMBERS_KEY, {self.member_id: now + settings.alert_lease_ttl})
+            pipe.zremrangebyscore(MEMBERS_KEY, 0, now)
+            pipe.zrange(MEMBERS_KEY, 0, -1)
+            _, _, members = await pipe.execute()
+        return [_decode(member) for member in members]
+
+    async def acquire(self, redis_conn, slot: int) -> bool:
+        key = self._lease_key(slot)
+        if await redis_conn.set(key, self.member_id, nx=True, px=settings.alert_lease_ttl * 1000):
+            return True
+        return _decode(await redis_conn.get(key)) == self.member_id  # bail déjà détenu (reconnexion)
+
+    async def renew(self, redis_conn, slots: Iterable[int]) -> Set[int]:
+        """Prolonger les baux ; retourne les partitions perdues (bail expiré et repris)"""
+        slots = sorted(slots)
+        if not slots:
+            return set()
+        lost = await redis_conn.eval(
+            _RENEW, len(slots), *[self._lease_key(slot) for slot in slots],
+            self.member_id, settings.alert_lease_ttl * 1000,
+        )
+        return {slots[int(i)] for i in lost}
+
+    async def release(self, redis_conn, slots: Iterable[int]):
+        slots = list(slots)
+        if slots:
+            await redis_conn.eval(_RELEASE, len(slots), *[self._lease_key(slot) for slot in slots], self.member_id)
+
+    async def leave(self, redis_conn, slots: Iterable[int]):
+        """Départ volontaire : les autres instances reprennent les partitions sans attendre l'expiration"""
+        await self.release(redis_conn, slots)
+        await redis_conn.zrem(MEMBERS_KEY, self.member_id)
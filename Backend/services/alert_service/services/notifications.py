@@ -0,0 +1,365 @@
+"""Envoi des notifications d'alerte par email : file Redis, regroupement, relances"""
+import asyncio
+import json
+import logging
+import os
+import smtplib
+import socket
+import time
+import uuid
+from email.message import EmailMessage
+from pathlib import Path
+from string import Template
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlmodel import select
+
+from shared.config import get_alert_settings
+from shared.database import SessionLocal, get_redis
+from shared.models.alert import Alerte
+from shared.models.node import NoeudArduino
+from shared.models.sensor import Capteur
+from shared.models.space import EspaceHierarchie, EspaceUtilisateur
+from shared.models.user import Utilisateur
+from shared.schemas.alert import AlerteNotification
+
+settings = get_alert_settings()
+logger = logging.getLogger(__name__)
+
+# Déclenchements à notifier (alimentée par le moteur)
+QUEUE_KEY = "gardenconnect:notifications:file"
+# Déclenchements en cours de répartition, une liste par instance ; instances
+# vivantes (score : échéance de présence)
+PROCESSING_PREFIX = "gardenconnect:notifications:en_cours:"
+DISPATCHERS_KEY = "gardenconnect:notifications:instances"
+# Destinataires ayant des notifications en attente de regroupement (score : échéance)
+DIGESTS_KEY = "gardenconnect:notifications:digests"
+DIGEST_PREFIX = "gardenconnect:notifications:digest:"
+# Emails prêts à partir ou à relancer (score : échéance)
+OUTBOX_KEY = "gardenconnect:notifications:envois"
+# Emails en cours d'envoi (score : échéance de la réservation)
+CLAIMED_KEY = "gardenconnect:notifications:reserves"
+
+# Remettre en envoi les réservations expirées, puis réserver les emails dus
+_CLAIM = """
+for _, raw in ipairs(redis.call('zrangebyscore', KEYS[2], 0, ARGV[1])) do
+    redis.call('zrem', KEYS[2], raw)
+    redis.call('zadd', KEYS[1], ARGV[1], raw)
+end
+local due = redis.call('zrangebyscore', KEYS[1], 0, ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, raw in ipairs(due) do
+    redis.call('zrem', KEYS[1], raw)
+    redis.call('zadd', KEYS[2], ARGV[3], raw)
+end
+return due
+"""
+
+DEFAULT_TEMPLATES = {
+    "alerte": "Alerte « $alerte_nom » sur $capteur_nom\n\n$lignes\n",
+    "digest": "$nombre alertes déclenchées :\n\n$lignes\n",
+}
+
+
+async def enqueue_notifications(payloads: Iterable[dict]):
+    """Mettre des déclenchements en file (appelé par le moteur, sans attendre l'envoi)"""
+    messages = [json.dumps(payload, default=str) for payload in payloads]
+    if not messages:
+        return
+    try:
+        redis_conn = await get_redis()
+        await redis_conn.lpush(QUEUE_KEY, *messages)
+    except Exception as e:
+        logger.warning(f"Mise en file des notifications impossible: {e}")
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def render(name: str, **fields) -> str:
+    """Gabarit ``<email_template_dir>/<name>.txt`` s'il existe, sinon gabarit par défaut"""
+    path = Path(settings.email_template_dir) / f"{name}.txt"
+    template = path.read_text(encoding="utf-8") if path.is_file() else DEFAULT_TEMPLATES[name]
+    return Template(template).safe_substitute(**fields)
+
+
+def notification_line(notification: AlerteNotification) -> str:
+    return f"- {notification.declenchee_a:%d/%m/%Y %H:%M} · {notification.message or notification.alerte_nom}"
+
+
+def build_email(notifications: List[AlerteNotification]) -> Tuple[str, str]:
+    """Sujet et corps : un email par alerte, ou un récapitulatif si plusieurs"""
+    lignes = "\n".join(notification_line(n) for n in notifications)
+    if len(notifications) == 1:
+        notification = notifications[0]
+        subject = f"[GardenConnect] Alerte : {notification.alerte_nom}"
+        body = render("alerte", alerte_nom=notification.alerte_nom, capteur_nom=notification.capteur_nom, lignes=lignes)
+    else:
+        subject = f"[GardenConnect] {len(notifications)} alertes"
+        body = render("digest", nombre=len(notifications), lignes=lignes)
+    return subject, body
+
+
+class SmtpPool:
+    """
+    Connexions SMTP persistantes, réutilisées d'un message à l'autre.
+
+    smtplib est bloquant : chaque envoi s'exécute dans un thread avec une
+    connexion empruntée au pool, rouverte seulement si le serveur l'a fermée.
+    """
+
+    def __init__(self, size: int):
+        self._idle: asyncio.Queue = asyncio.Queue()
+        for _ in range(size):
+            self._idle.put_nowait(None)
+
+    @staticmethod
+    def _connect() -> smtplib.SMTP:
+        conn = smtplib.SMTP(settings.smtp_host, settings.smtp_port, timeout=30)
+        conn.ehlo()
+        if conn.has_extn("starttls"):
+            conn.starttls()
+            conn.ehlo()
+        if settings.smtp_username:
+            conn.login(settings.smtp_username, settings.smtp_password or "")
+        return conn
+
+    @classmethod
+    def _send(cls, conn: Optional[smtplib.SMTP], message: EmailMessage) -> smtplib.SMTP:
+        if conn is None:
+            conn = cls._connect()
+        try:
+            conn.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            conn = cls._connect()
+            conn.send_message(message)
+        return conn
+
+    async def send(self, message: EmailMessage):
+        conn = await self._idle.get()
+        try:
+            conn = await asyncio.to_thread(self._send, conn, message)
+        except Exception:
+            conn = None  # connexion dans un état inconnu : rouverte au prochain envoi
+            raise
+        finally:
+            self._idle.put_nowait(conn)
+
+    async def close(self):
+        while not self._idle.empty():
+            conn = self._idle.get_nowait()
+            if conn is not None:
+                try:
+                    await asyncio.to_thread(conn.quit)
+                except Exception:
+                    pass
+
+
+class NotificationDispatcher:
+    """
+    Trois étapes, reliées par Redis pour survivre à un redémarrage :
+
+    - lecture de la file remplie par le moteur et ajout de chaque
+      déclenchement à la liste de chacun de ses destinataires ;
+    - à l'échéance de la fenêtre de regroupement d'un destinataire, un seul
+      email (récapitulatif s'il y a plusieurs alertes) rejoint les envois ;
+    - envoi concurrent par un nombre borné de tâches partageant le pool SMTP,
+      avec relance à délai exponentiel en cas d'échec.
+
+    Un lot lu reste dans la liste de l'instance jusqu'à sa répartition, et un
+    email réservé dans ``CLAIMED_KEY`` jusqu'à l'accusé d'envoi : les lots
+    d'une instance arrêtée sont remis en file par les autres, ses emails le
+    sont à l'expiration de la réservation.
+    """
+
+    def __init__(self, instance_id: str = None):
+        self.instance_id = instance_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.processing_key = PROCESSING_PREFIX + self.instance_id
+        self.stats = {"recues": 0, "envoyees": 0, "relances": 0, "abandonnees": 0}
+
+    @staticmethod
+    def _resolve(alerte_ids: List[int]) -> Dict[int, Tuple[Alerte, str, List[str]]]:
+        """Alerte, nom du capteur et emails des membres de l'espace et de ses ancêtres (appelé dans un thread)"""
+        db = SessionLocal()
+        try:
+            rows = db.execute(
+                select(Alerte, Capteur.nom, NoeudArduino.espace_id)
+                .join(Capteur, Capteur.id == Alerte.capteur_id)
+                .join(NoeudArduino, NoeudArduino.id == Capteur.noeud_id)
+                .where(Alerte.id.in_(alerte_ids))
+            ).all()
+            recipients: Dict[int, List[str]] = {}
+            resolved = {}
+            for alerte, capteur_nom, espace_id in rows:
+                if espace_id not in recipients:
+                    ancestors = select(EspaceHierarchie.ancetre_id).where(EspaceHierarchie.descendant_id == espace_id)
+                    recipients[espace_id] = list(db.execute(
+                        select(Utilisateur.email).distinct()
+                        .join(EspaceUtilisateur, EspaceUtilisateur.utilisateur_id == Utilisateur.id)
+                        .where(EspaceUtilisateur.espace_id.in_(ancestors))
+                    ).scalars().all())
+                resolved[alerte.id] = (alerte, capteur_nom, recipients[espace_id])
+            return resolved
+        finally:
+            db.close()
+
+    async def _intake(self, redis_conn) -> int:
+        """Répartir un lot de déclenchements par destinataire"""
+        raw = await redis_conn.blmove(QUEUE_KEY, self.processing_key, 1, "RIGHT", "LEFT")
+        if raw is None:
+            return 0
+        batch = [raw]
+        while len(batch) < settings.notification_batch_size:
+            raw = await redis_conn.lmove(QUEUE_KEY, self.processing_key, "RIGHT", "LEFT")
+            if raw is None:
+                break
+            batch.append(raw)
+
+        payloads = [json.loads(raw) for raw in batch]
+        resolved = await asyncio.to_thread(self._resolve, list({p["alerte_id"] for p in payloads}))
+        due = time.time() + settings.notification_digest_window
+        async with redis_conn.pipeline(transaction=True) as pipe:
+            for payload in payloads:
+                if payload["alerte_id"] not in resolved:
+                    continue  # alerte supprimée entre-temps
+                alerte, capteur_nom, recipients = resolved[payload["alerte_id"]]
+                valeur = payload.get("valeur")
+                notification = AlerteNotification(
+                    alerte_id=alerte.id,
+                    alerte_nom=alerte.nom,
+                    capteur_nom=capteur_nom,
+                    valeur_actuelle=valeur[0] if isinstance(valeur, list) else valeur,
+                    seuil=alerte.seuil,
+                    condition=alerte.condition,
+                    declenchee_a=payload["declenchee_a"],
+                    message=payload.get("message"),
+                )
+                for recipient in recipients:
+                    pipe.rpush(DIGEST_PREFIX + recipient, notification.json())
+                    pipe.zadd(DIGESTS_KEY, {recipient: due}, nx=True)
+            for raw in batch:
+                pipe.lrem(self.processing_key, 1, raw)
+            await pipe.execute()
+        self.stats["recues"] += len(batch)
+        return len(batch)
+
+    async def _flush_digests(self, redis_conn):
+        """Transformer les regroupements arrivés à échéance en emails à envoyer"""
+        now = time.time()
+        for recipient in await redis_conn.zrangebyscore(DIGESTS_KEY, 0, now):
+            recipient = _decode(recipient)
+            async with redis_conn.pipeline(transaction=True) as pipe:
+                pipe.lrange(DIGEST_PREFIX + recipient, 0, -1)
+                pipe.delete(DIGEST_PREFIX + recipient)
+                pipe.zrem(DIGESTS_KEY, recipient)
+                items, _, removed = await pipe.execute()
+            if not removed or not items:
+                continue  # pris par une autre instance
+            notifications = [AlerteNotification.parse_raw(item) for item in items]
+            subject, body = build_email(notifications)
+            envoi = json.dumps({"to": recipient, "subject": subject, "body": body, "attempt": 0, "created": now})
+            await redis_conn.zadd(OUTBOX_KEY, {envoi: now})
+
+    async def _heartbeat(self, redis_conn, now: float = None):
+        """Signaler sa présence et remettre en file les lots des instances arrêtées"""
+        now = now or time.time()
+        await redis_conn.zadd(DISPATCHERS_KEY, {self.instance_id: now + settings.alert_lease_ttl})
+        for instance in await redis_conn.zrangebyscore(DISPATCHERS_KEY, 0, now):
+            instance = _decode(instance)
+            recovered = 0
+            while await redis_conn.lmove(PROCESSING_PREFIX + instance, QUEUE_KEY, "RIGHT", "RIGHT"):
+                recovered += 1
+            await redis_conn.zrem(DISPATCHERS_KEY, instance)
+            if recovered:
+                logger.warning(f"{recovered} notifications de l'instance {instance} remises en file")
+
+    async def _claim_due(self, redis_conn, now: float = None) -> List[Tuple[str, dict]]:
+        """Emails dont l'échéance est passée, réservés par cette instance jusqu'à l'accusé d'envoi"""
+        now = now or time.time()
+        due = await redis_conn.eval(
+            _CLAIM, 2, OUTBOX_KEY, CLAIMED_KEY,
+            now, settings.notification_batch_size, now + settings.notification_claim_timeout,
+        )
+        return [(_decode(raw), json.loads(raw)) for raw in due]
+
+    async def _deliver(self, pool: SmtpPool, redis_conn, raw: str, envoi: dict):
+        message = EmailMessage()
+        message["From"] = settings.notification_sender
+        message["To"] = envoi["to"]
+        message["Subject"] = envoi["subject"]
+        message.set_content(envoi["body"])
+        try:
+            await pool.send(message)
+            self.stats["envoyees"] += 1
+        except Exception as e:
+            envoi["attempt"] += 1
+            if envoi["attempt"] > settings.max_notification_retries:
+                self.stats["abandonnees"] += 1
+                logger.error(f"Notification à {envoi['to']} abandonnée après {envoi['attempt']} essais: {e}")
+            else:
+                delay = settings.notification_retry_delay * 60 * 2 ** (envoi["attempt"] - 1)
+                self.stats["relances"] += 1
+                logger.warning(f"Envoi à {envoi['to']} échoué, nouvel essai dans {delay}s: {e}")
+                async with redis_conn.pipeline(transaction=True) as pipe:
+                    pipe.zrem(CLAIMED_KEY, raw)
+                    pipe.zadd(OUTBOX_KEY, {json.dumps(envoi): time.time() + delay})
+                    await pipe.execute()
+                return
+        await redis_conn.zrem(CLAIMED_KEY, raw)
+
+    async def _run_intake(self):
+        redis_conn = await get_redis()
+        next_heartbeat = 0.0
+        while True:
+            if time.monotonic() >= next_heartbeat:
+                await self._heartbeat(redis_conn)
+                next_heartbeat = time.monotonic() + settings.alert_member_heartbeat
+            await self._intake(redis_conn)
+
+    async def _run_senders(self):
+        redis_conn = await get_redis()
+        pool = SmtpPool(settings.notification_smtp_pool_size)
+        pending: asyncio.Queue = asyncio.Queue(maxsize=settings.notification_workers * 2)
+
+        async def worker():
+            while True:
+                raw, envoi = await pending.get()
+                try:
+                    await self._deliver(pool, redis_conn, raw, envoi)
+                except Exception as e:
+                    # Le message reste réservé et revient dans la file à l'expiration
+                    logger.error(f"Traitement de la notification à {envoi['to']} interrompu: {e}")
+                finally:
+                    pending.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(settings.notification_workers)]
+        try:
+            while True:
+                await self._flush_digests(redis_conn)
+                claimed = await self._claim_due(redis_conn)
+                for item in claimed:
+                    await pending.put(item)
+                if not claimed:
+                    await asyncio.sleep(1)
+        finally:
+            for task in workers:
+                task.cancel()
+            await pool.close()
+
+    async def run(self):
+        """Tâche de fond du service d'alertes"""
+        while True:
+            tasks = [asyncio.create_task(self._run_intake()), asyncio.create_task(self._run_senders())]
+            try:
+                await asyncio.gather(*tasks)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Envoi des notifications interrompu: {e}")
+                await asyncio.sleep(5)
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+
+notification_dispatcher = NotificationDispatcher()
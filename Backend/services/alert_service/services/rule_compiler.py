@@ -0,0 +1,53 @@
+"""Compilation des règles d'alerte en fonctions spécialisées, une fois par version de la règle"""
+import operator
+from functools import partial
+from typing import Callable, Sequence, Tuple
+
+# Opérateur miroir : partial(FLIPPED[c], seuil)(valeur) == valeur <c> seuil
+FLIPPED = {"lt": operator.gt, "lte": operator.ge, "eq": operator.eq, "gte": operator.le, "gt": operator.lt}
+# Comparaison en source Python, pour les règles composites générées
+SOURCE = {"lt": "{x} < {t}", "lte": "{x} <= {t}", "eq": "{x} == {t}", "gte": "{x} >= {t}", "gt": "{x} > {t}"}
+
+
+def compile_match(condition: str, seuil: float) -> Callable[[float], bool]:
+    """valeur -> condition vraie ; partial d'un opérateur C, sans recherche de la condition"""
+    return partial(FLIPPED[condition], seuil)
+
+
+def compile_recovery(condition: str, seuil: float, hysteresis: float) -> Callable[[float], bool]:
+    """valeur -> condition fausse même décalée de l'hystérésis"""
+    if condition == "eq":
+        return lambda valeur: abs(valeur - seuil) > hysteresis
+    if condition == "gt":  # valeur <= seuil - h
+        return partial(operator.ge, seuil - hysteresis)
+    if condition == "gte":  # valeur < seuil - h
+        return partial(operator.gt, seuil - hysteresis)
+    if condition == "lt":  # valeur >= seuil + h
+        return partial(operator.le, seuil + hysteresis)
+    return partial(operator.lt, seuil + hysteresis)  # lte : valeur > seuil + h
+
+
+def compile_terms(
+    terms: Sequence, combinaison: str, hysteresis: float
+) -> Tuple[Callable[[Sequence[float]], bool], Callable[[Sequence[float]], bool]]:
+    """
+    (condition vraie, retour à la normale) d'une règle composite, sur la
+    liste des valeurs de ses conditions. Le code est généré en une seule
+    expression booléenne ; les seuils sont liés par nom, jamais formatés
+    dans la source.
+    """
+    joiner = " and " if combinaison == "and" else " or "
+    namespace = {"h": hysteresis}
+    matches, widened = [], []
+    for i, term in enumerate(terms):
+        x = f"v[{i}]"
+        namespace[f"s{i}"] = term.seuil
+        matches.append(SOURCE[term.condition].format(x=x, t=f"s{i}"))
+        if term.condition == "eq":
+            widened.append(f"abs({x} - s{i}) <= h")
+        else:
+            shift = -hysteresis if term.condition in ("gt", "gte") else hysteresis
+            namespace[f"w{i}"] = term.seuil + shift
+            widened.append(SOURCE[term.condition].format(x=x, t=f"w{i}"))
+    source = f"(lambda v: {joiner.join(matches)}), (lambda v: not ({joiner.join(widened)}))"
+    return eval(source, namespace)
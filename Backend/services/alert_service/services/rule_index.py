@@ -0,0 +1,313 @@
+"""Index en mémoire des règles d'alerte actives, par capteur"""
+import operator
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+from shared.models.alert import Alerte
+from services.alert_service.services.rule_compiler import compile_match, compile_recovery, compile_terms
+
+OPERATORS = {
+    "lt": operator.lt,
+    "lte": operator.le,
+    "eq": operator.eq,
+    "gte": operator.ge,
+    "gt": operator.gt,
+}
+SYMBOLS = {"lt": "<", "lte": "<=", "eq": "=", "gte": ">=", "gt": ">"}
+
+
+class Rule:
+    """
+    Copie immuable d'une alerte active, détachée de la session.
+
+    ``matches`` et ``recovered`` sont compilés à la construction : la
+    condition n'est plus recherchée à chaque mesure.
+    """
+
+    __slots__ = (
+        "id", "capteur_id", "nom", "condition", "seuil", "hysteresis", "duree_minimale", "parent_id",
+        "matches", "recovered",
+    )
+
+    def __init__(
+        self, id: int, capteur_id: int, nom: str, condition: str, seuil: float,
+        hysteresis: float = 0.0, duree_minimale: int = 0, parent_id: Optional[int] = None,
+    ):
+        self.id, self.capteur_id, self.nom = id, capteur_id, nom
+        self.condition, self.seuil = condition, seuil
+        self.hysteresis, self.duree_minimale = hysteresis, duree_minimale
+        self.parent_id = parent_id
+        self.matches = compile_match(condition, seuil)
+        self.recovered = compile_recovery(condition, seuil, hysteresis)
+
+    @classmethod
+    def from_alerte(cls, alerte: Alerte) -> "Rule":
+        return cls(
+            alerte.id, alerte.capteur_id, alerte.nom, alerte.condition, alerte.seuil,
+            alerte.hysteresis or 0.0, alerte.duree_minimale or 0, alerte.alerte_parente_id,
+        )
+
+    def describe(self, valeur: float) -> str:
+        return f"{self.nom}: {valeur} {SYMBOLS[self.condition]} {self.seuil}"
+
+
+class Term:
+    """Condition d'une règle composite : valeur instantanée ou agrégat glissant d'un capteur"""
+
+    __slots__ = ("capteur_id", "condition", "seuil", "agregation", "fenetre")
+
+    def __init__(self, capteur_id: int, condition: str, seuil: float, agregation: str = None, fenetre: int = None):
+        self.capteur_id, self.condition, self.seuil = capteur_id, condition, seuil
+        self.agregation, self.fenetre = agregation, fenetre
+
+    def label(self) -> str:
+        if self.agregation is None:
+            return f"capteur {self.capteur_id}"
+        return f"{self.agregation}({self.capteur_id}, {self.fenetre}s)"
+
+
+class CompositeRule:
+    """
+    Règle sur agrégats glissants et/ou sur plusieurs capteurs.
+
+    Évaluée à chaque mesure de l'un de ses capteurs, sur la liste des
+    valeurs de ses conditions (dans l'ordre de ``terms``). ``matches`` et
+    ``recovered`` sont générés en une seule expression à la construction.
+    """
+
+    __slots__ = (
+        "id", "capteur_id", "nom", "terms", "combinaison", "hysteresis", "duree_minimale", "parent_id",
+        "matches", "recovered",
+    )
+
+    def __init__(
+        self, id: int, capteur_id: int, nom: str, terms: List[Term], combinaison: str = "and",
+        hysteresis: float = 0.0, duree_minimale: int = 0, parent_id: Optional[int] = None,
+    ):
+        self.id, self.capteur_id, self.nom = id, capteur_id, nom
+        self.terms, self.combinaison = terms, combinaison
+        self.hysteresis, self.duree_minimale = hysteresis, duree_minimale
+        self.parent_id = parent_id
+        # Retour à la normale : la combinaison est fausse même avec chaque condition élargie de l'hystérésis
+        self.matches, self.recovered = compile_terms(terms, combinaison, hysteresis)
+
+    @classmethod
+    def from_alerte(cls, alerte: Alerte) -> "CompositeRule":
+        terms = [
+            Term(term.capteur_id, term.condition, term.seuil, term.agregation, term.fenetre)
+            for term in [alerte, *alerte.conditions]
+        ]
+        return cls(
+            alerte.id, alerte.capteur_id, alerte.nom, terms, alerte.combinaison or "and",
+            alerte.hysteresis or 0.0, alerte.duree_minimale or 0, alerte.alerte_parente_id,
+        )
+
+    def sensors(self) -> Set[int]:
+        return {term.capteur_id for term in self.terms}
+
+    def describe(self, valeurs: Sequence[float]) -> str:
+        joiner = " et " if self.combinaison == "and" else " ou "
+        return f"{self.nom}: " + joiner.join(
+            f"{t.label()} = {v:g} {SYMBOLS[t.condition]} {t.seuil}" for t, v in zip(self.terms, valeurs)
+        )
+
+
+def is_composite(alerte: Alerte) -> bool:
+    return alerte.agregation is not None or bool(alerte.conditions)
+
+
+def rule_version(alerte: Alerte) -> Optional[datetime]:
+    """Toute modification d'une alerte met à jour date_modification"""
+    return alerte.date_modification or alerte.date_creation
+
+
+class SensorThresholds:
+    """
+    Seuils d'un capteur triés par condition.
+
+    Pour une valeur x, les règles actives forment un préfixe (gt, gte) ou
+    un suffixe (lt, lte) du tableau trié : un bisect sur l'ancienne et la
+    nouvelle valeur donne exactement les règles franchies entre les deux,
+    sans parcourir les règles qui ne changent pas d'état.
+    """
+
+    __slots__ = ("_sorted", "_eq")
+
+    def __init__(self, rules: Iterable[Rule]):
+        grouped: Dict[str, List[Rule]] = {condition: [] for condition in ("lt", "lte", "gte", "gt")}
+        self._eq: Dict[float, List[Rule]] = {}
+        for rule in rules:
+            if rule.condition == "eq":
+                self._eq.setdefault(rule.seuil, []).append(rule)
+            else:
+                grouped[rule.condition].append(rule)
+        self._sorted: Dict[str, Tuple[List[float], List[Rule]]] = {}
+        for condition, group in grouped.items():
+            group.sort(key=lambda rule: rule.seuil)
+            self._sorted[condition] = ([rule.seuil for rule in group], group)
+
+    def _bounds(self, condition: str, seuils: List[float], valeur: float) -> slice:
+        """Tranche des règles actives pour ``valeur``"""
+        if condition == "gt":  # seuil < valeur
+            return slice(0, bisect_left(seuils, valeur))
+        if condition == "gte":  # seuil <= valeur
+            return slice(0, bisect_right(seuils, valeur))
+        if condition == "lt":  # seuil > valeur
+            return slice(bisect_right(seuils, valeur), len(seuils))
+        return slice(bisect_left(seuils, valeur), len(seuils))  # lte : seuil >= valeur
+
+    def active(self, valeur: float) -> List[Rule]:
+        rules = list(self._eq.get(valeur, ()))
+        for condition, (seuils, group) in self._sorted.items():
+            rules.extend(group[self._bounds(condition, seuils, valeur)])
+        return rules
+
+    def transitions(self, previous: float, valeur: float) -> Tuple[List[Rule], List[Rule]]:
+        """Règles (activées, désactivées) en passant de ``previous`` à ``valeur``"""
+        activated: List[Rule] = []
+        deactivated: List[Rule] = []
+        if previous == valeur:
+            return activated, deactivated
+        for condition, (seuils, group) in self._sorted.items():
+            old = self._bounds(condition, seuils, previous)
+            new = self._bounds(condition, seuils, valeur)
+            # Préfixe ou suffixe : la différence est une seule tranche contiguë
+            if condition in ("gt", "gte"):
+                if new.stop > old.stop:
+                    activated.extend(group[old.stop:new.stop])
+                else:
+                    deactivated.extend(group[new.stop:old.stop])
+            else:
+                if new.start < old.start:
+                    activated.extend(group[new.start:old.start])
+                else:
+                    deactivated.extend(group[old.start:new.start])
+        deactivated.extend(self._eq.get(previous, ()))
+        activated.extend(self._eq.get(valeur, ()))
+        return activated, deactivated
+
+
+class RuleIndex:
+    """
+    Règles actives regroupées par capteur : une mesure n'est comparée
+    qu'aux règles de son capteur. Les règles de seuil passent par les
+    tableaux triés ; les règles composites sont indexées sous chacun de
+    leurs capteurs.
+
+    Les règles compilées sont gardées par version (``rule_version``) : un
+    rechargement ne recompile que les alertes modifiées depuis.
+    """
+
+    def __init__(self):
+        self._by_sensor: Dict[int, Dict[int, Rule]] = {}
+        self._sensor_of: Dict[int, int] = {}
+        self._thresholds: Dict[int, SensorThresholds] = {}  # reconstruits à la demande
+        self._composites: Dict[int, CompositeRule] = {}
+        self._derived: Dict[int, Dict[int, CompositeRule]] = {}  # capteur_id -> règles composites
+        self._compiled: Dict[int, Tuple[Optional[datetime], Union[Rule, CompositeRule]]] = {}
+        self.compilations = 0
+
+    def __len__(self) -> int:
+        return len(self._sensor_of)
+
+    def load(self, alertes: Iterable[Alerte]):
+        """Remplacer tout le contenu (les règles inactives sont ignorées)"""
+        self._by_sensor, self._sensor_of, self._thresholds = {}, {}, {}
+        self._composites, self._derived = {}, {}
+        for alerte in alertes:
+            self.upsert(alerte)
+        self._compiled = {a: c for a, c in self._compiled.items() if a in self._sensor_of}
+
+    def _compile(self, alerte: Alerte) -> Union[Rule, CompositeRule]:
+        version = rule_version(alerte)
+        cached = self._compiled.get(alerte.id)
+        if cached is not None and version is not None and cached[0] == version:
+            return cached[1]
+        rule = CompositeRule.from_alerte(alerte) if is_composite(alerte) else Rule.from_alerte(alerte)
+        self._compiled[alerte.id] = (version, rule)
+        self.compilations += 1
+        return rule
+
+    def upsert(self, alerte: Alerte):
+        """Prendre en compte une alerte créée ou modifiée"""
+        self._unindex(alerte.id)
+        if not alerte.est_active:
+            self._compiled.pop(alerte.id, None)
+            return
+        rule = self._compile(alerte)
+        self._sensor_of[alerte.id] = alerte.capteur_id
+        if isinstance(rule, CompositeRule):
+            self._composites[alerte.id] = rule
+            for capteur_id in rule.sensors():
+                self._derived.setdefault(capteur_id, {})[alerte.id] = rule
+        else:
+            self._by_sensor.setdefault(alerte.capteur_id, {})[alerte.id] = rule
+            self._thresholds.pop(alerte.capteur_id, None)
+
+    def remove(self, alerte_id: int):
+        self._unindex(alerte_id)
+        self._compiled.pop(alerte_id, None)
+
+    def _unindex(self, alerte_id: int):
+        capteur_id = self._sensor_of.pop(alerte_id, None)
+        if capteur_id is None:
+            return
+        composite = self._composites.pop(alerte_id, None)
+        if composite is not None:
+            for sensor in composite.sensors():
+                rules = self._derived[sensor]
+                del rules[alerte_id]
+                if not rules:
+                    del self._derived[sensor]
+            return
+        rules = self._by_sensor[capteur_id]
+        del rules[alerte_id]
+        self._thresholds.pop(capteur_id, None)
+        if not rules:
+            del self._by_sensor[capteur_id]
+
+    def sensor_of(self, alerte_id: int) -> Optional[int]:
+        return self._sensor_of.get(alerte_id)
+
+    def get(self, alerte_id: int) -> Union[Rule, CompositeRule, None]:
+        capteur_id = self._sensor_of.get(alerte_id)
+        if capteur_id is None:
+            return None
+        return self._composites.get(alerte_id) or self._by_sensor[capteur_id][alerte_id]
+
+    def sensors(self) -> List[int]:
+        return list(self._by_sensor.keys() | self._derived.keys())
+
+    def composites(self) -> List[CompositeRule]:
+        return list(self._composites.values())
+
+    def derived(self, capteur_id: int) -> List[CompositeRule]:
+        """Règles composites dépendant d'un capteur"""
+        return list(self._derived.get(capteur_id, {}).values())
+
+    def windows(self) -> Set[Tuple[int, int]]:
+        """Fenêtres glissantes (capteur_id, durée) requises par les règles composites"""
+        return {
+            (term.capteur_id, term.fenetre)
+            for rule in self._composites.values() for term in rule.terms if term.agregation is not None
+        }
+
+    def rules(self, capteur_id: int) -> List[Rule]:
+        return list(self._by_sensor.get(capteur_id, {}).values())
+
+    def _sensor_thresholds(self, capteur_id: int) -> Optional[SensorThresholds]:
+        thresholds = self._thresholds.get(capteur_id)
+        if thresholds is None and capteur_id in self._by_sensor:
+            thresholds = self._thresholds[capteur_id] = SensorThresholds(self._by_sensor[capteur_id].values())
+        return thresholds
+
+    def evaluate(self, capteur_id: int, valeur: float) -> List[Rule]:
+        """Règles du capteur dont la condition est vraie pour ``valeur``"""
+        thresholds = self._sensor_thresholds(capteur_id)
+        return thresholds.active(valeur) if thresholds is not None else []
+
+    def transitions(self, capteur_id: int, previous: float, valeur: float) -> Tuple[List[Rule], List[Rule]]:
+        """Règles du capteur (activées, désactivées) entre deux mesures consécutives"""
+        thresholds = self._sensor_thresholds(capteur_id)
+        return thresholds.transitions(previous, valeur) if thresholds is not None else ([], [])
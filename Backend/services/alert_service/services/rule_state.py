@@ -0,0 +1,55 @@
+"""États d'une règle d'alerte : ok → pending → active → resolue → ok"""
+import json
+from datetime import datetime
+from typing import NamedTuple, Optional, Sequence, Union
+
+from services.alert_service.services.rule_index import CompositeRule, Rule
+
+OK = "ok"
+PENDING = "pending"
+ACTIVE = "active"
+RESOLVED = "resolue"
+
+
+class RuleState(NamedTuple):
+    etat: str = OK
+    depuis: Optional[datetime] = None  # début du dépassement
+    historique_id: Optional[int] = None  # ligne historique_alertes ouverte (état active)
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "etat": self.etat,
+            "depuis": self.depuis.isoformat() if self.depuis else None,
+            "historique_id": self.historique_id,
+        })
+
+    @classmethod
+    def from_json(cls, raw) -> "RuleState":
+        data = json.loads(raw)
+        depuis = datetime.fromisoformat(data["depuis"]) if data.get("depuis") else None
+        return cls(data["etat"], depuis, data.get("historique_id"))
+
+
+OK_STATE = RuleState()
+
+
+def step(
+    rule: Union[Rule, CompositeRule], state: RuleState, valeur: Union[float, Sequence[float]], horodatage: datetime,
+) -> RuleState:
+    """
+    État suivant d'une règle pour une mesure (valeurs des conditions pour une règle composite).
+
+    Une règle vraie passe en attente, puis devient active une fois vraie
+    depuis ``duree_minimale`` secondes ; une règle active n'est résolue que
+    lorsque la valeur sort de la bande d'hystérésis. L'état ``resolue`` est
+    transitoire : il signale la clôture à écrire, puis la règle repart de ``ok``.
+    """
+    if state.etat == ACTIVE:
+        return RuleState(RESOLVED, horodatage, state.historique_id) if rule.recovered(valeur) else state
+    if not rule.matches(valeur):
+        return OK_STATE
+    if state.etat != PENDING:
+        state = RuleState(PENDING, horodatage)
+    if (horodatage - state.depuis).total_seconds() >= rule.duree_minimale:
+        return RuleState(ACTIVE, state.depuis)
+    return state
@@ -0,0 +1,104 @@
+"""Agrégats sur fenêtres glissantes, mis à jour à chaque mesure"""
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+WindowKey = Tuple[int, int]  # (capteur_id, durée en secondes)
+
+
+class SlidingWindow:
+    """
+    Mesures d'un capteur sur les ``duree`` dernières secondes.
+
+    La somme est tenue à jour et le minimum / maximum sont lus en tête de
+    deux files monotones : chaque mesure entre et sort une seule fois, soit
+    un coût O(1) amorti par mesure quel que soit le nombre de mesures dans
+    la fenêtre. Les mesures arrivées dans le désordre sont ignorées.
+    """
+
+    __slots__ = ("duree", "since", "_items", "_sum", "_min", "_max")
+
+    def __init__(self, duree: int, since: datetime):
+        self.duree = timedelta(seconds=duree)
+        self.since = since  # début de la période couverte
+        self._items = deque()
+        self._sum = 0.0
+        self._min = deque()
+        self._max = deque()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def push(self, horodatage: datetime, valeur: float):
+        if self._items and horodatage < self._items[-1][0]:
+            return
+        item = (horodatage, valeur)
+        self._items.append(item)
+        self._sum += valeur
+        while self._min and self._min[-1][1] >= valeur:
+            self._min.pop()
+        self._min.append(item)
+        while self._max and self._max[-1][1] <= valeur:
+            self._max.pop()
+        self._max.append(item)
+
+    def _evict(self, now: datetime):
+        limit = now - self.duree
+        while self._items and self._items[0][0] < limit:
+            self._sum -= self._items.popleft()[1]
+        if not self._items:
+            self._sum = 0.0  # pas de dérive d'arrondi entre deux périodes
+        while self._min and self._min[0][0] < limit:
+            self._min.popleft()
+        while self._max and self._max[0][0] < limit:
+            self._max.popleft()
+
+    def value(self, agregation: str, now: datetime) -> Optional[float]:
+        """Agrégat à ``now`` ; None tant que la fenêtre n'est pas couverte ou sans mesure"""
+        self._evict(now)
+        if not self._items or now - self.since < self.duree:
+            return None
+        if agregation == "avg":
+            return self._sum / len(self._items)
+        if agregation == "min":
+            return self._min[0][1]
+        if agregation == "max":
+            return self._max[0][1]
+        # rate : variation par heure entre la première et la dernière mesure
+        (t0, v0), (t1, v1) = self._items[0], self._items[-1]
+        seconds = (t1 - t0).total_seconds()
+        return (v1 - v0) * 3600 / seconds if seconds > 0 else None
+
+
+class WindowStore:
+    """Fenêtres glissantes requises par les règles, par capteur et par durée"""
+
+    def __init__(self):
+        self._windows: Dict[WindowKey, SlidingWindow] = {}
+        self._by_sensor: Dict[int, List[SlidingWindow]] = {}
+
+    def keys(self) -> Set[WindowKey]:
+        return set(self._windows)
+
+    def add(self, key: WindowKey, since: datetime, readings: Iterable[Tuple[datetime, float]] = ()):
+        """Créer une fenêtre, préremplie avec les mesures récentes du capteur"""
+        window = SlidingWindow(key[1], since)
+        for horodatage, valeur in readings:
+            window.push(horodatage, valeur)
+        self._windows[key] = window
+        self._by_sensor.setdefault(key[0], []).append(window)
+
+    def retain(self, keys: Set[WindowKey]):
+        """Abandonner les fenêtres qui ne servent plus à aucune règle"""
+        self._windows = {key: window for key, window in self._windows.items() if key in keys}
+        self._by_sensor = {}
+        for (capteur_id, _), window in self._windows.items():
+            self._by_sensor.setdefault(capteur_id, []).append(window)
+
+    def push(self, capteur_id: int, horodatage: datetime, valeur: float):
+        for window in self._by_sensor.get(capteur_id, ()):
+            window.push(horodatage, valeur)
+
+    def value(self, capteur_id: int, duree: int, agregation: str, now: datetime) -> Optional[float]:
+        window = self._windows.get((capteur_id, duree))
+        return None if window is None else window.value(agregation, now)
@@ -0,0 +1,39 @@
+"""
+Instance supplémentaire du moteur d'alertes, sans API
+
+Les instances (API comprise) se partagent les partitions de capteurs :
+
+    python -m services.alert_service.worker
+"""
+import asyncio
+import logging
+
+from shared.config import get_settings
+from shared.database import close_db
+from services.alert_service.services.engine import alert_engine, run_incident_check, run_rule_reload
+
+settings = get_settings()
+
+
+async def main():
+    tasks = [
+        asyncio.create_task(alert_engine.run()),
+        asyncio.create_task(run_rule_reload(alert_engine)),
+        asyncio.create_task(run_incident_check(alert_engine)),
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Laisser le moteur libérer ses partitions avant de fermer les connexions
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await close_db()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=settings.log_level)
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
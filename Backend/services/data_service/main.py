@@ -6,11 +6,12 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer
 from contextlib import asynccontextmanager
+import asyncio
 import time
 import logging
 
 from shared.config import get_data_settings
-from shared.database import init_db, close_db, check_database_connection, check_redis_connection
+from shared.database import SessionLocal, init_db, close_db, check_database_connection, check_redis_connection
 from shared.schemas.common import HealthCheckResponse, MetricsResponse
 
 # Import des routes
@@ -18,6 +19,15 @@ from services.data_service.routes.spaces import router as spaces_router
 from services.data_service.routes.nodes import router as nodes_router
 from services.data_service.routes.sensors import router as sensors_router
 from services.data_service.routes.data import router as data_router
+from services.data_service.routes.exports import router as exports_router
+from services.data_service.routes.stream import router as stream_router
+from services.data_service.services.partition_service import run_partition_maintenance
+from services.data_service.services.export_job_service import run_export_cleanup
+from services.data_service.services.compaction_service import run_compaction
+from services.data_service.services.rollup_service import run_rollups
+from services.data_service.services.last_value_cache import last_values
+from services.data_service.services.stream_hub import stream_hub
+from shared.utils.space_counters import reconcile_space_counters
 
 settings = get_data_settings()
 logging.basicConfig(level=getattr(logging, settings.log_level.upper()))
@@ -27,12 +37,56 @@ start_time = time.time()
 request_count = 0
 error_count = 0
 
+async def warm_caches():
+    """
+    Préchauffer les caches en mémoire depuis la base. Le tampon des mesures
+    récentes est chargé par stream_hub.listen, après l'abonnement Redis.
+    """
+    db = SessionLocal()
+    try:
+        count = await asyncio.to_thread(last_values.warm, db)
+        logger.info(f"Dernières valeurs chargées pour {count} capteurs")
+        await last_values.publish_all()
+    except Exception as e:
+        logger.error(f"Erreur de préchauffage des caches: {e}")
+    finally:
+        db.close()
+
+def reconcile_counters() -> int:
+    db = SessionLocal()
+    try:
+        return reconcile_space_counters(db)
+    finally:
+        db.close()
+
+async def run_counter_reconciliation():
+    """Recalculer périodiquement les compteurs par espace pour corriger toute dérive"""
+    while True:
+        try:
+            corrected = await asyncio.to_thread(reconcile_counters)
+            if corrected:
+                logger.warning(f"Compteurs corrigés pour {corrected} espaces")
+        except Exception as e:
+            logger.error(f"Erreur de vérification des compteurs: {e}")
+        await asyncio.sleep(settings.space_counters_reconcile_interval)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Démarrage du service de données")
     await init_db()
+    await warm_caches()
+    background_tasks = [
+        asyncio.create_task(run_partition_maintenance()),
+        asyncio.create_task(run_export_cleanup()),
+        asyncio.create_task(run_compaction()),
+        asyncio.create_task(run_rollups()),
+        asyncio.create_task(run_counter_reconciliation()),
+        asyncio.create_task(stream_hub.listen()),
+    ]
     yield
     logger.info("Arrêt du service de données")
+    for task in background_tasks:
+        task.cancel()
     await close_db()
 
 # Configuration OAuth2 pour pointer vers le service d'auth
@@ -74,6 +128,8 @@ app.include_router(spaces_router, prefix="/api/data/spaces", tags=["Espaces"])
 app.include_router(nodes_router, prefix="/api/data/nodes", tags=["Nœuds"])
 app.include_router(sensors_router, prefix="/api/data/sensors", tags=["Capteurs"])
 app.include_router(data_router, prefix="/api/data/records", tags=["Données"])
+app.include_router(exports_router, prefix="/api/data/exports", tags=["Exports"])
+app.include_router(stream_router, prefix="/api/data/stream", tags=["Flux en direct"])
 
 @app.get("/health", response_model=HealthCheckResponse)
 async def health_check():
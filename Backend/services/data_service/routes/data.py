@@ -1,15 +1,86 @@
 """Routes data"""
-from fastapi import APIRouter, Depends
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
 from sqlmodel import Session
 from shared.database import get_db
+from shared.schemas.sensor import (
+    DataAggregated,
+    DataAlignedParams,
+    DataAlignedResponse,
+    DataExportParams,
+    DataListResponse,
+    DataQueryParams,
+    DonneesCapteurCreate,
+    DonneesCapteurResponse,
+)
 from shared.utils.auth import get_current_user
+from services.data_service.services.data_service import DataService
+from services.data_service.services.export_service import EXPORT_CONTENT_TYPES, ExportService
 
 router = APIRouter()
 
-@router.get("/")
-async def get_data(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    return {"message": "Service data en cours de développement"}
 
-@router.post("/")
-async def create_data(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    return {"message": "Création data en cours de développement"}
+def get_query_params(
+    capteurs_ids: Optional[List[int]] = Query(None),
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    limit: int = Query(1000, ge=1, le=10000),
+    offset: int = Query(0, ge=0),
+    aggregation: Optional[str] = Query(None, pattern=r'^(avg|min|max|sum)$'),
+    interval: Optional[str] = Query(None, pattern=r'^(1m|5m|15m|1h|1d)$'),
+    downsample: Optional[int] = Query(None, ge=3, le=10000, description="Nombre maximal de points par capteur"),
+    downsample_method: str = Query("lttb", pattern=r'^(lttb|minmax)$'),
+) -> DataQueryParams:
+    return DataQueryParams(
+        capteurs_ids=capteurs_ids, start=start, end=end, limit=limit,
+        offset=offset, aggregation=aggregation, interval=interval,
+        downsample=downsample, downsample_method=downsample_method,
+    )
+
+
+@router.get("/", response_model=DataListResponse)
+async def get_data(params: DataQueryParams = Depends(get_query_params), db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    service = DataService(db)
+    return await service.get_data(params)
+
+@router.get("/aggregated", response_model=List[DataAggregated])
+async def get_aggregated_data(params: DataQueryParams = Depends(get_query_params), db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    service = DataService(db)
+    return await service.get_aggregated_data(params)
+
+def get_aligned_params(
+    capteurs_ids: List[int] = Query(..., min_length=1, max_length=50),
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    interval: str = Query("1h", pattern=r'^(1m|5m|15m|1h|1d)$'),
+    aggregation: str = Query("avg", pattern=r'^(avg|min|max|sum)$'),
+    fill: str = Query("null", pattern=r'^(null|locf|linear)$', description="Remplissage des trous"),
+    limit: int = Query(1000, ge=1, le=10000),
+    offset: int = Query(0, ge=0),
+) -> DataAlignedParams:
+    return DataAlignedParams(
+        capteurs_ids=capteurs_ids, start=start, end=end, interval=interval,
+        aggregation=aggregation, fill=fill, limit=limit, offset=offset,
+    )
+
+
+@router.get("/aligned", response_model=DataAlignedResponse)
+async def get_aligned_data(params: DataAlignedParams = Depends(get_aligned_params), db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    service = DataService(db)
+    return await service.get_aligned_data(params)
+
+@router.post("/export")
+async def export_data(params: DataExportParams, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    service = ExportService(db)
+    return StreamingResponse(
+        service.stream(params),
+        media_type=EXPORT_CONTENT_TYPES[params.format],
+        headers={"Content-Disposition": f'attachment; filename="{service.filename(params)}"'},
+    )
+
+@router.post("/", response_model=DonneesCapteurResponse)
+async def create_data(data: DonneesCapteurCreate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    service = DataService(db)
+    return await service.create_data(data)
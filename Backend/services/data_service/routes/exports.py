@@ -0,0 +1,81 @@
+"""Routes des jobs d'export asynchrones"""
+import os
+import re
+from datetime import datetime
+from typing import Iterator, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import StreamingResponse
+from shared.schemas.sensor import DataExportParams, ExportJobResponse
+from shared.utils.auth import get_current_user
+from services.data_service.services.export_service import EXPORT_CONTENT_TYPES
+from services.data_service.services.export_job_service import export_jobs
+
+router = APIRouter()
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+_READ_SIZE = 1024 * 1024
+
+
+def _iter_file(path: str, start: int, end: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            data = f.read(min(_READ_SIZE, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+
+@router.post("/", response_model=ExportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_export(params: DataExportParams, current_user=Depends(get_current_user)):
+    job = export_jobs.submit(params, current_user.id)
+    return job.to_response()
+
+@router.get("/{job_id}", response_model=ExportJobResponse)
+async def get_export(job_id: str, current_user=Depends(get_current_user)):
+    return export_jobs.get_job(job_id, current_user.id).to_response()
+
+@router.get("/{job_id}/download")
+async def download_export(job_id: str, range: Optional[str] = Header(None), current_user=Depends(get_current_user)):
+    job = export_jobs.get_job(job_id, current_user.id)
+    if job.statut != "termine" or not os.path.exists(job.path):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Export non disponible")
+    if job.expires_at <= datetime.utcnow():
+        # La purge périodique n'est pas encore passée
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Export expiré")
+
+    size = os.path.getsize(job.path)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'attachment; filename="{job.filename}"',
+        "Expires": job.expires_at.strftime("%a, %d %b %Y %H:%M:%S GMT"),
+    }
+    media_type = EXPORT_CONTENT_TYPES[job.params.format]
+
+    if range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(_iter_file(job.path, 0, size - 1), media_type=media_type, headers=headers)
+
+    match = _RANGE_RE.match(range.strip())
+    if not match or not (match.group(1) or match.group(2)):
+        raise HTTPException(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, headers={"Content-Range": f"bytes */{size}"})
+    if match.group(1):
+        start = int(match.group(1))
+        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+    else:
+        # Suffixe : les N derniers octets
+        start = max(size - int(match.group(2)), 0)
+        end = size - 1
+    if start > end or start >= size:
+        raise HTTPException(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, headers={"Content-Range": f"bytes */{size}"})
+
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        _iter_file(job.path, start, end),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=media_type,
+        headers=headers,
+    )
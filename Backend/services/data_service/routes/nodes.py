@@ -1,15 +1,35 @@
 """Routes nodes"""
-from fastapi import APIRouter, Depends
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Query
 from sqlmodel import Session
 from shared.database import get_db
+from shared.schemas.node import NoeudArduinoCreate, NoeudArduinoResponse, NoeudArduinoUpdate
 from shared.utils.auth import get_current_user
+from services.data_service.services.node_service import NodeService
 
 router = APIRouter()
 
-@router.get("/")
-async def get_nodes(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    return {"message": "Service nodes en cours de développement"}
+@router.get("/", response_model=List[NoeudArduinoResponse])
+async def get_nodes(espace_id: Optional[int] = Query(None), db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    service = NodeService(db)
+    return await service.get_nodes(espace_id)
 
-@router.post("/")
-async def create_node(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    return {"message": "Création nodes en cours de développement"}
+@router.post("/", response_model=NoeudArduinoResponse)
+async def create_node(node_data: NoeudArduinoCreate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    service = NodeService(db)
+    return await service.create_node(node_data)
+
+@router.get("/{node_id}", response_model=NoeudArduinoResponse)
+async def get_node(node_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    service = NodeService(db)
+    return await service.get_node(node_id)
+
+@router.put("/{node_id}", response_model=NoeudArduinoResponse)
+async def update_node(node_id: int, node_data: NoeudArduinoUpdate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    service = NodeService(db)
+    return await service.update_node(node_id, node_data)
+
+@router.delete("/{node_id}")
+async def delete_node(node_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    service = NodeService(db)
+    return await service.delete_node(node_id)
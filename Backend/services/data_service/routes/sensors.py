@@ -1,15 +1,86 @@
 """Routes sensors"""
-from fastapi import APIRouter, Depends
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Query
 from sqlmodel import Session
 from shared.database import get_db
+from shared.schemas.sensor import (
+    CapteurCreate,
+    CapteurHistogram,
+    CapteurPercentiles,
+    CapteurResponse,
+    CapteurStats,
+    CapteurUpdate,
+    CapteurWithLastData,
+)
 from shared.utils.auth import get_current_user
+from services.data_service.services.sensor_service import SensorService
 
 router = APIRouter()
 
-@router.get("/")
-async def get_sensors(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    return {"message": "Service sensors en cours de développement"}
+@router.get("/", response_model=List[CapteurWithLastData])
+async def get_sensors(
+    espace_id: Optional[int] = Query(None),
+    noeud_id: Optional[int] = Query(None),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    service = SensorService(db)
+    return await service.get_sensors_with_last_data(espace_id=espace_id, noeud_id=noeud_id)
 
-@router.post("/")
-async def create_sensor(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    return {"message": "Création sensors en cours de développement"}
+@router.post("/", response_model=CapteurResponse)
+async def create_sensor(sensor_data: CapteurCreate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    service = SensorService(db)
+    return await service.create_sensor(sensor_data)
+
+@router.get("/{sensor_id}", response_model=CapteurResponse)
+async def get_sensor(sensor_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    service = SensorService(db)
+    return await service.get_sensor(sensor_id)
+
+@router.get("/{sensor_id}/stats", response_model=CapteurStats)
+async def get_sensor_stats(
+    sensor_id: int,
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    service = SensorService(db)
+    return await service.get_sensor_stats(sensor_id, start, end)
+
+@router.get("/{sensor_id}/percentiles", response_model=CapteurPercentiles)
+async def get_sensor_percentiles(
+    sensor_id: int,
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    percentiles: List[float] = Query([5, 50, 95]),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    service = SensorService(db)
+    return await service.get_sensor_percentiles(sensor_id, start, end, percentiles)
+
+@router.get("/{sensor_id}/histogram", response_model=CapteurHistogram)
+async def get_sensor_histogram(
+    sensor_id: int,
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    bins: int = Query(20, ge=1, le=200),
+    valeur_min: Optional[float] = Query(None),
+    valeur_max: Optional[float] = Query(None),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    service = SensorService(db)
+    return await service.get_sensor_histogram(sensor_id, start, end, bins, valeur_min, valeur_max)
+
+@router.put("/{sensor_id}", response_model=CapteurResponse)
+async def update_sensor(sensor_id: int, sensor_data: CapteurUpdate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    service = SensorService(db)
+    return await service.update_sensor(sensor_id, sensor_data)
+
+@router.delete("/{sensor_id}")
+async def delete_sensor(sensor_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    service = SensorService(db)
+    return await service.delete_sensor(sensor_id)
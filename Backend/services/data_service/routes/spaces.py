@@ -2,17 +2,24 @@
 from fastapi import APIRouter, Depends, Query
 from sqlmodel import Session
 from typing import List, Optional
+from shared.config import get_data_settings
 from shared.database import get_db
 from shared.schemas.space import *
 from shared.utils.auth import get_current_user
 from services.data_service.services.space_service import SpaceService
 
+settings = get_data_settings()
 router = APIRouter()
 
-@router.get("/", response_model=List[EspaceResponse])
-async def get_spaces(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+@router.get("/", response_model=EspaceListResponse)
+async def get_spaces(
+    after: Optional[int] = Query(None, description="Curseur : id du dernier espace de la page précédente"),
+    per_page: int = Query(settings.default_page_size, ge=1, le=settings.max_page_size),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
     service = SpaceService(db)
-    return await service.get_user_spaces(current_user.id)
+    return await service.get_user_spaces(current_user.id, current_user.is_admin, after, per_page)
 
 @router.post("/", response_model=EspaceResponse)
 async def create_space(space_data: EspaceCreate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
@@ -22,14 +29,42 @@ async def create_space(space_data: EspaceCreate, db: Session = Depends(get_db),
 @router.get("/{space_id}", response_model=EspaceResponse)
 async def get_space(space_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
     service = SpaceService(db)
+    await service.check_access(space_id, current_user.id, current_user.is_admin)
     return await service.get_space(space_id, current_user.id)
 
+@router.get("/{space_id}/hierarchy", response_model=EspaceWithHierarchy)
+async def get_space_hierarchy(space_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    service = SpaceService(db)
+    await service.check_access(space_id, current_user.id, current_user.is_admin)
+    return await service.get_hierarchy(space_id, current_user.id)
+
+@router.get("/{space_id}/tree", response_model=EspaceTree)
+async def get_space_tree(space_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    service = SpaceService(db)
+    await service.check_access(space_id, current_user.id, current_user.is_admin)
+    return await service.get_tree(space_id, current_user.id)
+
+@router.get("/{space_id}/stats", response_model=EspaceWithStats)
+async def get_space_stats(space_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    service = SpaceService(db)
+    await service.check_access(space_id, current_user.id, current_user.is_admin)
+    return await service.get_space_stats(space_id, current_user.id)
+
+@router.get("/{space_id}/ancestors", response_model=List[EspaceResponse])
+async def get_space_ancestors(space_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    service = SpaceService(db)
+    await service.check_access(space_id, current_user.id, current_user.is_admin)
+    await service.get_space(space_id, current_user.id)
+    return await service.get_ancestors(space_id)
+
 @router.put("/{space_id}", response_model=EspaceResponse)
 async def update_space(space_id: int, space_data: EspaceUpdate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
     service = SpaceService(db)
+    await service.check_access(space_id, current_user.id, current_user.is_admin)
     return await service.update_space(space_id, space_data, current_user.id)
 
 @router.delete("/{space_id}")
 async def delete_space(space_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
     service = SpaceService(db)
+    await service.check_access(space_id, current_user.id, current_user.is_admin)
     return await service.delete_space(space_id, current_user.id)
@@ -0,0 +1,153 @@
+"""Routes de flux en direct (WebSocket / Server-Sent Events)"""
+import asyncio
+import json
+from typing import List, Optional, Tuple
+
+from fastapi import APIRouter, Header, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+
+from shared.config import get_data_settings
+from shared.database import SessionLocal
+from shared.models.user import Utilisateur
+from shared.utils.auth import verify_token
+from shared.utils.exceptions import AuthenticationException, ValidationException
+from services.data_service.services.sensor_service import SensorService
+from services.data_service.services.stream_hub import Subscription, stream_hub
+
+router = APIRouter()
+settings = get_data_settings()
+
+
+async def _open_subscription(
+    token: Optional[str], capteur_ids: List[int], noeud_ids: List[int], espace_ids: List[int]
+) -> Tuple[Subscription, List[int]]:
+    """
+    Authentifier le client et résoudre ses capteurs.
+
+    Le token est accepté en paramètre de requête (les navigateurs ne peuvent
+    pas fixer d'en-tête pour EventSource / WebSocket). La session n'est
+    ouverte que le temps de la résolution, pas pour toute la connexion.
+    """
+    if not token:
+        raise AuthenticationException()
+    user_id = int(verify_token(token).get("sub") or 0)
+    db = SessionLocal()
+    try:
+        user = db.get(Utilisateur, user_id)
+        if user is None:
+            raise AuthenticationException()
+        capteurs = await SensorService(db).resolve_sensor_ids(
+            user.id, user.is_admin, capteur_ids, noeud_ids, espace_ids
+        )
+    finally:
+        db.close()
+    if not capteurs:
+        raise ValidationException("aucun capteur accessible pour cet abonnement")
+    return stream_hub.subscribe(capteurs), capteurs
+
+
+def _bearer(authorization: Optional[str]) -> Optional[str]:
+    if authorization and authorization.lower().startswith("bearer "):
+        return authorization[7:]
+    return None
+
+
+@router.get("/sse")
+async def stream_sse(
+    request: Request,
+    capteur_ids: List[int] = Query([]),
+    noeud_ids: List[int] = Query([]),
+    espace_ids: List[int] = Query([]),
+    token: Optional[str] = Query(None),
+    authorization: Optional[str] = Header(None),
+):
+    subscription, capteurs = await _open_subscription(
+        token or _bearer(authorization), capteur_ids, noeud_ids, espace_ids
+    )
+
+    async def events():
+        try:
+            yield f"event: subscribed\ndata: {json.dumps({'capteur_ids': capteurs})}\n\n"
+            while not await request.is_disconnected():
+                message = await subscription.get(settings.stream_heartbeat_interval)
+                if message is None:
+                    yield ": ping\n\n"
+                    continue
+                dropped = subscription.take_dropped()
+                if dropped:
+                    yield f"event: dropped\ndata: {json.dumps({'count': dropped})}\n\n"
+                yield f"event: reading\ndata: {json.dumps(message)}\n\n"
+        finally:
+            stream_hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/ws")
+async def stream_ws(
+    websocket: WebSocket,
+    capteur_ids: List[int] = Query([]),
+    noeud_ids: List[int] = Query([]),
+    espace_ids: List[int] = Query([]),
+    token: Optional[str] = Query(None),
+):
+    """
+    Flux WebSocket. Le client peut remplacer son abonnement en envoyant
+    ``{"capteur_ids": [...], "noeud_ids": [...], "espace_ids": [...]}``.
+    """
+    token = token or _bearer(websocket.headers.get("authorization"))
+    try:
+        subscription, capteurs = await _open_subscription(token, capteur_ids, noeud_ids, espace_ids)
+    except AuthenticationException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    except ValidationException as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail)
+        return
+
+    await websocket.accept()
+    await websocket.send_json({"type": "subscribed", "capteur_ids": capteurs})
+
+    async def receive():
+        nonlocal subscription
+        while True:
+            try:
+                request = await websocket.receive_json()
+            except WebSocketDisconnect:
+                return
+            try:
+                new_subscription, new_capteurs = await _open_subscription(
+                    token, request.get("capteur_ids", []), request.get("noeud_ids", []), request.get("espace_ids", [])
+                )
+            except ValidationException as e:
+                await websocket.send_json({"type": "error", "detail": e.detail})
+                continue
+            stream_hub.unsubscribe(subscription)
+            subscription.wake()
+            subscription = new_subscription
+            await websocket.send_json({"type": "subscribed", "capteur_ids": new_capteurs})
+
+    async def send():
+        while True:
+            message = await subscription.get(settings.stream_heartbeat_interval)
+            if message is None:
+                await websocket.send_json({"type": "ping"})
+                continue
+            dropped = subscription.take_dropped()
+            if dropped:
+                await websocket.send_json({"type": "dropped", "count": dropped})
+            await websocket.send_json({"type": "reading", **message})
+
+    tasks = [asyncio.create_task(receive()), asyncio.create_task(send())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Récupérer l'issue des deux tâches (déconnexion pendant un envoi comprise)
+        await asyncio.gather(*tasks, return_exceptions=True)
+        stream_hub.unsubscribe(subscription)
@@ -0,0 +1,59 @@
+"""Alignement de plusieurs capteurs sur une grille temporelle commune"""
+from typing import Sequence
+
+import numpy as np
+
+
+def align(
+    capteurs_ids: Sequence[int], capteurs: np.ndarray, buckets: np.ndarray, values: np.ndarray, grid: np.ndarray
+) -> np.ndarray:
+    """
+    Placer des agrégats (capteur, bucket, valeur) dans une matrice
+    ``len(grid) x len(capteurs_ids)`` ; les cellules sans mesure valent NaN.
+
+    ``grid`` est une suite régulière de débuts de bucket ; les colonnes
+    suivent l'ordre de ``capteurs_ids``.
+    """
+    matrix = np.full((len(grid), len(capteurs_ids)), np.nan)
+    if not len(grid) or not len(buckets):
+        return matrix
+    wanted = np.asarray(capteurs_ids, dtype=np.int64)
+    order = np.argsort(wanted, kind="stable")
+    pos = np.searchsorted(wanted[order], capteurs)
+    known = (pos < len(wanted)) & (wanted[order][np.minimum(pos, len(wanted) - 1)] == capteurs)
+    step = grid[1] - grid[0] if len(grid) > 1 else 1
+    rows = (buckets - grid[0]) // step
+    inside = known & (rows >= 0) & (rows < len(grid))
+    matrix[rows[inside], order[pos[inside]]] = values[inside]
+    return matrix
+
+
+def fill_gaps(matrix: np.ndarray, method: str) -> np.ndarray:
+    """
+    Combler les cellules NaN de chaque colonne.
+
+    - ``null`` : laissées vides ;
+    - ``locf`` : dernière valeur observée reportée (rien avant la première) ;
+    - ``linear`` : interpolation entre les deux valeurs encadrantes, sans
+      extrapolation avant la première ni après la dernière.
+    """
+    if method == "null" or not matrix.size:
+        return matrix
+    valid = ~np.isnan(matrix)
+    if method == "locf":
+        last = np.where(valid, np.arange(len(matrix))[:, None], -1)
+        np.maximum.accumulate(last, axis=0, out=last)
+        filled = np.take_along_axis(matrix, np.maximum(last, 0), axis=0)
+        filled[last < 0] = np.nan
+        return filled
+    if method == "linear":
+        filled = matrix.copy()
+        x = np.arange(len(matrix))
+        for column in range(matrix.shape[1]):
+            known = valid[:, column]
+            if known.sum() >= 2:
+                filled[:, column] = np.interp(
+                    x, x[known], matrix[known, column], left=np.nan, right=np.nan
+                )
+        return filled
+    raise ValueError(f"Méthode de remplissage inconnue: {method}")
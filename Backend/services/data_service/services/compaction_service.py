@@ -0,0 +1,132 @@
+"""Compactage des mesures anciennes en blocs journaliers compressés"""
+import asyncio
+import logging
+from datetime import datetime, time, timedelta
+from typing import Dict
+
+import numpy as np
+from sqlalchemy import delete
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, func, select
+
+from shared.config import get_data_settings
+from shared.database import sync_engine
+from shared.models.sensor import DonneesCapteur, DonneesCapteurBloc
+from shared.utils.block_codec import decode_block, encode_block
+from shared.utils.series import from_us, rows_to_series
+
+settings = get_data_settings()
+logger = logging.getLogger(__name__)
+
+
+class CompactionService:
+    """
+    Regroupe les mesures de plus de ``compaction_after_days`` jours par
+    capteur et par jour dans donnees_capteurs_blocs, puis les supprime de
+    donnees_capteurs. Une mesure arrivée en retard pour un jour déjà compacté
+    est fusionnée dans le bloc existant au passage suivant.
+    """
+
+    def __init__(self, engine: Engine = sync_engine):
+        self.engine = engine
+
+    def compact(self, now: datetime = None) -> Dict[str, int]:
+        result = {"blocs": 0, "mesures": 0, "expires": 0}
+        if not settings.compaction_enabled:
+            return result
+
+        now = now or datetime.utcnow()
+        cutoff = datetime.combine((now - timedelta(days=settings.compaction_after_days)).date(), time.min)
+        with Session(self.engine) as db:
+            capteurs = db.execute(
+                select(DonneesCapteur.capteur_id).where(DonneesCapteur.horodatage < cutoff).distinct()
+            ).scalars().all()
+            for capteur_id in capteurs:
+                day = self._next_day(db, capteur_id, datetime.min, cutoff)
+                while day is not None:
+                    compacted = self._compact_day(db, capteur_id, day)
+                    if compacted:
+                        result["mesures"] += compacted
+                        result["blocs"] += 1
+                    db.commit()
+                    day = self._next_day(db, capteur_id, day + timedelta(days=1), cutoff)
+
+            # Même rétention que les mesures brutes
+            expired_before = (now - timedelta(days=settings.sensor_data_retention_days)).date()
+            result["expires"] = db.execute(
+                delete(DonneesCapteurBloc).where(DonneesCapteurBloc.jour < expired_before)
+            ).rowcount
+            db.commit()
+
+        if result["blocs"]:
+            logger.info(f"{result['mesures']} mesures compactées en {result['blocs']} blocs")
+        return result
+
+    @staticmethod
+    def _next_day(db: Session, capteur_id: int, after: datetime, cutoff: datetime):
+        """Premier jour ayant des mesures non compactées dans ``[after, cutoff)``"""
+        first = db.execute(
+            select(func.min(DonneesCapteur.horodatage)).where(
+                DonneesCapteur.capteur_id == capteur_id,
+                DonneesCapteur.horodatage >= after,
+                DonneesCapteur.horodatage < cutoff,
+            )
+        ).scalar_one_or_none()
+        return datetime.combine(first.date(), time.min) if first else None
+
+    def _compact_day(self, db: Session, capteur_id: int, day: datetime) -> int:
+        # DELETE ... RETURNING : les lignes encodées sont exactement celles supprimées
+        rows = db.execute(
+            delete(DonneesCapteur)
+            .where(
+                DonneesCapteur.capteur_id == capteur_id,
+                DonneesCapteur.horodatage >= day,
+                DonneesCapteur.horodatage < day + timedelta(days=1),
+            )
+            .returning(
+                DonneesCapteur.id,
+                DonneesCapteur.capteur_id,
+                DonneesCapteur.valeur,
+                DonneesCapteur.horodatage,
+                DonneesCapteur.niveau_batterie,
+            )
+            .execution_options(synchronize_session=False)
+        ).all()
+        if not rows:
+            return 0
+        [(_, ts, valeurs, ids, batteries)] = rows_to_series(rows)
+
+        bloc = db.execute(
+            select(DonneesCapteurBloc).where(
+                DonneesCapteurBloc.capteur_id == capteur_id,
+                DonneesCapteurBloc.jour == day.date(),
+            )
+        ).scalar_one_or_none()
+        if bloc is None:
+            bloc = DonneesCapteurBloc(capteur_id=capteur_id, jour=day.date())
+            db.add(bloc)
+        else:
+            # Mesures en retard : fusion avec le bloc existant
+            existing = decode_block(bloc.donnees)
+            ts, valeurs, ids, batteries = (
+                np.concatenate((old, new)) for old, new in zip(existing, (ts, valeurs, ids, batteries))
+            )
+
+        order = np.lexsort((ids, ts))
+        ts, valeurs, ids, batteries = ts[order], valeurs[order], ids[order], batteries[order]
+        bloc.donnees = encode_block(ts, valeurs, ids, batteries)
+        bloc.debut, bloc.fin = from_us(ts[0]), from_us(ts[-1])
+        bloc.nombre = len(ts)
+        bloc.valeur_min, bloc.valeur_max = float(valeurs.min()), float(valeurs.max())
+        return len(rows)
+
+
+async def run_compaction(service: CompactionService = None):
+    """Boucle de compactage périodique lancée au démarrage du service"""
+    service = service or CompactionService()
+    while True:
+        try:
+            await asyncio.to_thread(service.compact)
+        except Exception as e:
+            logger.error(f"Erreur de compactage des mesures: {e}")
+        await asyncio.sleep(settings.compaction_interval)
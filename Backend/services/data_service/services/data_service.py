@@ -1,6 +1,376 @@
 """Service data"""
-from sqlmodel import Session
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import Integer, cast, func
+from sqlmodel import Session, select
+
+from shared.config import get_data_settings
+from shared.models.node import NoeudArduino
+from shared.models.sensor import Capteur, DonneesCapteur
+from shared.schemas.sensor import (
+    DataAggregated,
+    DataAlignedParams,
+    DataAlignedResponse,
+    DataListResponse,
+    DataQueryParams,
+    DonneesCapteurCreate,
+    DonneesCapteurResponse,
+)
+from shared.utils.block_store import BlockStore
+from shared.utils.exceptions import ResourceNotFoundException, ValidationException
+from shared.utils.series import Series, from_us, merge_series, rows_to_series, to_us
+from services.data_service.services.alignment import align, fill_gaps
+from services.data_service.services.downsampling import downsample
+from services.data_service.services.last_value_cache import last_values
+from services.data_service.services.rollup_service import mark_dirty
+from services.data_service.services.recent_readings import recent_readings
+from services.data_service.services.stream_hub import stream_hub
+
+settings = get_data_settings()
+
+# Durée des intervalles d'agrégation, en secondes
+INTERVAL_SECONDS = {"1m": 60, "5m": 300, "15m": 900, "1h": 3600, "1d": 86400}
+# Colonne de l'agrégat dans (capteur, bucket, avg, min, max, sum, count)
+AGGREGATION_COLUMNS = {"avg": 2, "min": 3, "max": 4, "sum": 5}
+
 
 class DataService:
     def __init__(self, db: Session):
         self.db = db
+
+    def _time_bounds(self, params: DataQueryParams) -> Tuple[datetime, datetime]:
+        """
+        Bornes temporelles effectives de la requête.
+
+        Sans ``start``, la requête est bornée à la fenêtre de rétention : les
+        partitions plus anciennes sont de toute façon supprimées, et une borne
+        explicite permet à PostgreSQL d'élaguer les partitions froides.
+        """
+        start = params.start or datetime.utcnow() - timedelta(days=settings.sensor_data_retention_days)
+        return start, params.end
+
+    def _filters(self, params: DataQueryParams) -> list:
+        start, end = self._time_bounds(params)
+        filters = [DonneesCapteur.horodatage >= start]
+        if end is not None:
+            filters.append(DonneesCapteur.horodatage < end)
+        if params.capteurs_ids:
+            filters.append(DonneesCapteur.capteur_id.in_(params.capteurs_ids))
+        return filters
+
+    def _bucket_expression(self, seconds: int):
+        """Début de bucket (epoch, secondes) portable PostgreSQL / SQLite"""
+        if self.db.get_bind().dialect.name == "sqlite":
+            epoch = cast(func.strftime("%s", DonneesCapteur.horodatage), Integer)
+        else:
+            epoch = func.extract("epoch", DonneesCapteur.horodatage)
+        return func.floor(epoch / seconds) * seconds
+
+    async def create_data(self, data: DonneesCapteurCreate) -> DonneesCapteur:
+        """Enregistrer une mesure"""
+        espace_id = self.db.execute(
+            select(NoeudArduino.espace_id)
+            .join(Capteur, Capteur.noeud_id == NoeudArduino.id)
+            .where(Capteur.id == data.capteur_id)
+        ).scalar_one_or_none()
+        if espace_id is None:
+            raise ResourceNotFoundException("Capteur", data.capteur_id)
+
+        donnee = DonneesCapteur(**data.dict(exclude_none=True))
+        self.db.add(donnee)
+        self.db.commit()
+        self.db.refresh(donnee)
+
+        await self._on_ingested(donnee, espace_id)
+        return donnee
+
+    async def _on_ingested(self, donnee: DonneesCapteur, espace_id: int):
+        """Propager une nouvelle mesure aux structures en mémoire"""
+        recent_readings.append(
+            donnee.capteur_id, donnee.id, donnee.valeur, donnee.horodatage, donnee.niveau_batterie
+        )
+        await last_values.update(donnee.capteur_id, donnee.valeur, donnee.horodatage)
+        await stream_hub.publish(donnee, espace_id)
+        await mark_dirty(donnee.capteur_id, donnee.horodatage)
+
+    async def get_data(self, params: DataQueryParams) -> DataListResponse:
+        """Récupérer les mesures brutes, les plus récentes en premier"""
+        series = self._recent_series(params)
+        if series is not None:
+            return self._page_from_series(series, params)
+
+        blocks = BlockStore(self.db)
+        start, end = self._time_bounds(params)
+        if blocks.has_blocks(params.capteurs_ids, start, end):
+            if params.downsample:
+                return self._page_from_series(self._cold_series(params, blocks), params)
+            return self._cold_page(params, blocks)
+
+        filters = self._filters(params)
+
+        total = self.db.execute(
+            select(func.count()).select_from(DonneesCapteur).where(*filters)
+        ).scalar_one()
+
+        if params.downsample:
+            return self._page_from_series(self._row_series(params), params, total)
+
+        rows = self.db.execute(
+            select(DonneesCapteur)
+            .where(*filters)
+            .order_by(DonneesCapteur.horodatage.desc(), DonneesCapteur.id.desc())
+            .offset(params.offset)
+            .limit(params.limit)
+        ).scalars().all()
+
+        return DataListResponse(
+            donnees=[DonneesCapteurResponse.from_orm(row) for row in rows],
+            total=total,
+            page=params.offset // params.limit + 1,
+            per_page=params.limit,
+        )
+
+    def _recent_series(self, params: DataQueryParams) -> Optional[List[Series]]:
+        """Séries servies par le tampon mémoire si la plage y tient entièrement"""
+        start, end = self._time_bounds(params)
+        return recent_readings.query(params.capteurs_ids, start, end)
+
+    def _row_series(self, params: DataQueryParams) -> List[Series]:
+        """Mesures non compactées de la plage, en séries par capteur"""
+        rows = self.db.execute(
+            select(
+                DonneesCapteur.id,
+                DonneesCapteur.capteur_id,
+                DonneesCapteur.valeur,
+                DonneesCapteur.horodatage,
+                DonneesCapteur.niveau_batterie,
+            )
+            .where(*self._filters(params))
+            .order_by(DonneesCapteur.capteur_id, DonneesCapteur.horodatage)
+        ).all()
+        return rows_to_series(rows)
+
+    def _cold_series(self, params: DataQueryParams, blocks: BlockStore) -> List[Series]:
+        """Plage en partie compactée : mesures brutes et blocs décodés, fusionnés"""
+        start, end = self._time_bounds(params)
+        return merge_series(self._row_series(params), blocks.series(params.capteurs_ids, start, end))
+
+    def _cold_page(self, params: DataQueryParams, blocks: BlockStore) -> DataListResponse:
+        """
+        Page de mesures (plus récentes d'abord) sur une plage en partie compactée.
+
+        Seuls les blocs pouvant contenir des mesures de la page sont décodés :
+        on les parcourt du plus récent au plus ancien jusqu'à ce que le bloc
+        suivant se termine avant la ``offset + limit``-ième mesure retenue.
+        """
+        start, end = self._time_bounds(params)
+        filters = self._filters(params)
+        need = params.offset + params.limit
+        total = self.db.execute(
+            select(func.count()).select_from(DonneesCapteur).where(*filters)
+        ).scalar_one() + blocks.count(params.capteurs_ids, start, end)
+
+        rows = self.db.execute(
+            select(
+                DonneesCapteur.id,
+                DonneesCapteur.capteur_id,
+                DonneesCapteur.valeur,
+                DonneesCapteur.horodatage,
+                DonneesCapteur.niveau_batterie,
+            )
+            .where(*filters)
+            .order_by(DonneesCapteur.horodatage.desc(), DonneesCapteur.id.desc())
+            .limit(need)
+        ).all()
+        parts = [rows_to_series(sorted(rows, key=lambda row: row[1]))]
+        candidates = np.array([to_us(row[3]) for row in rows], dtype=np.int64)
+
+        for bloc in blocks.blocks(params.capteurs_ids, start, end, newest_first=True):
+            if len(candidates) >= need and to_us(bloc.fin) < np.partition(candidates, -need)[-need]:
+                break
+            ts, valeurs, ids, batteries = blocks.window(bloc, start, end)
+            parts.append([(bloc.capteur_id, ts, valeurs, ids, batteries)])
+            candidates = np.concatenate((candidates, ts))
+
+        return self._page_from_series(merge_series(*parts), params, total)
+
+    def _page_from_series(
+        self, series: List[Series], params: DataQueryParams, total: Optional[int] = None
+    ) -> DataListResponse:
+        """Réponse paginée (ou sous-échantillonnée) à partir de séries par capteur"""
+        if series:
+            capteurs = np.concatenate([np.full(len(s[1]), s[0]) for s in series])
+            ts, valeurs, ids, batteries = (np.concatenate([s[k] for s in series]) for k in range(1, 5))
+        else:
+            capteurs = ts = valeurs = ids = batteries = np.empty(0)
+        if total is None:
+            total = len(ts)
+
+        if params.downsample:
+            selected = _downsample_series(capteurs, ts / 1e6, valeurs, params) if len(ts) else np.empty(0, dtype=np.int64)
+            selected = selected[np.argsort(ts[selected], kind="stable")[::-1]]
+            page, per_page = 1, len(selected)
+        else:
+            selected = np.lexsort((ids, ts))[::-1][params.offset:params.offset + params.limit]
+            page, per_page = params.offset // params.limit + 1, params.limit
+
+        donnees = [
+            DonneesCapteurResponse(
+                id=int(ids[i]), capteur_id=int(capteurs[i]), valeur=float(valeurs[i]),
+                horodatage=from_us(ts[i]),
+                niveau_batterie=None if np.isnan(batteries[i]) else float(batteries[i]),
+            )
+            for i in selected
+        ]
+        return DataListResponse(donnees=donnees, total=total, page=page, per_page=per_page)
+
+    def _aggregate_rows(self, params: DataQueryParams, seconds: int, paginate: bool = True) -> list:
+        """Agrégats (capteur, bucket, avg, min, max, sum, count) calculés par la base"""
+        bucket = self._bucket_expression(seconds).label("bucket")
+        query = (
+            select(
+                DonneesCapteur.capteur_id,
+                bucket,
+                func.avg(DonneesCapteur.valeur),
+                func.min(DonneesCapteur.valeur),
+                func.max(DonneesCapteur.valeur),
+                func.sum(DonneesCapteur.valeur),
+                func.count(),
+            )
+            .where(*self._filters(params))
+            .group_by(DonneesCapteur.capteur_id, bucket)
+            .order_by(DonneesCapteur.capteur_id, bucket)
+        )
+        if paginate and not params.downsample:
+            query = query.offset(params.offset).limit(params.limit)
+        return self.db.execute(query).all()
+
+    def _bucket_rows(self, params: DataQueryParams, seconds: int, paginate: bool = True) -> list:
+        """Agrégats par capteur et bucket : tampon mémoire, blocs compactés ou base"""
+        series = self._recent_series(params)
+        if series is None:
+            blocks = BlockStore(self.db)
+            start, end = self._time_bounds(params)
+            if blocks.has_blocks(params.capteurs_ids, start, end):
+                series = self._cold_series(params, blocks)
+        if series is None:
+            return self._aggregate_rows(params, seconds, paginate)
+        rows = _aggregate_series(series, seconds)
+        if paginate and not params.downsample:
+            rows = rows[params.offset:params.offset + params.limit]
+        return rows
+
+    async def get_aggregated_data(self, params: DataQueryParams) -> List[DataAggregated]:
+        """Récupérer les mesures agrégées par capteur et par intervalle"""
+        seconds = INTERVAL_SECONDS[params.interval or "1h"]
+        rows = self._bucket_rows(params, seconds)
+
+        if params.downsample and rows:
+            capteurs, starts, avgs, mins, maxs = (np.asarray(column) for column in list(zip(*rows))[:5])
+            # Enveloppe min/max des buckets pour minmax, moyenne pour LTTB
+            low = mins if params.downsample_method == "minmax" else avgs
+            high = maxs if params.downsample_method == "minmax" else None
+            selected = _downsample_series(
+                capteurs, starts.astype(np.float64), low.astype(np.float64), params, high
+            )
+            rows = [rows[i] for i in selected]
+
+        return [
+            DataAggregated(
+                capteur_id=capteur_id,
+                horodatage=datetime.utcfromtimestamp(float(start)),
+                valeur_avg=avg,
+                valeur_min=vmin,
+                valeur_max=vmax,
+                valeur_sum=vsum,
+                count=count,
+            )
+            for capteur_id, start, avg, vmin, vmax, vsum, count in rows
+        ]
+
+    async def get_aligned_data(self, params: DataAlignedParams) -> DataAlignedResponse:
+        """
+        Aligner plusieurs capteurs sur une grille commune : une ligne par
+        bucket, une colonne par capteur, trous comblés selon ``params.fill``.
+
+        Les agrégats sont calculés par la base (ou le tampon mémoire) ; seul
+        le placement sur la grille et le remplissage sont faits ici, en NumPy.
+        """
+        seconds = INTERVAL_SECONDS[params.interval]
+        rows = self._bucket_rows(params, seconds, paginate=False)
+        columns = list(zip(*rows)) or [(), (), (), (), (), (), ()]
+        capteurs = np.asarray(columns[0], dtype=np.int64)
+        buckets = np.asarray(columns[1], dtype=np.float64).astype(np.int64)
+        values = np.asarray(columns[AGGREGATION_COLUMNS[params.aggregation]], dtype=np.float64)
+
+        # Grille : de la borne demandée (ou du premier bucket observé) à la fin
+        start, end = self._time_bounds(params)
+        if params.start is not None:
+            first = to_us(start) // 10**6 // seconds * seconds
+        else:
+            first = int(buckets.min()) if len(buckets) else 0
+        if end is not None:
+            stop = -(-to_us(end) // 10**6)
+        else:
+            stop = int(buckets.max()) + seconds if len(buckets) else first
+        count = max(0, -(-(stop - first) // seconds))
+        if count > settings.aligned_max_buckets:
+            raise ValidationException(
+                f"{count} buckets demandés (maximum {settings.aligned_max_buckets}), augmenter l'intervalle",
+                "interval",
+            )
+        grid = first + seconds * np.arange(count, dtype=np.int64)
+
+        matrix = fill_gaps(align(params.capteurs_ids, capteurs, buckets, values, grid), params.fill)
+        page = slice(params.offset, params.offset + params.limit)
+        return DataAlignedResponse(
+            capteurs_ids=params.capteurs_ids,
+            horodatages=[datetime.utcfromtimestamp(int(bucket)) for bucket in grid[page]],
+            valeurs=[[None if np.isnan(v) else float(v) for v in row] for row in matrix[page]],
+            total=count,
+            page=params.offset // params.limit + 1,
+            per_page=params.limit,
+        )
+
+
+def _aggregate_series(series: List[Series], seconds: int) -> list:
+    """Agrégats par capteur et par bucket calculés en mémoire (même forme que la requête SQL)"""
+    rows = []
+    width = seconds * 10**6
+    for capteur_id, ts, valeurs, _, _ in series:
+        buckets = ts // width
+        starts, first = np.unique(buckets, return_index=True)
+        counts = np.diff(np.append(first, len(ts)))
+        sums = np.add.reduceat(valeurs, first)
+        rows.extend(zip(
+            [capteur_id] * len(starts),
+            (starts * seconds).tolist(),
+            (sums / counts).tolist(),
+            np.minimum.reduceat(valeurs, first).tolist(),
+            np.maximum.reduceat(valeurs, first).tolist(),
+            sums.tolist(),
+            counts.tolist(),
+        ))
+    return rows
+
+
+def _downsample_series(
+    capteurs: np.ndarray, x: np.ndarray, y: np.ndarray, params: DataQueryParams, y_high=None
+) -> np.ndarray:
+    """
+    Sous-échantillonner chaque capteur séparément.
+
+    Les tableaux sont triés par capteur puis par temps ; retourne les indices
+    globaux des points retenus.
+    """
+    boundaries = np.concatenate(([0], np.flatnonzero(np.diff(capteurs)) + 1, [len(capteurs)]))
+    selected = []
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        high = None if y_high is None else y_high[start:end]
+        indices = downsample(
+            x[start:end], y[start:end], params.downsample, params.downsample_method, high
+        )
+        selected.append(indices + start)
+    return np.concatenate(selected)
@@ -0,0 +1,95 @@
+"""Sous-échantillonnage des séries pour l'affichage en graphique"""
+from typing import Optional
+
+import numpy as np
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets.
+
+    Retourne les indices des ``threshold`` points retenus (premier et dernier
+    inclus). Chaque bucket garde le point formant le plus grand triangle avec
+    le point retenu précédent et la moyenne du bucket suivant ; le calcul des
+    aires est vectorisé sur tout le bucket.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # Bornes des threshold - 2 buckets intérieurs
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        if next_end <= next_start:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(areas.argmax())
+        selected[i + 1] = a
+
+    return selected
+
+
+def minmax(
+    x: np.ndarray,
+    y: np.ndarray,
+    threshold: int,
+    y_high: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Décimation par enveloppe min/max.
+
+    Chaque bucket conserve son minimum et son maximum, de sorte qu'aucun pic
+    (gel de quelques minutes par exemple) ne disparaît. ``y_high`` permet de
+    fournir une colonne de maxima distincte (agrégats avec min et max).
+    Retourne les indices retenus, triés.
+    """
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+
+    y_low = np.asarray(y, dtype=np.float64)
+    y_high = y_low if y_high is None else np.asarray(y_high, dtype=np.float64)
+
+    if threshold < 4:
+        # Pas de place pour un bucket min/max : bornes et extrême le plus marqué
+        if threshold < 3:
+            return np.array([0, n - 1])
+        low, high = int(np.argmin(y_low)), int(np.argmax(y_high))
+        mean = y_low.mean()
+        extreme = low if mean - y_low[low] >= y_high[high] - mean else high
+        return np.unique([0, extreme, n - 1])
+
+    buckets = (threshold - 2) // 2
+    bucket_ids = (np.arange(n) * buckets) // n
+
+    # Tri stable par (bucket, valeur) : premier élément = min, dernier = max
+    order_low = np.lexsort((y_low, bucket_ids))
+    order_high = np.lexsort((y_high, bucket_ids))
+    starts = np.searchsorted(bucket_ids, np.arange(buckets), side="left")
+    ends = np.searchsorted(bucket_ids, np.arange(buckets), side="right") - 1
+
+    indices = np.concatenate(([0, n - 1], order_low[starts], order_high[ends]))
+    return np.unique(indices)
+
+
+def downsample(x: np.ndarray, y: np.ndarray, threshold: int, method: str = "lttb", y_high=None) -> np.ndarray:
+    """Indices des points représentatifs selon la méthode demandée"""
+    if method == "minmax":
+        return minmax(x, y, threshold, y_high)
+    return lttb(x, y, threshold)
@@ -0,0 +1,213 @@
+"""Service des jobs d'export asynchrones"""
+import asyncio
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from shared.config import get_data_settings
+from shared.database import SessionLocal
+from shared.schemas.common import ExportResponse
+from shared.schemas.sensor import DataExportParams, ExportJobResponse
+from shared.utils.exceptions import (
+    AuthorizationException,
+    RateLimitException,
+    ResourceNotFoundException,
+)
+from services.data_service.services.export_service import ExportService
+
+settings = get_data_settings()
+logger = logging.getLogger(__name__)
+
+
+class ExportJob:
+    """État d'un job d'export"""
+
+    def __init__(self, params: DataExportParams, user_id: int):
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.user_id = user_id
+        self.statut = "en_attente"
+        self.cree_a = datetime.utcnow()
+        self.termine_a: Optional[datetime] = None
+        self.expires_at: Optional[datetime] = None
+        self.lignes_exportees = 0
+        self.lignes_totales: Optional[int] = None
+        self.taille = 0
+        self.reserve = 0  # octets réservés sur le quota tant que le job tourne
+        self.erreur: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def filename(self) -> str:
+        return ExportService.filename(self.params)
+
+    @property
+    def path(self) -> str:
+        return os.path.join(settings.export_dir, f"{self.id}.{self.params.format}")
+
+    def to_response(self) -> ExportJobResponse:
+        progression = 0.0
+        if self.statut == "termine":
+            progression = 1.0
+        elif self.lignes_totales:
+            progression = min(self.lignes_exportees / self.lignes_totales, 1.0)
+
+        export = None
+        if self.statut == "termine":
+            export = ExportResponse(
+                filename=self.filename,
+                format=self.params.format,
+                size=self.taille,
+                download_url=f"/api/data/exports/{self.id}/download",
+                expires_at=self.expires_at,
+                record_count=self.lignes_exportees,
+            )
+
+        return ExportJobResponse(
+            job_id=self.id,
+            statut=self.statut,
+            format=self.params.format,
+            progression=progression,
+            lignes_exportees=self.lignes_exportees,
+            lignes_totales=self.lignes_totales,
+            cree_a=self.cree_a,
+            termine_a=self.termine_a,
+            erreur=self.erreur,
+            export=export,
+        )
+
+
+class ExportJobService:
+    """
+    Gestion des jobs d'export : file d'attente bornée, écriture sur disque par
+    lots dans un thread, quota disque et expiration des fichiers produits.
+
+    La place d'un job est réservée sur le quota dès son acceptation : les
+    exports concurrents ne peuvent pas dépasser ensemble le quota.
+    """
+
+    def __init__(self):
+        self.jobs: Dict[str, ExportJob] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._quota_lock = threading.Lock()
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Créé à la demande pour être lié à la boucle d'événements du service
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(settings.export_max_concurrent_jobs)
+        return self._semaphore
+
+    def committed(self) -> int:
+        """Place engagée : fichiers terminés sur disque et réservations des jobs en cours"""
+        reserved = {os.path.basename(job.path): job.reserve for job in self.jobs.values() if job.reserve}
+        used = sum(reserved.values())
+        if os.path.isdir(settings.export_dir):
+            used += sum(
+                entry.stat().st_size for entry in os.scandir(settings.export_dir)
+                if entry.is_file() and entry.name not in reserved
+            )
+        return used
+
+    def _reserve(self, job: ExportJob):
+        with self._quota_lock:
+            available = settings.export_disk_quota_mb * 1024 * 1024 - self.committed()
+            if available <= 0:
+                raise RateLimitException("Quota disque des exports atteint")
+            job.reserve = min(available, settings.export_job_max_size_mb * 1024 * 1024)
+            self.jobs[job.id] = job
+
+    def submit(self, params: DataExportParams, user_id: int) -> ExportJob:
+        """Enregistrer un job et lancer sa production en tâche de fond"""
+        ExportService.check_format(params.format)
+        pending = sum(1 for job in self.jobs.values() if job.statut in ("en_attente", "en_cours"))
+        if pending >= settings.export_max_concurrent_jobs * 5:
+            raise RateLimitException("Trop de jobs d'export en attente")
+
+        job = ExportJob(params, user_id)
+        self._reserve(job)
+        job.task = asyncio.create_task(self._run(job))
+        return job
+
+    def get_job(self, job_id: str, user_id: int) -> ExportJob:
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise ResourceNotFoundException("Export", job_id)
+        if job.user_id != user_id:
+            raise AuthorizationException("Cet export appartient à un autre utilisateur")
+        return job
+
+    async def _run(self, job: ExportJob):
+        async with self.semaphore:
+            job.statut = "en_cours"
+            try:
+                await asyncio.to_thread(self._produce, job)
+                job.statut = "termine"
+                job.expires_at = datetime.utcnow() + timedelta(hours=settings.export_job_ttl_hours)
+            except Exception as e:
+                logger.error(f"Échec du job d'export {job.id}: {e}")
+                job.statut = "erreur"
+                job.erreur = str(e)
+                if os.path.exists(job.path):
+                    os.remove(job.path)
+            finally:
+                job.termine_a = datetime.utcnow()
+                # Le fichier produit (s'il existe) est désormais compté sur disque
+                job.reserve = 0
+
+    def _produce(self, job: ExportJob):
+        """Écrire le fichier d'export (exécuté dans un thread du pool)"""
+        os.makedirs(settings.export_dir, exist_ok=True)
+
+        def on_rows(count: int):
+            job.lignes_exportees += count
+
+        db = SessionLocal()
+        try:
+            service = ExportService(db)
+            job.lignes_totales = service.count(job.params)
+            job.taille = service.write_to_file(job.params, job.path, on_rows, max_size=job.reserve)
+        finally:
+            db.close()
+
+    def purge_expired(self, now: datetime = None):
+        """
+        Supprimer les fichiers et jobs expirés.
+
+        Le répertoire d'export est aussi balayé par date de modification :
+        les fichiers laissés par une instance précédente (redémarrage, job
+        interrompu) ne sont plus suivis en mémoire.
+        """
+        now = now or datetime.utcnow()
+        ttl = timedelta(hours=settings.export_job_ttl_hours)
+        for job_id, job in list(self.jobs.items()):
+            expired = job.expires_at is not None and job.expires_at <= now
+            stale_error = job.statut == "erreur" and job.termine_a and job.termine_a + ttl <= now
+            if expired or stale_error:
+                if os.path.exists(job.path):
+                    os.remove(job.path)
+                del self.jobs[job_id]
+
+        if not os.path.isdir(settings.export_dir):
+            return
+        tracked = {os.path.basename(job.path) for job in self.jobs.values()}
+        for entry in os.scandir(settings.export_dir):
+            if entry.is_file() and entry.name not in tracked and \
+                    datetime.utcfromtimestamp(entry.stat().st_mtime) + ttl <= now:
+                os.remove(entry.path)
+
+
+export_jobs = ExportJobService()
+
+
+async def run_export_cleanup(interval: int = 300):
+    """Purge périodique des exports expirés"""
+    while True:
+        try:
+            export_jobs.purge_expired()
+        except Exception as e:
+            logger.error(f"Erreur de purge des exports: {e}")
+        await asyncio.sleep(interval)
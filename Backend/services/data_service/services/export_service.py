@@ -0,0 +1,324 @@
+"""Service d'export des données capteurs en flux"""
+import csv
+import heapq
+import importlib
+import io
+import json
+import os
+import tempfile
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional, Sequence
+
+from sqlmodel import Session, func, select
+
+from shared.config import get_data_settings
+from shared.models.node import NoeudArduino
+from shared.models.sensor import Capteur, DonneesCapteur
+from shared.schemas.sensor import DataExportParams
+from shared.utils.block_store import BlockStore
+from shared.utils.exceptions import DataExportException, ValidationException
+from shared.utils.series import from_us
+
+settings = get_data_settings()
+
+EXPORT_CONTENT_TYPES = {
+    "csv": "text/csv",
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Modules optionnels nécessaires à certains formats
+EXPORT_REQUIREMENTS = {"parquet": "pyarrow", "xlsx": "openpyxl"}
+
+# Limite de lignes d'une feuille Excel (en-tête inclus)
+XLSX_MAX_ROWS = 1048575
+
+BASE_COLUMNS = ["capteur_id", "horodatage", "valeur", "niveau_batterie"]
+METADATA_COLUMNS = ["capteur_nom", "capteur_type", "unite_mesure", "noeud_nom"]
+
+
+class _ChunkSink(io.RawIOBase):
+    """Fichier en écriture seule dont le contenu est vidé à chaque lecture"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer.extend(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+class ExportService:
+    """Export des mesures par lots depuis un curseur serveur, à mémoire constante"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    @staticmethod
+    def check_format(export_format: str):
+        """Vérifier que les dépendances du format sont installées"""
+        module = EXPORT_REQUIREMENTS.get(export_format)
+        if module is None:
+            return
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            raise ValidationException(
+                f"Export {export_format} indisponible: module '{module}' non installé", "format"
+            )
+
+    @staticmethod
+    def filename(params: DataExportParams) -> str:
+        return f"donnees_capteurs_{params.start:%Y%m%d}_{params.end:%Y%m%d}.{params.format}"
+
+    @staticmethod
+    def columns(params: DataExportParams) -> List[str]:
+        return BASE_COLUMNS + (METADATA_COLUMNS if params.include_metadata else [])
+
+    def iter_chunks(self, params: DataExportParams) -> Iterator[Sequence[tuple]]:
+        """Lire les mesures par lots via un curseur côté serveur"""
+        blocks = BlockStore(self.db)
+        if blocks.has_blocks(params.capteurs_ids, params.start, params.end):
+            yield from self._iter_chunks_with_blocks(params, blocks)
+            return
+
+        columns = [
+            DonneesCapteur.capteur_id,
+            DonneesCapteur.horodatage,
+            DonneesCapteur.valeur,
+            DonneesCapteur.niveau_batterie,
+        ]
+        query = select(*columns)
+        if params.include_metadata:
+            query = (
+                select(*columns, Capteur.nom, Capteur.type, Capteur.unite_mesure, NoeudArduino.nom)
+                .join(Capteur, Capteur.id == DonneesCapteur.capteur_id)
+                .join(NoeudArduino, NoeudArduino.id == Capteur.noeud_id)
+            )
+        query = query.where(
+            DonneesCapteur.capteur_id.in_(params.capteurs_ids),
+            DonneesCapteur.horodatage >= params.start,
+            DonneesCapteur.horodatage < params.end,
+        ).order_by(DonneesCapteur.capteur_id, DonneesCapteur.horodatage)
+        if settings.max_export_records:
+            query = query.limit(settings.max_export_records)
+
+        result = self.db.execute(
+            query.execution_options(stream_results=True, yield_per=settings.export_chunk_size)
+        )
+        try:
+            for partition in result.partitions():
+                yield partition
+        finally:
+            result.close()
+
+    def _iter_chunks_with_blocks(self, params: DataExportParams, blocks: BlockStore) -> Iterator[Sequence[tuple]]:
+        """Plage en partie compactée : fusion, capteur par capteur, des lignes brutes et des blocs décodés"""
+        metadata = {}
+        if params.include_metadata:
+            metadata = {
+                row[0]: tuple(row[1:])
+                for row in self.db.execute(
+                    select(Capteur.id, Capteur.nom, Capteur.type, Capteur.unite_mesure, NoeudArduino.nom)
+                    .join(NoeudArduino, NoeudArduino.id == Capteur.noeud_id)
+                    .where(Capteur.id.in_(params.capteurs_ids))
+                ).all()
+            }
+
+        def raw_rows(capteur_id: int) -> Iterator[tuple]:
+            result = self.db.execute(
+                select(DonneesCapteur.horodatage, DonneesCapteur.valeur, DonneesCapteur.niveau_batterie)
+                .where(
+                    DonneesCapteur.capteur_id == capteur_id,
+                    DonneesCapteur.horodatage >= params.start,
+                    DonneesCapteur.horodatage < params.end,
+                )
+                .order_by(DonneesCapteur.horodatage)
+                .execution_options(stream_results=True, yield_per=settings.export_chunk_size)
+            )
+            try:
+                yield from result
+            finally:
+                result.close()
+
+        def block_rows(capteur_id: int) -> Iterator[tuple]:
+            for bloc in blocks.blocks([capteur_id], params.start, params.end):
+                ts, valeurs, _, batteries = blocks.window(bloc, params.start, params.end)
+                for t, valeur, batterie in zip(ts.tolist(), valeurs.tolist(), batteries.tolist()):
+                    yield from_us(t), valeur, None if batterie != batterie else batterie
+
+        remaining = settings.max_export_records
+        chunk = []
+        for capteur_id in sorted(set(params.capteurs_ids)):
+            extra = metadata.get(capteur_id, (None,) * len(METADATA_COLUMNS)) if params.include_metadata else ()
+            for horodatage, valeur, batterie in heapq.merge(
+                block_rows(capteur_id), raw_rows(capteur_id), key=lambda row: row[0]
+            ):
+                chunk.append((capteur_id, horodatage, valeur, batterie, *extra))
+                if remaining is not None:
+                    remaining -= 1
+                    if remaining == 0:
+                        yield chunk
+                        return
+                if len(chunk) >= settings.export_chunk_size:
+                    yield chunk
+                    chunk = []
+        if chunk:
+            yield chunk
+
+    def count(self, params: DataExportParams) -> int:
+        """Nombre de lignes que produira l'export"""
+        total = self.db.execute(
+            select(func.count()).select_from(DonneesCapteur).where(
+                DonneesCapteur.capteur_id.in_(params.capteurs_ids),
+                DonneesCapteur.horodatage >= params.start,
+                DonneesCapteur.horodatage < params.end,
+            )
+        ).scalar_one() + BlockStore(self.db).count(params.capteurs_ids, params.start, params.end)
+        return min(total, settings.max_export_records) if settings.max_export_records else total
+
+    def stream(
+        self, params: DataExportParams, on_rows: Optional[Callable[[int], None]] = None
+    ) -> Iterator[bytes]:
+        """Générateur d'octets du fichier exporté, à transmettre tel quel"""
+        self.check_format(params.format)
+        writer = getattr(self, f"_write_{params.format}")
+        chunks = self.iter_chunks(params)
+        if on_rows is not None:
+            chunks = _notify_rows(chunks, on_rows)
+        return writer(params, chunks)
+
+    def write_to_file(
+        self,
+        params: DataExportParams,
+        path: str,
+        on_rows: Optional[Callable[[int], None]] = None,
+        max_size: Optional[int] = None,
+    ) -> int:
+        """Écrire l'export dans un fichier, retourne la taille écrite"""
+        size = 0
+        with open(path, "wb") as f:
+            for data in self.stream(params, on_rows):
+                size += len(data)
+                if max_size is not None and size > max_size:
+                    raise DataExportException(
+                        "Quota disque des exports dépassé", {"max_size": max_size}
+                    )
+                f.write(data)
+        return size
+
+    def _write_csv(self, params, chunks) -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(self.columns(params))
+        for rows in chunks:
+            writer.writerows(
+                (row[0], row[1].isoformat(), *row[2:]) for row in rows
+            )
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue().encode("utf-8")
+
+    def _iter_json_lines(self, params, chunks) -> Iterator[List[str]]:
+        columns = self.columns(params)
+        for rows in chunks:
+            yield [json.dumps(dict(zip(columns, row)), default=_json_default) for row in rows]
+
+    def _write_ndjson(self, params, chunks) -> Iterator[bytes]:
+        for lines in self._iter_json_lines(params, chunks):
+            if lines:
+                yield ("\n".join(lines) + "\n").encode("utf-8")
+
+    def _write_json(self, params, chunks) -> Iterator[bytes]:
+        yield b"["
+        first = True
+        for lines in self._iter_json_lines(params, chunks):
+            if not lines:
+                continue
+            yield (("" if first else ",") + ",".join(lines)).encode("utf-8")
+            first = False
+        yield b"]"
+
+    def _write_parquet(self, params, chunks) -> Iterator[bytes]:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        fields = [
+            pa.field("capteur_id", pa.int32()),
+            pa.field("horodatage", pa.timestamp("us")),
+            pa.field("valeur", pa.float64()),
+            pa.field("niveau_batterie", pa.float64()),
+        ]
+        if params.include_metadata:
+            fields += [pa.field(name, pa.string()) for name in METADATA_COLUMNS]
+        schema = pa.schema(fields)
+
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+        try:
+            for rows in chunks:
+                if not rows:
+                    continue
+                arrays = [pa.array(column, type=field.type) for column, field in zip(zip(*rows), fields)]
+                writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+                yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()
+
+    def _write_xlsx(self, params, chunks) -> Iterator[bytes]:
+        # Un classeur xlsx est une archive zip : il est assemblé dans un
+        # fichier temporaire (mode write_only, mémoire constante) puis relu.
+        from openpyxl import Workbook
+
+        columns = self.columns(params)
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("donnees")
+        sheet.append(columns)
+        rows_in_sheet = 0
+        for rows in chunks:
+            for row in rows:
+                if rows_in_sheet >= XLSX_MAX_ROWS:
+                    sheet = workbook.create_sheet(f"donnees_{len(workbook.worksheets) + 1}")
+                    sheet.append(columns)
+                    rows_in_sheet = 0
+                sheet.append(list(row))
+                rows_in_sheet += 1
+
+        fd, path = tempfile.mkstemp(suffix=".xlsx")
+        os.close(fd)
+        try:
+            workbook.save(path)
+            with open(path, "rb") as f:
+                while data := f.read(1024 * 1024):
+                    yield data
+        finally:
+            os.remove(path)
+
+
+def _notify_rows(chunks: Iterator[Sequence[tuple]], on_rows: Callable[[int], None]):
+    for rows in chunks:
+        yield rows
+        on_rows(len(rows))
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Type non sérialisable: {type(value).__name__}")
@@ -0,0 +1,148 @@
+"""Cache de la dernière valeur mesurée par capteur"""
+import json
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from redis.exceptions import RedisError
+from sqlalchemy import func, text
+from sqlmodel import Session, select
+
+from shared.database import get_redis
+from shared.models.sensor import DonneesCapteur, DonneesCapteurBloc
+from shared.utils.block_codec import decode_block
+from shared.utils.series import from_us
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY = "gardenconnect:capteurs:dernieres_valeurs"
+
+LastValue = Tuple[float, datetime]
+
+
+class LastValueCache:
+    """
+    Dernière mesure (valeur, horodatage) de chaque capteur, en mémoire et
+    recopiée dans un hash Redis partagé entre les instances. Les lectures
+    passent par Redis pour voir les mesures ingérées par les autres
+    instances ; la mémoire sert de repli si Redis est indisponible.
+    """
+
+    def __init__(self):
+        self._values: Dict[int, LastValue] = {}
+
+    def get(self, capteur_id: int) -> Optional[LastValue]:
+        return self._values.get(capteur_id)
+
+    def get_many(self, capteurs_ids: Iterable[int]) -> Dict[int, LastValue]:
+        """Dernières valeurs d'un ensemble de capteurs, en un seul appel"""
+        values = self._values
+        return {cid: values[cid] for cid in capteurs_ids if cid in values}
+
+    def set(self, capteur_id: int, valeur: float, horodatage: datetime) -> bool:
+        """Mettre à jour la mémoire si la mesure est plus récente"""
+        current = self._values.get(capteur_id)
+        if current is not None and current[1] >= horodatage:
+            return False
+        self._values[capteur_id] = (valeur, horodatage)
+        return True
+
+    async def update(self, capteur_id: int, valeur: float, horodatage: datetime):
+        """Enregistrer une nouvelle mesure (appelé à chaque ingestion)"""
+        if not self.set(capteur_id, valeur, horodatage):
+            return
+        try:
+            redis_conn = await get_redis()
+            await redis_conn.hset(REDIS_KEY, str(capteur_id), _encode(valeur, horodatage))
+        except RedisError as e:
+            logger.warning(f"Recopie Redis de la dernière valeur impossible: {e}")
+
+    async def load_from_redis(self, capteurs_ids: Iterable[int]) -> Dict[int, LastValue]:
+        """Rafraîchir la mémoire depuis Redis (mesures ingérées par une autre instance)"""
+        ids = [cid for cid in capteurs_ids]
+        if not ids:
+            return {}
+        redis_conn = await get_redis()
+        raw_values = await redis_conn.hmget(REDIS_KEY, [str(cid) for cid in ids])
+        for cid, raw in zip(ids, raw_values):
+            if raw is None:
+                continue
+            try:
+                self.set(cid, *_decode(raw))
+            except (ValueError, TypeError) as e:
+                logger.warning(f"Dernière valeur Redis illisible pour le capteur {cid}: {e}")
+        return self.get_many(ids)
+
+    def warm(self, db: Session) -> int:
+        """
+        Charger la dernière mesure de chaque capteur en une seule requête.
+
+        Un capteur dont toutes les mesures ont été compactées prend la
+        dernière mesure de son bloc le plus récent.
+        """
+        if db.get_bind().dialect.name == "postgresql":
+            rows = db.execute(text("""
+                SELECT DISTINCT ON (capteur_id) capteur_id, valeur, horodatage
+                FROM donnees_capteurs
+                ORDER BY capteur_id, horodatage DESC
+            """)).all()
+        else:
+            latest = (
+                select(DonneesCapteur.capteur_id, func.max(DonneesCapteur.horodatage).label("horodatage"))
+                .group_by(DonneesCapteur.capteur_id)
+                .subquery()
+            )
+            rows = db.execute(
+                select(DonneesCapteur.capteur_id, DonneesCapteur.valeur, DonneesCapteur.horodatage)
+                .join(latest, (latest.c.capteur_id == DonneesCapteur.capteur_id)
+                      & (latest.c.horodatage == DonneesCapteur.horodatage))
+            ).all()
+
+        for capteur_id, valeur, horodatage in rows:
+            self.set(capteur_id, valeur, horodatage)
+        return len(rows) + self._warm_from_blocks(db, {row[0] for row in rows})
+
+    def _warm_from_blocks(self, db: Session, known: set) -> int:
+        latest = (
+            select(DonneesCapteurBloc.capteur_id, func.max(DonneesCapteurBloc.fin).label("fin"))
+            .group_by(DonneesCapteurBloc.capteur_id)
+            .subquery()
+        )
+        blocs = db.execute(
+            select(DonneesCapteurBloc.capteur_id, DonneesCapteurBloc.id)
+            .join(latest, (latest.c.capteur_id == DonneesCapteurBloc.capteur_id)
+                  & (latest.c.fin == DonneesCapteurBloc.fin))
+        ).all()
+        missing = [bloc_id for capteur_id, bloc_id in blocs if capteur_id not in known]
+        if not missing:
+            return 0
+        # Seuls les blocs des capteurs sans mesure brute sont lus et décodés
+        rows = db.execute(
+            select(DonneesCapteurBloc.capteur_id, DonneesCapteurBloc.donnees).where(DonneesCapteurBloc.id.in_(missing))
+        ).all()
+        for capteur_id, donnees in rows:
+            ts, valeurs, _, _ = decode_block(donnees)
+            self.set(capteur_id, float(valeurs[-1]), from_us(int(ts[-1])))
+        return len(rows)
+
+    async def publish_all(self):
+        """Recopier l'ensemble de la mémoire dans Redis (après préchauffage)"""
+        if not self._values:
+            return
+        redis_conn = await get_redis()
+        await redis_conn.hset(
+            REDIS_KEY,
+            mapping={str(cid): _encode(v, t) for cid, (v, t) in self._values.items()},
+        )
+
+
+def _encode(valeur: float, horodatage: datetime) -> str:
+    return json.dumps([valeur, horodatage.isoformat()])
+
+
+def _decode(raw) -> LastValue:
+    valeur, horodatage = json.loads(raw)
+    return valeur, datetime.fromisoformat(horodatage)
+
+
+last_values = LastValueCache()
@@ -1,6 +1,67 @@
 """Service nodes"""
-from sqlmodel import Session
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+from shared.models.node import NoeudArduino
+from shared.models.space import Espace
+from shared.schemas.node import NoeudArduinoCreate, NoeudArduinoUpdate
+from shared.utils.auth import generate_api_key
+from shared.utils.exceptions import ResourceNotFoundException, handle_database_error
+from shared.utils.space_counters import apply_counter_delta, node_counts
 
 class NodeService:
     def __init__(self, db: Session):
         self.db = db
+
+    async def get_nodes(self, espace_id: Optional[int] = None) -> List[NoeudArduino]:
+        query = select(NoeudArduino)
+        if espace_id is not None:
+            query = query.where(NoeudArduino.espace_id == espace_id)
+        return self.db.execute(query.order_by(NoeudArduino.id)).scalars().all()
+
+    async def get_node(self, node_id: int) -> NoeudArduino:
+        node = self.db.get(NoeudArduino, node_id)
+        if not node:
+            raise ResourceNotFoundException("NoeudArduino", node_id)
+        return node
+
+    async def create_node(self, node_data: NoeudArduinoCreate) -> NoeudArduino:
+        if not self.db.get(Espace, node_data.espace_id):
+            raise ResourceNotFoundException("Espace", node_data.espace_id)
+        node = NoeudArduino(**node_data.dict(), cle_api=generate_api_key())
+        self.db.add(node)
+        apply_counter_delta(self.db, node.espace_id, noeuds=1)
+        self.db.commit()
+        self.db.refresh(node)
+        return node
+
+    async def update_node(self, node_id: int, node_data: NoeudArduinoUpdate) -> NoeudArduino:
+        node = await self.get_node(node_id)
+        update_data = node_data.dict(exclude_unset=True)
+        new_espace_id = update_data.get("espace_id", node.espace_id)
+        if new_espace_id != node.espace_id:
+            if not self.db.get(Espace, new_espace_id):
+                raise ResourceNotFoundException("Espace", new_espace_id)
+            # Le nœud emmène ses capteurs et leurs alertes actives
+            noeuds, capteurs, alertes = node_counts(self.db, node_id)
+            apply_counter_delta(self.db, node.espace_id, -noeuds, -capteurs, -alertes)
+            apply_counter_delta(self.db, new_espace_id, noeuds, capteurs, alertes)
+        for field, value in update_data.items():
+            setattr(node, field, value)
+        node.date_modification = datetime.utcnow()
+        self.db.commit()
+        self.db.refresh(node)
+        return node
+
+    async def delete_node(self, node_id: int):
+        node = await self.get_node(node_id)
+        noeuds, capteurs, alertes = node_counts(self.db, node_id)
+        apply_counter_delta(self.db, node.espace_id, -noeuds, -capteurs, -alertes)
+        self.db.delete(node)
+        try:
+            self.db.commit()
+        except IntegrityError as e:
+            self.db.rollback()
+            raise handle_database_error(e)
+        return {"message": "Nœud supprimé"}
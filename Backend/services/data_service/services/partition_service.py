@@ -0,0 +1,59 @@
+"""Service de maintenance des partitions de donnees_capteurs"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict
+
+from sqlalchemy.engine import Engine
+
+from shared.config import get_data_settings
+from shared.database import sync_engine
+from shared.utils.partitioning import (
+    drop_expired_partitions,
+    ensure_future_partitions,
+    is_partitioned,
+    prune_default_partition,
+)
+
+settings = get_data_settings()
+logger = logging.getLogger(__name__)
+
+
+class PartitionService:
+    """Création des partitions futures et suppression des partitions expirées"""
+
+    def __init__(self, engine: Engine = sync_engine):
+        self.engine = engine
+
+    def maintain(self, now: datetime = None) -> Dict:
+        """Exécuter un cycle de maintenance (sans effet hors PostgreSQL partitionné)"""
+        result = {"created": [], "dropped": [], "pruned": 0}
+        if self.engine.dialect.name != "postgresql":
+            return result
+
+        now = now or datetime.utcnow()
+        with self.engine.begin() as conn:
+            if not is_partitioned(conn):
+                return result
+            result["created"] = ensure_future_partitions(conn, now, settings.partition_months_ahead)
+            result["dropped"] = drop_expired_partitions(conn, now, settings.sensor_data_retention_days)
+            result["pruned"] = prune_default_partition(conn, now, settings.sensor_data_retention_days)
+
+        if result["created"]:
+            logger.info(f"Partitions créées: {', '.join(result['created'])}")
+        if result["dropped"]:
+            logger.info(f"Partitions expirées supprimées: {', '.join(result['dropped'])}")
+        if result["pruned"]:
+            logger.info(f"Mesures expirées supprimées de la partition par défaut: {result['pruned']}")
+        return result
+
+
+async def run_partition_maintenance(service: PartitionService = None):
+    """Boucle de maintenance périodique lancée au démarrage du service"""
+    service = service or PartitionService()
+    while True:
+        try:
+            await asyncio.to_thread(service.maintain)
+        except Exception as e:
+            logger.error(f"Erreur de maintenance des partitions: {e}")
+        await asyncio.sleep(settings.partition_maintenance_interval)
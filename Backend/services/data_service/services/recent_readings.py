@@ -0,0 +1,298 @@
+"""Tampon circulaire en mémoire des mesures récentes, par capteur"""
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlmodel import Session, select
+
+from shared.config import get_data_settings
+from shared.database import SessionLocal
+from shared.models.sensor import DonneesCapteur
+from shared.utils.series import Series, from_us, rows_to_series, to_us
+
+settings = get_data_settings()
+logger = logging.getLogger(__name__)
+
+MIN_SIZE = 256
+COLUMNS = 4  # horodatage, valeur, id, niveau_batterie (8 octets chacun)
+
+
+class SensorRing:
+    """
+    Mesures d'un capteur triées par horodatage, dans des colonnes NumPy.
+
+    Les données vivantes occupent ``[start, end)`` d'un stockage contigu : les
+    lectures sont des vues sans copie et les ajouts sont en O(1) amorti (le
+    stockage est compacté quand ``end`` atteint sa fin). Le capteur est
+    complet pour toute mesure postérieure ou égale à ``covered_from``.
+    """
+
+    __slots__ = ("ts", "values", "ids", "batteries", "start", "end", "covered_from")
+
+    def __init__(self, size: int, covered_from: int):
+        self.ts = np.empty(size, dtype=np.int64)
+        self.values = np.empty(size, dtype=np.float64)
+        self.ids = np.empty(size, dtype=np.int64)
+        self.batteries = np.empty(size, dtype=np.float64)
+        self.start = self.end = 0
+        self.covered_from = covered_from
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    @property
+    def size(self) -> int:
+        return len(self.ts)
+
+    @property
+    def nbytes(self) -> int:
+        return self.size * COLUMNS * 8
+
+    def relocate(self, size: int, keep_from: int):
+        """Recopier les données à partir de ``keep_from`` au début d'un stockage de ``size`` points"""
+        count = self.end - keep_from
+        if keep_from > self.start:
+            # Complet après la dernière mesure écartée
+            self.covered_from = max(self.covered_from, int(self.ts[keep_from - 1]) + 1)
+        for name in ("ts", "values", "ids", "batteries"):
+            column = getattr(self, name)
+            target = column if size == len(column) else np.empty(size, dtype=column.dtype)
+            target[:count] = column[keep_from:self.end]
+            setattr(self, name, target)
+        self.start, self.end = 0, count
+
+    def contains(self, ts: int, id_: int) -> bool:
+        """La mesure ``id_`` (horodatée ``ts``) est-elle déjà présente ?"""
+        if self.end == self.start or ts > self.ts[self.end - 1]:
+            return False
+        live = self.ts[self.start:self.end]
+        lo = self.start + int(np.searchsorted(live, ts, side="left"))
+        hi = self.start + int(np.searchsorted(live, ts, side="right"))
+        return bool((self.ids[lo:hi] == id_).any())
+
+    def insert(self, ts: int, valeur: float, id_: int, batterie: float):
+        """Insérer une mesure (le stockage doit avoir une place libre en fin)"""
+        if self.end > self.start and ts < self.ts[self.end - 1]:
+            # Mesure en retard : décaler la fin (rare)
+            pos = self.start + int(np.searchsorted(self.ts[self.start:self.end], ts, side="right"))
+            for column in (self.ts, self.values, self.ids, self.batteries):
+                column[pos + 1:self.end + 1] = column[pos:self.end]
+        else:
+            pos = self.end
+        self.ts[pos], self.values[pos], self.ids[pos], self.batteries[pos] = ts, valeur, id_, batterie
+        self.end += 1
+
+    def window(self, lo: int, hi: Optional[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Vues sur les mesures de ``[lo, hi)``"""
+        ts = self.ts[self.start:self.end]
+        i = int(np.searchsorted(ts, lo, side="left"))
+        j = len(ts) if hi is None else int(np.searchsorted(ts, hi, side="left"))
+        s = slice(self.start + i, self.start + j)
+        return self.ts[s], self.values[s], self.ids[s], self.batteries[s]
+
+
+class RecentReadings:
+    """
+    Mesures récentes de tous les capteurs, servies sans accès à la base.
+
+    Préchargé depuis la base au démarrage (``ring_buffer_window_hours``) puis
+    alimenté à chaque ingestion. Chaque capteur garde au plus
+    ``ring_buffer_max_points`` points ; l'ensemble est plafonné à
+    ``ring_buffer_memory_mb``. Un capteur qui ne tient plus dans le budget
+    est marqué en débordement et ses requêtes retombent sur la base.
+
+    Pendant un chargement (``begin_load`` puis ``load``), les ajouts sont mis
+    en attente puis rejoués sur le contenu chargé : une mesure ingérée entre
+    la lecture de la base et la fin du chargement n'est pas perdue. Une
+    mesure reçue deux fois (rejeu, redistribution) n'est gardée qu'une fois.
+    """
+
+    def __init__(self, window_hours: int = None, max_points: int = None, memory_mb: int = None):
+        self.window_us = (window_hours or settings.ring_buffer_window_hours) * 3600 * 10**6
+        self.max_points = max_points or settings.ring_buffer_max_points
+        self.budget = (memory_mb or settings.ring_buffer_memory_mb) * 1024 * 1024
+        self.covered_from: Optional[int] = None  # None : tampon pas encore chargé
+        self._rings: Dict[int, SensorRing] = {}
+        self._overflow: Set[int] = set()
+        self._bytes = 0
+        self._pending: Optional[List[tuple]] = None  # ajouts reçus pendant un chargement
+        self._generation = 0
+        self._lock = threading.Lock()  # ajouts et fin de chargement
+        self._load_lock = threading.Lock()  # un seul chargement à la fois
+
+    @property
+    def ready(self) -> bool:
+        return self.covered_from is not None
+
+    def _allocate(self, capteur_id: int, size: int, covered_from: int = None) -> Optional[SensorRing]:
+        if self._bytes + size * COLUMNS * 8 > self.budget:
+            self._overflow.add(capteur_id)
+            return None
+        ring = SensorRing(size, self.covered_from if covered_from is None else covered_from)
+        self._bytes += ring.nbytes
+        self._rings[capteur_id] = ring
+        return ring
+
+    def _make_room(self, ring: SensorRing, now_us: int):
+        """Libérer une place en fin de stockage : agrandir, ou écarter les plus anciennes"""
+        if ring.end < ring.size:
+            return
+        limit = 2 * self.max_points
+        if len(ring) < self.max_points and ring.size < limit:
+            new_size = min(ring.size * 2, limit)
+            if self._bytes + (new_size - ring.size) * COLUMNS * 8 <= self.budget:
+                self._bytes += (new_size - ring.size) * COLUMNS * 8
+                ring.relocate(new_size, ring.start)
+                return
+        # Garder au plus la moitié du stockage, et rien au-delà de la fenêtre
+        live = ring.ts[ring.start:ring.end]
+        keep_from = max(
+            ring.start + int(np.searchsorted(live, now_us - self.window_us, side="left")),
+            ring.end - ring.size // 2,
+        )
+        ring.relocate(ring.size, keep_from)
+
+    def append(self, capteur_id: int, id_: int, valeur: float, horodatage: datetime,
+               niveau_batterie: Optional[float] = None):
+        """Ajouter une mesure ingérée (ici ou par une autre instance)"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((capteur_id, id_, valeur, horodatage, niveau_batterie))
+            elif self.ready:
+                self._insert(capteur_id, id_, valeur, horodatage, niveau_batterie, to_us(datetime.utcnow()))
+
+    def _insert(self, capteur_id: int, id_: int, valeur: float, horodatage: datetime,
+                niveau_batterie: Optional[float], now_us: int):
+        if capteur_id in self._overflow:
+            return
+        ts = to_us(horodatage)
+        ring = self._rings.get(capteur_id)
+        if ring is None:
+            ring = self._allocate(capteur_id, MIN_SIZE)
+        if ring is None or ts < ring.covered_from or ring.contains(ts, id_):
+            return
+        self._make_room(ring, now_us)
+        ring.insert(ts, valeur, id_, np.nan if niveau_batterie is None else niveau_batterie)
+
+    def covers(self, capteurs_ids: Optional[Iterable[int]], start: datetime) -> bool:
+        """La plage commençant à ``start`` est-elle entièrement en mémoire ?"""
+        if not self.ready:
+            return False
+        lo = to_us(start)
+        if lo < self.covered_from:
+            return False
+        if not capteurs_ids:
+            if self._overflow:
+                return False
+            return all(lo >= ring.covered_from for ring in self._rings.values())
+        for capteur_id in capteurs_ids:
+            if capteur_id in self._overflow:
+                return False
+            ring = self._rings.get(capteur_id)
+            if ring is not None and lo < ring.covered_from:
+                return False
+        return True
+
+    def query(self, capteurs_ids: Optional[List[int]], start: datetime,
+              end: Optional[datetime]) -> Optional[List[Series]]:
+        """Séries de chaque capteur sur ``[start, end)``, triées par capteur, ou None si non couvert"""
+        if not self.covers(capteurs_ids, start):
+            return None
+        lo, hi = to_us(start), None if end is None else to_us(end)
+        ids = sorted(set(capteurs_ids)) if capteurs_ids else sorted(self._rings)
+        series = []
+        for capteur_id in ids:
+            ring = self._rings.get(capteur_id)
+            if ring is None:
+                continue
+            ts, values, row_ids, batteries = ring.window(lo, hi)
+            if len(ts):
+                series.append((capteur_id, ts, values, row_ids, batteries))
+        return series
+
+    def begin_load(self) -> int:
+        """Cesser de servir et mettre les ajouts en attente ; retourne le numéro du chargement"""
+        with self._lock:
+            self._generation += 1
+            self.covered_from = None
+            self._pending = []
+            return self._generation
+
+    def load(self, rows: List[tuple], now: datetime, generation: int = None):
+        """
+        Remplacer le contenu par des lignes (id, capteur_id, valeur, horodatage,
+        batterie) triées par capteur puis temps, puis rejouer les ajouts reçus
+        depuis ``begin_load``. Un chargement dépassé par un ``begin_load``
+        plus récent est abandonné.
+        """
+        with self._load_lock:
+            if generation is None:
+                generation = self.begin_load()
+            elif generation != self._generation:
+                return
+            # Pas de lecture pendant le remplissage ; les ajouts vont dans _pending
+            self._rings, self._overflow, self._bytes = {}, set(), 0
+            covered_from = to_us(now) - self.window_us
+            if rows:
+                self._fill(rows, covered_from)
+            with self._lock:
+                if generation != self._generation:
+                    return
+                self.covered_from = covered_from
+                now_us = to_us(datetime.utcnow())
+                for pending in self._pending:
+                    self._insert(*pending, now_us)
+                self._pending = None
+
+    def _fill(self, rows: List[tuple], covered_from: int):
+        for capteur_id, ts, valeurs, ids, batteries in rows_to_series(rows):
+            truncated = len(ts) > self.max_points
+            if truncated:
+                # Capteur trop bavard : seuls les max_points derniers points sont gardés
+                dropped_until = int(ts[-self.max_points - 1])
+                ts, valeurs, ids, batteries = (a[-self.max_points:] for a in (ts, valeurs, ids, batteries))
+            count = len(ts)
+            size = min(max(MIN_SIZE, 1 << count.bit_length()), 2 * self.max_points)
+            ring = self._allocate(capteur_id, size, covered_from)
+            if ring is None:
+                continue
+            ring.ts[:count], ring.values[:count], ring.ids[:count], ring.batteries[:count] = ts, valeurs, ids, batteries
+            ring.end = count
+            if truncated:
+                ring.covered_from = dropped_until + 1
+
+    def warm(self, db: Session, now: datetime = None, generation: int = None) -> int:
+        """Charger la fenêtre récente depuis la base, retourne le nombre de mesures"""
+        now = now or datetime.utcnow()
+        rows = db.execute(
+            select(
+                DonneesCapteur.id,
+                DonneesCapteur.capteur_id,
+                DonneesCapteur.valeur,
+                DonneesCapteur.horodatage,
+                DonneesCapteur.niveau_batterie,
+            )
+            .where(DonneesCapteur.horodatage >= from_us(to_us(now) - self.window_us))
+            .order_by(DonneesCapteur.capteur_id, DonneesCapteur.horodatage)
+        ).all()
+        self.load(rows, now, generation)
+        return len(rows)
+
+    def rewarm(self, generation: int = None) -> int:
+        db = SessionLocal()
+        try:
+            return self.warm(db, generation=generation)
+        finally:
+            db.close()
+
+    def invalidate(self):
+        """Ne plus servir de requêtes (flux d'ingestion interrompu) jusqu'au prochain chargement"""
+        with self._lock:
+            self._generation += 1
+            self.covered_from = None
+            self._pending = None
+
+
+recent_readings = RecentReadings()
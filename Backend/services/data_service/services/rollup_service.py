@@ -0,0 +1,246 @@
+"""Maintenance des agrégats horaires et des statistiques cumulées par capteur"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import delete
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, func, select
+
+from shared.config import get_data_settings
+from shared.database import get_redis, sync_engine
+from shared.models.sensor import (
+    Capteur,
+    DonneesCapteur,
+    DonneesCapteurBloc,
+    DonneesCapteurRollup,
+    StatistiqueCapteur,
+)
+from shared.utils.series import EPOCH
+from services.data_service.services.rollup_store import (
+    HOUR,
+    build_rollups,
+    floor_hour,
+    rollup_stats,
+    sensor_series,
+)
+from services.data_service.services.running_stats import RunningStats
+
+settings = get_data_settings()
+logger = logging.getLogger(__name__)
+
+# Heures déjà agrégées ayant reçu une mesure en retard ("capteur_id:epoch")
+DIRTY_KEY = "gardenconnect:rollups:dirty"
+CHUNK = timedelta(days=1)
+
+DirtyHour = Tuple[int, datetime]
+
+
+def rollup_horizon(now: datetime) -> datetime:
+    """Les heures antérieures sont closes et peuvent être agrégées"""
+    return floor_hour(now - timedelta(minutes=settings.rollup_lag_minutes))
+
+
+async def mark_dirty(capteur_id: int, horodatage: datetime):
+    """Signaler une mesure arrivée après la clôture de son heure (appelé à l'ingestion)"""
+    if horodatage >= rollup_horizon(datetime.utcnow()):
+        return
+    hour = int((floor_hour(horodatage) - EPOCH).total_seconds())
+    try:
+        redis_conn = await get_redis()
+        await redis_conn.sadd(DIRTY_KEY, f"{capteur_id}:{hour}")
+    except Exception as e:
+        logger.warning(f"Heure à réagréger non enregistrée: {e}")
+
+
+async def pop_dirty() -> Set[DirtyHour]:
+    redis_conn = await get_redis()
+    members = await redis_conn.spop(DIRTY_KEY, 10000) or []
+    dirty = set()
+    for member in members:
+        capteur_id, hour = (member.decode() if isinstance(member, bytes) else member).split(":")
+        dirty.add((int(capteur_id), EPOCH + timedelta(seconds=int(hour))))
+    return dirty
+
+
+async def push_dirty(dirty: Iterable[DirtyHour]):
+    members = [f"{capteur_id}:{int((hour - EPOCH).total_seconds())}" for capteur_id, hour in dirty]
+    if members:
+        redis_conn = await get_redis()
+        await redis_conn.sadd(DIRTY_KEY, *members)
+
+
+class RollupService:
+    """
+    Agrège chaque heure close de chaque capteur (nombre, somme, m2, min, max
+    et esquisse DDSketch), puis cumule les nouvelles heures dans
+    statistiques_capteurs jusqu'au filigrane. Le recalcul d'une heure est
+    idempotent : une mesure en retard la fait recalculer au passage suivant,
+    et son écart est reporté sur les statistiques cumulées. Un capteur sans
+    mesure n'a pas de ligne de statistiques.
+    """
+
+    def __init__(self, engine: Engine = sync_engine):
+        self.engine = engine
+
+    def refresh(self, dirty: Iterable[DirtyHour] = (), now: datetime = None) -> Dict[str, int]:
+        now = now or datetime.utcnow()
+        horizon = rollup_horizon(now)
+        retention_start = floor_hour(now - timedelta(days=settings.sensor_data_retention_days))
+        late: Dict[int, List[datetime]] = {}
+        for capteur_id, hour in dirty:
+            if retention_start <= hour < horizon:
+                late.setdefault(capteur_id, []).append(hour)
+
+        result = {"heures": 0, "recalculees": 0, "expirees": 0}
+        with Session(self.engine) as db:
+            for capteur_id in db.execute(select(Capteur.id)).scalars().all():
+                # Verrou par capteur : une seule instance cumule ses statistiques
+                stats = self._lock_stats(db, capteur_id, create=False)
+                last = db.execute(
+                    select(func.max(DonneesCapteurRollup.debut)).where(DonneesCapteurRollup.capteur_id == capteur_id)
+                ).scalar_one_or_none()
+                rolled_until = last + HOUR if last else retention_start
+                if stats is None:
+                    if last is None and self._next_hour(db, capteur_id, rolled_until, horizon) is None:
+                        continue
+                    stats = self._lock_stats(db, capteur_id)
+                    if stats is None:  # capteur supprimé entre-temps
+                        db.rollback()
+                        continue
+                state = RunningStats(
+                    stats.nombre, stats.moyenne, stats.m2, stats.valeur_min, stats.valeur_max,
+                    stats.premiere_mesure, stats.derniere_mesure,
+                )
+
+                # Heures déjà agrégées : recalcul, et écart reporté si déjà cumulées
+                for hour in sorted(h for h in late.get(capteur_id, ()) if h < rolled_until):
+                    old, new = self._replace(db, capteur_id, hour, hour + HOUR)
+                    result["recalculees"] += 1
+                    if stats.filigrane is not None and hour < stats.filigrane:
+                        for row in old:
+                            state.remove(rollup_stats(row))
+                        for row in new:
+                            state.merge(rollup_stats(row))
+
+                result["heures"] += self._roll_forward(db, capteur_id, rolled_until, horizon)
+
+                for row in self._rollups(db, capteur_id, stats.filigrane or retention_start, horizon):
+                    state.merge(rollup_stats(row))
+                stats.nombre, stats.moyenne, stats.m2 = state.count, state.mean, state.m2
+                stats.valeur_min, stats.valeur_max = state.min, state.max
+                stats.premiere_mesure, stats.derniere_mesure = state.first, state.last
+                stats.filigrane, stats.date_modification = horizon, now
+                db.commit()
+
+            result["expirees"] = db.execute(
+                delete(DonneesCapteurRollup).where(DonneesCapteurRollup.debut < retention_start)
+            ).rowcount
+            db.commit()
+
+        if result["heures"] or result["recalculees"]:
+            logger.info(f"{result['heures']} heures agrégées, {result['recalculees']} recalculées")
+        return result
+
+    @staticmethod
+    def _lock_stats(db: Session, capteur_id: int, create: bool = True) -> Optional[StatistiqueCapteur]:
+        query = select(StatistiqueCapteur).where(StatistiqueCapteur.capteur_id == capteur_id).with_for_update()
+        stats = db.execute(query).scalar_one_or_none()
+        if stats is None and create:
+            try:
+                with db.begin_nested():
+                    stats = StatistiqueCapteur(capteur_id=capteur_id)
+                    db.add(stats)
+            except IntegrityError:
+                # Créée par une autre instance, ou capteur supprimé (None)
+                stats = db.execute(query).scalar_one_or_none()
+        return stats
+
+    @staticmethod
+    def _rollups(db: Session, capteur_id: int, start: datetime, end: datetime) -> list:
+        """Colonnes statistiques des agrégats de ``[start, end)``"""
+        return db.execute(
+            select(
+                DonneesCapteurRollup.nombre, DonneesCapteurRollup.somme, DonneesCapteurRollup.m2,
+                DonneesCapteurRollup.valeur_min, DonneesCapteurRollup.valeur_max,
+                DonneesCapteurRollup.premiere, DonneesCapteurRollup.derniere,
+            ).where(
+                DonneesCapteurRollup.capteur_id == capteur_id,
+                DonneesCapteurRollup.debut >= start,
+                DonneesCapteurRollup.debut < end,
+            )
+        ).all()
+
+    def _roll_forward(self, db: Session, capteur_id: int, start: datetime, horizon: datetime) -> int:
+        """Agréger ``[start, horizon)`` par tranches d'un jour, en sautant les périodes sans mesure"""
+        count = 0
+        while start < horizon:
+            start = self._next_hour(db, capteur_id, start, horizon)
+            if start is None:
+                break
+            end = min(start + CHUNK, horizon)
+            count += len(self._replace(db, capteur_id, start, end)[1])
+            start = end
+        return count
+
+    @staticmethod
+    def _next_hour(db: Session, capteur_id: int, after: datetime, before: datetime) -> Optional[datetime]:
+        """Première heure de ``[after, before)`` ayant des mesures, brutes ou compactées"""
+        raw = db.execute(
+            select(func.min(DonneesCapteur.horodatage)).where(
+                DonneesCapteur.capteur_id == capteur_id,
+                DonneesCapteur.horodatage >= after,
+                DonneesCapteur.horodatage < before,
+            )
+        ).scalar_one_or_none()
+        compacted = db.execute(
+            select(func.min(DonneesCapteurBloc.debut)).where(
+                DonneesCapteurBloc.capteur_id == capteur_id,
+                DonneesCapteurBloc.fin >= after,
+                DonneesCapteurBloc.debut < before,
+            )
+        ).scalar_one_or_none()
+        first = min((t for t in (raw, compacted) if t is not None), default=None)
+        return None if first is None else max(floor_hour(first), after)
+
+    def _replace(self, db: Session, capteur_id: int, start: datetime, end: datetime):
+        """Recalculer les agrégats de ``[start, end)`` ; retourne (anciens, nouveaux)"""
+        old = self._rollups(db, capteur_id, start, end)
+        series = sensor_series(db, capteur_id, start, end)
+        new = build_rollups(series) if series is not None else []
+        try:
+            with db.begin_nested():
+                db.execute(
+                    delete(DonneesCapteurRollup).where(
+                        DonneesCapteurRollup.capteur_id == capteur_id,
+                        DonneesCapteurRollup.debut >= start,
+                        DonneesCapteurRollup.debut < end,
+                    )
+                )
+                db.add_all(new)
+        except IntegrityError:
+            # Une autre instance vient d'agréger la même plage (contenu identique)
+            return [], []
+        return old, new
+
+
+async def run_rollups(service: RollupService = None):
+    """Boucle d'agrégation périodique lancée au démarrage du service"""
+    service = service or RollupService()
+    while True:
+        dirty = set()
+        try:
+            dirty = await pop_dirty()
+        except Exception as e:
+            logger.warning(f"Heures à réagréger indisponibles: {e}")
+        try:
+            await asyncio.to_thread(service.refresh, dirty)
+        except Exception as e:
+            logger.error(f"Erreur d'agrégation horaire: {e}")
+            try:
+                await push_dirty(dirty)
+            except Exception:
+                pass
+        await asyncio.sleep(settings.rollup_interval)
@@ -0,0 +1,139 @@
+"""Lecture des agrégats horaires (donnees_capteurs_rollups) et de leurs esquisses"""
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import numpy as np
+from sqlmodel import Session, func, select
+
+from shared.models.sensor import DonneesCapteurRollup
+from shared.utils.block_store import sensor_series
+from shared.utils.series import Series, from_us
+from services.data_service.services.running_stats import RunningStats
+from services.data_service.services.sketch import DDSketch
+
+HOUR = timedelta(hours=1)
+HOUR_US = 3600 * 10**6
+
+
+def floor_hour(horodatage: datetime) -> datetime:
+    return horodatage.replace(minute=0, second=0, microsecond=0)
+
+
+def ceil_hour(horodatage: datetime) -> datetime:
+    floor = floor_hour(horodatage)
+    return floor if floor == horodatage else floor + HOUR
+
+
+def build_rollups(series: Series) -> List[DonneesCapteurRollup]:
+    """Un agrégat par heure contenant au moins une mesure"""
+    capteur_id, ts, valeurs = series[0], series[1], series[2]
+    if not len(ts):
+        return []
+    hours = ts // HOUR_US
+    starts, first = np.unique(hours, return_index=True)
+    bounds = np.append(first, len(ts))
+    counts = np.diff(bounds)
+    sums = np.add.reduceat(valeurs, first)
+    means = np.repeat(sums / counts, counts)
+    m2s = np.add.reduceat((valeurs - means) ** 2, first)
+    mins = np.minimum.reduceat(valeurs, first)
+    maxs = np.maximum.reduceat(valeurs, first)
+    return [
+        DonneesCapteurRollup(
+            capteur_id=capteur_id,
+            debut=from_us(int(hour) * HOUR_US),
+            nombre=int(hi - lo),
+            somme=float(total),
+            valeur_min=float(vmin),
+            valeur_max=float(vmax),
+            m2=float(m2),
+            premiere=from_us(ts[lo]),
+            derniere=from_us(ts[hi - 1]),
+            sketch=DDSketch.from_values(valeurs[lo:hi]).to_bytes(),
+        )
+        for hour, lo, hi, total, vmin, vmax, m2 in zip(starts, bounds[:-1], bounds[1:], sums, mins, maxs, m2s)
+    ]
+
+
+def rollup_stats(rollup: DonneesCapteurRollup) -> RunningStats:
+    """État Welford d'un agrégat horaire (ou d'une ligne avec les mêmes colonnes)"""
+    return RunningStats(
+        rollup.nombre, rollup.somme / rollup.nombre, rollup.m2,
+        rollup.valeur_min, rollup.valeur_max, rollup.premiere, rollup.derniere,
+    )
+
+
+def series_stats(series: Optional[Series]) -> RunningStats:
+    if series is None or not len(series[1]):
+        return RunningStats()
+    return RunningStats.from_values(series[2], from_us(series[1][0]), from_us(series[1][-1]))
+
+
+class RollupStore:
+    """Esquisses et statistiques d'un capteur sur une plage, depuis les agrégats horaires"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def rolled_until(self, capteur_id: int) -> Optional[datetime]:
+        """Fin de la dernière heure agrégée du capteur"""
+        last = self.db.execute(
+            select(func.max(DonneesCapteurRollup.debut)).where(DonneesCapteurRollup.capteur_id == capteur_id)
+        ).scalar_one_or_none()
+        return last + HOUR if last else None
+
+    def _split(self, capteur_id: int, start: datetime, end: datetime):
+        """
+        Découper ``[start, end)`` : heures entières déjà agrégées ``[lo, hi)``
+        et bordures à relire depuis les mesures.
+        """
+        rolled_until = self.rolled_until(capteur_id)
+        lo = min(ceil_hour(start), end)
+        hi = lo if rolled_until is None else max(lo, min(floor_hour(end), rolled_until))
+        edges = []
+        for edge_start, edge_end in ((start, lo), (hi, end)):
+            if edge_start < edge_end:
+                series = sensor_series(self.db, capteur_id, edge_start, edge_end)
+                if series is not None:
+                    edges.append(series)
+        return lo, hi, edges
+
+    def _rollups(self, columns, capteur_id: int, lo: datetime, hi: datetime):
+        return self.db.execute(
+            select(*columns).where(
+                DonneesCapteurRollup.capteur_id == capteur_id,
+                DonneesCapteurRollup.debut >= lo,
+                DonneesCapteurRollup.debut < hi,
+            )
+        )
+
+    def sketch(self, capteur_id: int, start: datetime, end: datetime) -> DDSketch:
+        """
+        Esquisse des mesures de ``[start, end)``.
+
+        Les heures entières déjà agrégées sont lues dans
+        donnees_capteurs_rollups ; seules les heures partielles en bordure et
+        celles pas encore agrégées sont relues depuis les mesures.
+        """
+        lo, hi, edges = self._split(capteur_id, start, end)
+        sketches = [
+            DDSketch.from_bytes(data)
+            for data in self._rollups([DonneesCapteurRollup.sketch], capteur_id, lo, hi).scalars()
+        ]
+        sketches.extend(DDSketch.from_values(series[2]) for series in edges)
+        return DDSketch.merged(sketches)
+
+    def stats(self, capteur_id: int, start: datetime, end: datetime) -> RunningStats:
+        """Statistiques des mesures de ``[start, end)``, même découpage que ``sketch``"""
+        lo, hi, edges = self._split(capteur_id, start, end)
+        stats = RunningStats()
+        columns = [
+            DonneesCapteurRollup.nombre, DonneesCapteurRollup.somme, DonneesCapteurRollup.m2,
+            DonneesCapteurRollup.valeur_min, DonneesCapteurRollup.valeur_max,
+            DonneesCapteurRollup.premiere, DonneesCapteurRollup.derniere,
+        ]
+        for row in self._rollups(columns, capteur_id, lo, hi):
+            stats.merge(rollup_stats(row))
+        for series in edges:
+            stats.merge(series_stats(series))
+        return stats
@@ -0,0 +1,85 @@
+"""Statistiques courantes fusionnables (Welford / Chan)"""
+import math
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+
+def _pick(choose, a, b):
+    return b if a is None else a if b is None else choose(a, b)
+
+
+class RunningStats:
+    """
+    Nombre, moyenne, somme des carrés des écarts (m2), extrêmes et premier /
+    dernier horodatage d'un ensemble de mesures.
+
+    Deux états se combinent sans relire les mesures (formule de Chan), ce qui
+    permet de cumuler des agrégats horaires ou de prolonger un état persisté.
+    """
+
+    __slots__ = ("count", "mean", "m2", "min", "max", "first", "last")
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0,
+                 vmin: Optional[float] = None, vmax: Optional[float] = None,
+                 first: Optional[datetime] = None, last: Optional[datetime] = None):
+        self.count, self.mean, self.m2 = int(count), float(mean), float(m2)
+        self.min, self.max = vmin, vmax
+        self.first, self.last = first, last
+
+    @classmethod
+    def from_values(cls, values: np.ndarray, first: datetime = None, last: datetime = None) -> "RunningStats":
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return cls()
+        mean = values.mean()
+        return cls(len(values), mean, float(((values - mean) ** 2).sum()),
+                   float(values.min()), float(values.max()), first, last)
+
+    @property
+    def variance(self) -> Optional[float]:
+        """Variance de l'échantillon (n - 1)"""
+        return self.m2 / (self.count - 1) if self.count > 1 else None
+
+    @property
+    def std(self) -> Optional[float]:
+        variance = self.variance
+        return math.sqrt(max(variance, 0.0)) if variance is not None else None
+
+    def merge(self, other: "RunningStats") -> "RunningStats":
+        """Ajouter un autre état (en place)"""
+        if not other.count:
+            return self
+        if not self.count:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max, self.first, self.last = other.min, other.max, other.first, other.last
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+        self.min, self.max = min(self.min, other.min), max(self.max, other.max)
+        self.first, self.last = _pick(min, self.first, other.first), _pick(max, self.last, other.last)
+        return self
+
+    def remove(self, other: "RunningStats") -> "RunningStats":
+        """
+        Retirer un sous-ensemble déjà compté (en place), inverse de ``merge``.
+
+        Les extrêmes et horodatages ne peuvent pas être retirés : ils ne sont
+        valables que si le sous-ensemble est remplacé par un sur-ensemble
+        (recalcul d'une heure ayant reçu une mesure en retard).
+        """
+        if not other.count:
+            return self
+        count = self.count - other.count
+        if count <= 0:
+            self.count, self.mean, self.m2 = 0, 0.0, 0.0
+            return self
+        mean = (self.mean * self.count - other.mean * other.count) / count
+        delta = other.mean - mean
+        self.m2 = max(self.m2 - other.m2 - delta * delta * count * other.count / self.count, 0.0)
+        self.mean, self.count = mean, count
+        return self
@@ -1,6 +1,235 @@
 """Service sensors"""
-from sqlmodel import Session
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from redis.exceptions import RedisError
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from sqlmodel import Session, func, or_, select
+from shared.models.alert import Alerte
+from shared.models.node import NoeudArduino
+from shared.models.sensor import Capteur, DonneesCapteur, DonneesCapteurBloc, DonneesCapteurRollup, StatistiqueCapteur
+from shared.models.space import EspaceHierarchie, EspaceUtilisateur
+from shared.config import get_data_settings
+from shared.schemas.sensor import (
+    CapteurCreate,
+    CapteurHistogram,
+    CapteurPercentiles,
+    CapteurResponse,
+    CapteurStats,
+    CapteurUpdate,
+    CapteurWithLastData,
+)
+from shared.utils.block_store import sensor_series
+from shared.utils.exceptions import ResourceNotFoundException, ValidationException, handle_database_error
+from shared.utils.space_counters import apply_counter_delta, sensor_space_id
+from services.data_service.services.last_value_cache import last_values
+from services.data_service.services.recent_readings import recent_readings
+from services.data_service.services.rollup_store import RollupStore, series_stats
+from services.data_service.services.running_stats import RunningStats
+from services.data_service.services.sketch import RELATIVE_ACCURACY
+
+settings = get_data_settings()
+logger = logging.getLogger(__name__)
 
 class SensorService:
     def __init__(self, db: Session):
         self.db = db
+
+    async def get_sensor(self, sensor_id: int) -> Capteur:
+        sensor = self.db.get(Capteur, sensor_id)
+        if not sensor:
+            raise ResourceNotFoundException("Capteur", sensor_id)
+        return sensor
+
+    async def create_sensor(self, sensor_data: CapteurCreate) -> Capteur:
+        node = self.db.get(NoeudArduino, sensor_data.noeud_id)
+        if not node:
+            raise ResourceNotFoundException("NoeudArduino", sensor_data.noeud_id)
+        sensor = Capteur(**sensor_data.dict())
+        self.db.add(sensor)
+        apply_counter_delta(self.db, node.espace_id, capteurs=1)
+        self.db.commit()
+        self.db.refresh(sensor)
+        return sensor
+
+    async def update_sensor(self, sensor_id: int, sensor_data: CapteurUpdate) -> Capteur:
+        sensor = await self.get_sensor(sensor_id)
+        for field, value in sensor_data.dict(exclude_unset=True).items():
+            setattr(sensor, field, value)
+        sensor.date_modification = datetime.utcnow()
+        self.db.commit()
+        self.db.refresh(sensor)
+        return sensor
+
+    async def delete_sensor(self, sensor_id: int):
+        sensor = await self.get_sensor(sensor_id)
+        active_alerts = self.db.execute(
+            select(func.count()).select_from(Alerte)
+            .where(Alerte.capteur_id == sensor_id, Alerte.est_active == True)
+        ).scalar_one()
+        apply_counter_delta(self.db, sensor_space_id(self.db, sensor_id), capteurs=-1, alertes_actives=-active_alerts)
+        # Mesures et données dérivées : statistiques cumulées, agrégats horaires, blocs compactés
+        for model in (StatistiqueCapteur, DonneesCapteurRollup, DonneesCapteurBloc, DonneesCapteur):
+            self.db.execute(delete(model).where(model.capteur_id == sensor_id))
+        self.db.delete(sensor)
+        try:
+            self.db.commit()
+        except IntegrityError as e:
+            self.db.rollback()
+            raise handle_database_error(e)
+        return {"message": "Capteur supprimé"}
+
+    def _period(self, start: Optional[datetime], end: Optional[datetime]) -> Tuple[datetime, datetime]:
+        end = end or datetime.utcnow()
+        start = start or end - timedelta(days=settings.sensor_data_retention_days)
+        if start >= end:
+            raise ValidationException("start doit précéder end", "start")
+        return start, end
+
+    async def get_sensor_stats(
+        self, sensor_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None
+    ) -> CapteurStats:
+        """
+        Statistiques d'un capteur.
+
+        Sans plage : état cumulé de statistiques_capteurs complété des mesures
+        postérieures au filigrane (au plus une heure environ), en temps
+        constant quelle que soit la longueur de l'historique. Avec une plage,
+        ou tant que le capteur n'a pas encore été cumulé : combinaison des
+        agrégats horaires et des bordures, sur la plage ou à défaut la
+        fenêtre de rétention. ``start``/``end`` indiquent la période couverte
+        (``start`` absent : cumul depuis le début du suivi).
+        """
+        await self.get_sensor(sensor_id)
+        row = self.db.get(StatistiqueCapteur, sensor_id)
+        period = (None, datetime.utcnow())
+        if start is not None or end is not None or row is None or row.filigrane is None:
+            period = self._period(start, end)
+            stats = RollupStore(self.db).stats(sensor_id, *period)
+        else:
+            stats = RunningStats(
+                row.nombre, row.moyenne, row.m2, row.valeur_min, row.valeur_max,
+                row.premiere_mesure, row.derniere_mesure,
+            )
+            tail = recent_readings.query([sensor_id], row.filigrane, None)
+            if tail is None:
+                tail = [sensor_series(self.db, sensor_id, row.filigrane, datetime.max)]
+            for series in tail:
+                stats.merge(series_stats(series))
+        return CapteurStats(
+            nombre_mesures=stats.count,
+            valeur_moyenne=stats.mean if stats.count else None,
+            valeur_min=stats.min,
+            valeur_max=stats.max,
+            ecart_type=stats.std,
+            derniere_mesure=stats.last,
+            premiere_mesure=stats.first,
+            start=period[0],
+            end=period[1],
+        )
+
+    async def get_sensor_percentiles(
+        self, sensor_id: int, start: Optional[datetime], end: Optional[datetime], percentiles: Sequence[float]
+    ) -> CapteurPercentiles:
+        """Percentiles approchés, par fusion des esquisses horaires"""
+        await self.get_sensor(sensor_id)
+        if any(not 0 <= p <= 100 for p in percentiles):
+            raise ValidationException("les percentiles doivent être compris entre 0 et 100", "percentiles")
+        start, end = self._period(start, end)
+        sketch = RollupStore(self.db).sketch(sensor_id, start, end)
+        values = sketch.quantiles([p / 100 for p in percentiles])
+        return CapteurPercentiles(
+            capteur_id=sensor_id, start=start, end=end, nombre_mesures=sketch.count,
+            valeur_min=sketch.min if sketch.count else None,
+            valeur_max=sketch.max if sketch.count else None,
+            percentiles={f"p{p:g}": v for p, v in zip(percentiles, values)},
+            precision_relative=RELATIVE_ACCURACY,
+        )
+
+    async def get_sensor_histogram(
+        self, sensor_id: int, start: Optional[datetime], end: Optional[datetime], bins: int,
+        valeur_min: Optional[float] = None, valeur_max: Optional[float] = None,
+    ) -> CapteurHistogram:
+        """Histogramme à ``bins`` classes égales entre valeur_min et valeur_max (par défaut les extrêmes)"""
+        await self.get_sensor(sensor_id)
+        start, end = self._period(start, end)
+        sketch = RollupStore(self.db).sketch(sensor_id, start, end)
+        if not sketch.count and (valeur_min is None or valeur_max is None):
+            return CapteurHistogram(capteur_id=sensor_id, start=start, end=end, bornes=[], effectifs=[])
+        lo = sketch.min if valeur_min is None else valeur_min
+        hi = sketch.max if valeur_max is None else valeur_max
+        if hi < lo:
+            raise ValidationException("valeur_max doit être supérieure à valeur_min", "valeur_max")
+        edges = np.linspace(lo, hi if hi > lo else lo + 1, bins + 1)
+        return CapteurHistogram(
+            capteur_id=sensor_id, start=start, end=end, nombre_mesures=sketch.count,
+            bornes=edges.tolist(), effectifs=sketch.histogram(edges).tolist(),
+        )
+
+    async def get_sensors_with_last_data(
+        self, espace_id: Optional[int] = None, noeud_id: Optional[int] = None
+    ) -> List[CapteurWithLastData]:
+        """Capteurs avec leur dernière mesure, lue dans le cache (sans requête sur donnees_capteurs)"""
+        query = select(Capteur, NoeudArduino.nom).join(NoeudArduino, NoeudArduino.id == Capteur.noeud_id)
+        if espace_id is not None:
+            query = query.where(NoeudArduino.espace_id == espace_id)
+        if noeud_id is not None:
+            query = query.where(Capteur.noeud_id == noeud_id)
+        rows = self.db.execute(query.order_by(Capteur.id)).all()
+
+        ids = [capteur.id for capteur, _ in rows]
+        try:
+            # Lecture à travers Redis : une seule requête, valeurs des autres instances comprises
+            latest = await last_values.load_from_redis(ids)
+        except RedisError as e:
+            logger.warning(f"Lecture Redis des dernières valeurs impossible: {e}")
+            latest = last_values.get_many(ids)
+
+        sensors = []
+        for capteur, noeud_nom in rows:
+            valeur, horodatage = latest.get(capteur.id, (None, None))
+            sensors.append(CapteurWithLastData(
+                **CapteurResponse.from_orm(capteur).dict(),
+                derniere_valeur=valeur,
+                derniere_mesure=horodatage,
+                noeud_nom=noeud_nom,
+            ))
+        return sensors
+
+    async def resolve_sensor_ids(
+        self,
+        user_id: int,
+        is_admin: bool = False,
+        capteurs_ids: Sequence[int] = (),
+        noeuds_ids: Sequence[int] = (),
+        espaces_ids: Sequence[int] = (),
+    ) -> List[int]:
+        """Capteurs désignés par ids de capteurs, de nœuds ou d'espaces (sous-espaces compris), limités aux espaces accessibles"""
+        if not (capteurs_ids or noeuds_ids or espaces_ids):
+            return []
+        criteria = []
+        if capteurs_ids:
+            criteria.append(Capteur.id.in_(capteurs_ids))
+        if noeuds_ids:
+            criteria.append(Capteur.noeud_id.in_(noeuds_ids))
+        if espaces_ids:
+            criteria.append(NoeudArduino.espace_id.in_(
+                select(EspaceHierarchie.descendant_id).where(EspaceHierarchie.ancetre_id.in_(espaces_ids))
+            ))
+        query = (
+            select(Capteur.id)
+            .join(NoeudArduino, NoeudArduino.id == Capteur.noeud_id)
+            .where(or_(*criteria))
+        )
+        if not is_admin:
+            accessible = aliased(EspaceHierarchie)
+            query = query.where(NoeudArduino.espace_id.in_(
+                select(accessible.descendant_id)
+                .join(EspaceUtilisateur, EspaceUtilisateur.espace_id == accessible.ancetre_id)
+                .where(EspaceUtilisateur.utilisateur_id == user_id)
+            ))
+        return self.db.execute(query.order_by(Capteur.id)).scalars().all()
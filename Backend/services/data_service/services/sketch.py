@@ -0,0 +1,143 @@
+"""
+Esquisses de quantiles (DDSketch)
+
+Chaque valeur est rangée dans un bucket logarithmique
+``ceil(log_gamma(|x|))`` : tout quantile est restitué avec une erreur
+relative d'au plus ``RELATIVE_ACCURACY``. Deux esquisses se fusionnent en
+additionnant les effectifs de leurs buckets, ce qui permet de combiner des
+agrégats horaires sur de longues périodes sans relire les mesures.
+"""
+import struct
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+
+VERSION = 1
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = np.log(GAMMA)
+MIN_INDEXABLE = 1e-9  # valeurs absolues plus petites comptées comme zéro
+
+# version, précision, nombre, somme, min, max, zéros, buckets positifs, buckets négatifs
+HEADER = struct.Struct(">BdQdddQII")
+KEY_DTYPE, COUNT_DTYPE = np.dtype(">i4"), np.dtype(">u8")
+
+
+def _keys(magnitudes: np.ndarray) -> np.ndarray:
+    return np.ceil(np.log(magnitudes) / LOG_GAMMA).astype(np.int64)
+
+
+def _reduce(keys: np.ndarray, counts: np.ndarray):
+    """Additionner les effectifs d'un même bucket, clés triées"""
+    if not len(keys):
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return unique, np.bincount(inverse, weights=counts, minlength=len(unique)).astype(np.int64)
+
+
+class DDSketch:
+    """Esquisse immuable : construite depuis des valeurs ou par fusion"""
+
+    __slots__ = ("pos_keys", "pos_counts", "neg_keys", "neg_counts", "zero_count", "count", "total", "min", "max")
+
+    def __init__(self, pos_keys, pos_counts, neg_keys, neg_counts, zero_count=0, count=0,
+                 total=0.0, vmin=float("inf"), vmax=float("-inf")):
+        self.pos_keys, self.pos_counts = pos_keys, pos_counts
+        self.neg_keys, self.neg_counts = neg_keys, neg_counts
+        self.zero_count, self.count, self.total = int(zero_count), int(count), float(total)
+        self.min, self.max = float(vmin), float(vmax)
+
+    @classmethod
+    def empty(cls) -> "DDSketch":
+        return cls.from_values(np.empty(0))
+
+    @classmethod
+    def from_values(cls, values: np.ndarray) -> "DDSketch":
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        positive = values[values > MIN_INDEXABLE]
+        negative = -values[values < -MIN_INDEXABLE]
+        pos_keys, pos_counts = _reduce(_keys(positive), np.ones(len(positive)))
+        neg_keys, neg_counts = _reduce(_keys(negative), np.ones(len(negative)))
+        if not len(values):
+            return cls(pos_keys, pos_counts, neg_keys, neg_counts)
+        return cls(
+            pos_keys, pos_counts, neg_keys, neg_counts,
+            len(values) - len(positive) - len(negative), len(values),
+            values.sum(), values.min(), values.max(),
+        )
+
+    @classmethod
+    def merged(cls, sketches: Iterable["DDSketch"]) -> "DDSketch":
+        """Fusionner un ensemble d'esquisses en une seule passe vectorisée"""
+        sketches = [s for s in sketches if s.count]
+        if not sketches:
+            return cls.empty()
+        pos = _reduce(
+            np.concatenate([s.pos_keys for s in sketches]), np.concatenate([s.pos_counts for s in sketches])
+        )
+        neg = _reduce(
+            np.concatenate([s.neg_keys for s in sketches]), np.concatenate([s.neg_counts for s in sketches])
+        )
+        return cls(
+            *pos, *neg,
+            sum(s.zero_count for s in sketches), sum(s.count for s in sketches),
+            sum(s.total for s in sketches), min(s.min for s in sketches), max(s.max for s in sketches),
+        )
+
+    def _distribution(self):
+        """Valeurs représentatives des buckets, croissantes, et leurs effectifs"""
+        neg = -2 * GAMMA ** self.neg_keys[::-1].astype(np.float64) / (GAMMA + 1)
+        pos = 2 * GAMMA ** self.pos_keys.astype(np.float64) / (GAMMA + 1)
+        values = np.concatenate((neg, [0.0] if self.zero_count else [], pos))
+        counts = np.concatenate((self.neg_counts[::-1], [self.zero_count] if self.zero_count else [], self.pos_counts))
+        return values, counts
+
+    def quantiles(self, qs: Sequence[float]) -> List[Optional[float]]:
+        """Quantiles ``qs`` (entre 0 et 1), None si l'esquisse est vide"""
+        if not self.count:
+            return [None] * len(qs)
+        values, counts = self._distribution()
+        cumulative = np.cumsum(counts)
+        ranks = np.asarray(qs, dtype=np.float64) * (self.count - 1)
+        idx = np.minimum(np.searchsorted(cumulative, ranks, side="right"), len(values) - 1)
+        result = np.clip(values[idx], self.min, self.max)
+        # Extrêmes exacts
+        result[ranks <= 0] = self.min
+        result[ranks >= self.count - 1] = self.max
+        return result.tolist()
+
+    def histogram(self, edges: np.ndarray) -> np.ndarray:
+        """Effectifs approchés entre des bornes croissantes"""
+        if not self.count:
+            return np.zeros(len(edges) - 1, dtype=np.int64)
+        values, counts = self._distribution()
+        # Les valeurs représentatives peuvent déborder de [min, max] de alpha
+        values = np.clip(values, self.min, self.max)
+        return np.histogram(values, bins=edges, weights=counts)[0].astype(np.int64)
+
+    def to_bytes(self) -> bytes:
+        header = HEADER.pack(
+            VERSION, RELATIVE_ACCURACY, self.count, self.total, self.min, self.max,
+            self.zero_count, len(self.pos_keys), len(self.neg_keys),
+        )
+        return b"".join((
+            header,
+            self.pos_keys.astype(KEY_DTYPE).tobytes(), self.pos_counts.astype(COUNT_DTYPE).tobytes(),
+            self.neg_keys.astype(KEY_DTYPE).tobytes(), self.neg_counts.astype(COUNT_DTYPE).tobytes(),
+        ))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "DDSketch":
+        version, accuracy, count, total, vmin, vmax, zeros, npos, nneg = HEADER.unpack_from(data)
+        if version != VERSION or accuracy != RELATIVE_ACCURACY:
+            raise ValueError(f"Esquisse incompatible: version {version}, précision {accuracy}")
+        offset = HEADER.size
+        arrays = []
+        for n in (npos, nneg):
+            keys = np.frombuffer(data, KEY_DTYPE, n, offset).astype(np.int64)
+            offset += n * KEY_DTYPE.itemsize
+            counts = np.frombuffer(data, COUNT_DTYPE, n, offset).astype(np.int64)
+            offset += n * COUNT_DTYPE.itemsize
+            arrays.extend((keys, counts))
+        return cls(*arrays, zeros, count, total, vmin, vmax)
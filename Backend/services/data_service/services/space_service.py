@@ -1,19 +1,85 @@
 """Service de gestion des espaces"""
+from typing import Dict, List, Optional
+from sqlalchemy import delete, func, insert, literal
+from sqlalchemy.orm import aliased
 from sqlmodel import Session, select
-from shared.models.space import Espace
-from shared.schemas.space import EspaceCreate, EspaceUpdate
-from shared.utils.exceptions import ResourceNotFoundException
+from shared.models.space import Espace, EspaceHierarchie, EspaceUtilisateur
+from shared.schemas.space import (
+    EspaceCreate,
+    EspaceListResponse,
+    EspaceResponse,
+    EspaceTree,
+    EspaceUpdate,
+    EspaceWithHierarchy,
+    EspaceWithStats,
+)
+from shared.utils.exceptions import AuthorizationException, ResourceNotFoundException, SpaceHierarchyException
+from shared.utils.space_counters import (
+    delete_space_counters,
+    get_space_counters,
+    init_space_counters,
+    move_space_counters,
+)
 
 class SpaceService:
     def __init__(self, db: Session):
         self.db = db
     
-    async def get_user_spaces(self, user_id: int):
-        return self.db.execute(select(Espace)).scalars().all()
+    async def get_user_spaces(
+        self, user_id: int, is_admin: bool = False, after: Optional[int] = None, per_page: int = 50
+    ) -> EspaceListResponse:
+        """
+        Espaces accessibles à un utilisateur, par pagination sur curseur (id).
+
+        Un membre d'un espace voit aussi tous ses descendants ; la résolution
+        part de ses appartenances (index (utilisateur_id, espace_id)) puis de
+        la table de fermeture, le coût dépend donc de ses espaces seulement.
+        """
+        query = select(Espace)
+        count_query = select(func.count()).select_from(Espace)
+        if not is_admin:
+            accessible = (
+                select(EspaceHierarchie.descendant_id)
+                .join(EspaceUtilisateur, EspaceUtilisateur.espace_id == EspaceHierarchie.ancetre_id)
+                .where(EspaceUtilisateur.utilisateur_id == user_id)
+            )
+            query = query.where(Espace.id.in_(accessible))
+            count_query = count_query.where(Espace.id.in_(accessible))
+        if after is not None:
+            query = query.where(Espace.id > after)
+
+        spaces = self.db.execute(query.order_by(Espace.id).limit(per_page + 1)).scalars().all()
+        has_next = len(spaces) > per_page
+        spaces = spaces[:per_page]
+
+        return EspaceListResponse(
+            espaces=[EspaceResponse.from_orm(space) for space in spaces],
+            total=self.db.execute(count_query).scalar_one(),
+            per_page=per_page,
+            next_cursor=spaces[-1].id if has_next else None,
+        )
     
+    async def check_access(self, space_id: int, user_id: int, is_admin: bool = False):
+        """Un espace est accessible à un administrateur ou au membre de l'un de ses ancêtres (lui compris)"""
+        if is_admin:
+            return
+        member = self.db.execute(
+            select(EspaceHierarchie.ancetre_id)
+            .join(EspaceUtilisateur, EspaceUtilisateur.espace_id == EspaceHierarchie.ancetre_id)
+            .where(EspaceHierarchie.descendant_id == space_id, EspaceUtilisateur.utilisateur_id == user_id)
+            .limit(1)
+        ).first()
+        if member is None:
+            raise AuthorizationException("Accès à cet espace refusé")
+
     async def create_space(self, space_data: EspaceCreate, user_id: int):
+        if space_data.espace_parent_id is not None and not self.db.get(Espace, space_data.espace_parent_id):
+            raise ResourceNotFoundException("Espace", space_data.espace_parent_id)
         space = Espace(**space_data.dict())
         self.db.add(space)
+        self.db.flush()
+        self._link_to_parent(space.id, space.espace_parent_id)
+        init_space_counters(self.db, space.id)
         self.db.commit()
         self.db.refresh(space)
         return space
@@ -26,14 +92,147 @@ class SpaceService:
     
     async def update_space(self, space_id: int, space_data: EspaceUpdate, user_id: int):
         space = await self.get_space(space_id, user_id)
-        for field, value in space_data.dict(exclude_unset=True).items():
+        update_data = space_data.dict(exclude_unset=True)
+        old_parent_id = space.espace_parent_id
+        new_parent_id = update_data.get("espace_parent_id", old_parent_id)
+        move = new_parent_id != old_parent_id
+        if move and new_parent_id is not None:
+            if not self.db.get(Espace, new_parent_id):
+                raise ResourceNotFoundException("Espace", new_parent_id)
+            if new_parent_id in self._subtree_ids(space_id):
+                raise SpaceHierarchyException("un espace ne peut pas être déplacé sous l'un de ses descendants")
+        for field, value in update_data.items():
             setattr(space, field, value)
+        if move:
+            move_space_counters(self.db, space_id, old_parent_id, new_parent_id)
+            self._move_subtree(space_id, new_parent_id)
         self.db.commit()
         self.db.refresh(space)
         return space
     
     async def delete_space(self, space_id: int, user_id: int):
         space = await self.get_space(space_id, user_id)
+        if len(self._subtree_ids(space_id)) > 1:
+            raise SpaceHierarchyException("supprimez d'abord les sous-espaces")
+        delete_space_counters(self.db, space_id, space.espace_parent_id)
+        self.db.execute(delete(EspaceHierarchie).where(EspaceHierarchie.descendant_id == space_id))
         self.db.delete(space)
         self.db.commit()
         return {"message": "Espace supprimé"}
+
+    async def get_space_stats(self, space_id: int, user_id: int) -> EspaceWithStats:
+        """Espace avec les totaux de son sous-arbre, lus dans compteurs_espaces"""
+        space = await self.get_space(space_id, user_id)
+        noeuds, capteurs, alertes = get_space_counters(self.db, space_id)
+        return EspaceWithStats(
+            **EspaceResponse.from_orm(space).dict(),
+            nombre_noeuds=noeuds,
+            nombre_capteurs=capteurs,
+            nombre_alertes_actives=alertes,
+        )
+
+    # Hiérarchie (table de fermeture espaces_hierarchie)
+
+    def _link_to_parent(self, space_id: int, parent_id: Optional[int]):
+        """Créer les liens d'un nouvel espace : lui-même et les ancêtres de son parent"""
+        self.db.execute(insert(EspaceHierarchie).values(ancetre_id=space_id, descendant_id=space_id, profondeur=0))
+        if parent_id is not None:
+            self.db.execute(insert(EspaceHierarchie).from_select(
+                ["ancetre_id", "descendant_id", "profondeur"],
+                select(EspaceHierarchie.ancetre_id, literal(space_id), EspaceHierarchie.profondeur + 1)
+                .where(EspaceHierarchie.descendant_id == parent_id),
+            ))
+
+    def _move_subtree(self, space_id: int, new_parent_id: Optional[int]):
+        """Rattacher le sous-arbre d'un espace à un nouveau parent"""
+        inner = aliased(EspaceHierarchie)
+        subtree = select(inner.descendant_id).where(inner.ancetre_id == space_id)
+        # Supprimer les liens entre les anciens ancêtres et le sous-arbre
+        self.db.execute(delete(EspaceHierarchie).where(
+            EspaceHierarchie.descendant_id.in_(subtree),
+            EspaceHierarchie.ancetre_id.not_in(subtree),
+        ))
+        if new_parent_id is None:
+            return
+        # Produit cartésien ancêtres du nouveau parent × sous-arbre
+        above = aliased(EspaceHierarchie)
+        below = aliased(EspaceHierarchie)
+        self.db.execute(insert(EspaceHierarchie).from_select(
+            ["ancetre_id", "descendant_id", "profondeur"],
+            select(above.ancetre_id, below.descendant_id, above.profondeur + below.profondeur + 1)
+            .select_from(above)
+            .join(below, below.ancetre_id == space_id)
+            .where(above.descendant_id == new_parent_id),
+        ))
+
+    def _subtree_ids(self, space_id: int) -> List[int]:
+        return self.db.execute(
+            select(EspaceHierarchie.descendant_id).where(EspaceHierarchie.ancetre_id == space_id)
+        ).scalars().all()
+
+    async def get_subtree(self, space_id: int, max_depth: Optional[int] = None) -> List[Espace]:
+        """Tous les descendants d'un espace (lui compris), triés par profondeur"""
+        query = (
+            select(Espace)
+            .join(EspaceHierarchie, EspaceHierarchie.descendant_id == Espace.id)
+            .where(EspaceHierarchie.ancetre_id == space_id)
+        )
+        if max_depth is not None:
+            query = query.where(EspaceHierarchie.profondeur <= max_depth)
+        return self.db.execute(query.order_by(EspaceHierarchie.profondeur, Espace.id)).scalars().all()
+
+    async def get_ancestors(self, space_id: int) -> List[Espace]:
+        """Ancêtres d'un espace, de la racine au parent direct"""
+        return self.db.execute(
+            select(Espace)
+            .join(EspaceHierarchie, EspaceHierarchie.ancetre_id == Espace.id)
+            .where(EspaceHierarchie.descendant_id == space_id, EspaceHierarchie.profondeur > 0)
+            .order_by(EspaceHierarchie.profondeur.desc())
+        ).scalars().all()
+
+    async def get_depth(self, space_id: int) -> int:
+        """Niveau d'un espace dans la hiérarchie (0 pour une racine)"""
+        return self.db.execute(
+            select(func.coalesce(func.max(EspaceHierarchie.profondeur), 0))
+            .where(EspaceHierarchie.descendant_id == space_id)
+        ).scalar_one()
+
+    async def get_hierarchy(self, space_id: int, user_id: int) -> EspaceWithHierarchy:
+        """Espace avec son parent, ses enfants directs et son niveau"""
+        space = await self.get_space(space_id, user_id)
+        children = self.db.execute(
+            select(Espace).where(Espace.espace_parent_id == space_id).order_by(Espace.id)
+        ).scalars().all()
+        parent = self.db.get(Espace, space.espace_parent_id) if space.espace_parent_id else None
+        return EspaceWithHierarchy(
+            **EspaceResponse.from_orm(space).dict(),
+            parent=EspaceResponse.from_orm(parent) if parent else None,
+            enfants=[EspaceResponse.from_orm(child) for child in children],
+            niveau=await self.get_depth(space_id),
+        )
+
+    async def get_tree(self, space_id: int, user_id: int) -> EspaceTree:
+        """Arborescence complète sous un espace, en une seule requête"""
+        root_links = aliased(EspaceHierarchie)
+        base_depth = (
+            select(func.coalesce(func.max(root_links.profondeur), 0))
+            .where(root_links.descendant_id == space_id)
+            .scalar_subquery()
+        )
+        rows = self.db.execute(
+            select(Espace, EspaceHierarchie.profondeur + base_depth)
+            .join(EspaceHierarchie, EspaceHierarchie.descendant_id == Espace.id)
+            .where(EspaceHierarchie.ancetre_id == space_id)
+            .order_by(EspaceHierarchie.profondeur, Espace.id)
+        ).all()
+        if not rows:
+            raise ResourceNotFoundException("Espace", space_id)
+
+        nodes: Dict[int, EspaceTree] = {}
+        for space, niveau in rows:
+            node = EspaceTree(**EspaceResponse.from_orm(space).dict(), niveau=niveau)
+            nodes[space.id] = node
+            # Tri par profondeur : le parent est toujours déjà construit
+            if space.id != space_id and space.espace_parent_id in nodes:
+                nodes[space.espace_parent_id].enfants.append(node)
+        return nodes[space_id]
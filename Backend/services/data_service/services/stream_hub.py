@@ -0,0 +1,165 @@
+"""Diffusion en direct des mesures (WebSocket / SSE)"""
+import asyncio
+import json
+import logging
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, Iterable, Optional, Set
+
+from shared.config import get_data_settings
+from shared.database import get_redis
+from shared.models.sensor import DonneesCapteur
+from shared.utils.sharding import slot_channel, space_slot
+from services.data_service.services.last_value_cache import last_values
+from services.data_service.services.recent_readings import recent_readings
+
+settings = get_data_settings()
+logger = logging.getLogger(__name__)
+
+REDIS_CHANNEL = "gardenconnect:readings"
+
+
+class Subscription:
+    """
+    Abonnement d'une connexion à un ensemble de capteurs.
+
+    La file est bornée : quand le client ne suit pas, la mesure la plus
+    ancienne est écartée et comptée dans ``dropped``.
+    """
+
+    def __init__(self, capteurs_ids: Iterable[int], maxsize: int):
+        self.capteurs_ids = frozenset(capteurs_ids)
+        self.queue: Deque[dict] = deque(maxlen=maxsize)
+        self.dropped = 0
+        self._ready = asyncio.Event()
+
+    def push(self, message: dict):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(message)
+        self._ready.set()
+
+    async def get(self, timeout: float) -> Optional[dict]:
+        """Prochaine mesure, ou None si rien n'arrive avant ``timeout``"""
+        if not self.queue:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self.queue.popleft() if self.queue else None
+
+    def wake(self):
+        """Débloquer un lecteur en attente (remplacement d'abonnement)"""
+        self._ready.set()
+
+    def take_dropped(self) -> int:
+        dropped, self.dropped = self.dropped, 0
+        return dropped
+
+
+class StreamHub:
+    """
+    Pub/sub en mémoire indexé par capteur, relayé entre instances par Redis.
+
+    Une mesure ingérée localement est distribuée immédiatement aux abonnés
+    de l'instance puis publiée sur Redis ; les autres instances la
+    distribuent à leurs propres abonnés (l'instance d'origine s'ignore).
+    """
+
+    def __init__(self):
+        self.instance_id = uuid.uuid4().hex
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+
+    def subscribe(self, capteurs_ids: Iterable[int], maxsize: int = None) -> Subscription:
+        subscription = Subscription(capteurs_ids, maxsize or settings.stream_queue_size)
+        for capteur_id in subscription.capteurs_ids:
+            self._subscribers.setdefault(capteur_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for capteur_id in subscription.capteurs_ids:
+            subs = self._subscribers.get(capteur_id)
+            if subs is not None:
+                subs.discard(subscription)
+                if not subs:
+                    del self._subscribers[capteur_id]
+
+    def deliver(self, message: dict):
+        for subscription in self._subscribers.get(message["capteur_id"], ()):
+            subscription.push(message)
+
+    async def publish(self, donnee: DonneesCapteur, espace_id: int):
+        """Diffuser une mesure ingérée par cette instance"""
+        message = {
+            "id": donnee.id,
+            "capteur_id": donnee.capteur_id,
+            "valeur": donnee.valeur,
+            "horodatage": donnee.horodatage.isoformat(),
+            "niveau_batterie": donnee.niveau_batterie,
+        }
+        self.deliver(message)
+        try:
+            redis_conn = await get_redis()
+            async with redis_conn.pipeline(transaction=False) as pipe:
+                pipe.publish(REDIS_CHANNEL, json.dumps({**message, "instance": self.instance_id}))
+                # Canal de la partition de l'espace : lu uniquement par l'instance d'alertes propriétaire
+                pipe.publish(slot_channel(space_slot(espace_id, settings.alert_partitions)), json.dumps(message))
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Publication Redis de la mesure impossible: {e}")
+
+    @staticmethod
+    async def _reload_recent(generation: int):
+        """Charger le tampon des mesures récentes ; les mesures reçues entre-temps sont rejouées"""
+        while True:
+            try:
+                count = await asyncio.to_thread(recent_readings.rewarm, generation)
+                logger.info(f"{count} mesures récentes chargées en mémoire")
+                return
+            except Exception as e:
+                logger.error(f"Chargement des mesures récentes impossible: {e}")
+                await asyncio.sleep(5)
+
+    async def listen(self):
+        """
+        Relayer les mesures publiées par les autres instances (tâche de fond).
+
+        Le tampon des mesures récentes est chargé une fois l'abonnement
+        établi, au démarrage comme après une interruption (des mesures ont pu
+        être manquées) : toute mesure est soit lue en base, soit reçue ici.
+        """
+        reload = None
+        while True:
+            try:
+                redis_conn = await get_redis()
+                async with redis_conn.pubsub() as pubsub:
+                    await pubsub.subscribe(REDIS_CHANNEL)
+                    reload = asyncio.create_task(self._reload_recent(recent_readings.begin_load()))
+                    async for raw in pubsub.listen():
+                        if raw.get("type") != "message":
+                            continue
+                        message = json.loads(raw["data"])
+                        if message.pop("instance", None) == self.instance_id:
+                            continue
+                        horodatage = datetime.fromisoformat(message["horodatage"])
+                        last_values.set(message["capteur_id"], message["valeur"], horodatage)
+                        recent_readings.append(
+                            message["capteur_id"], message["id"], message["valeur"],
+                            horodatage, message["niveau_batterie"],
+                        )
+                        self.deliver(message)
+            except asyncio.CancelledError:
+                if reload is not None:
+                    reload.cancel()
+                raise
+            except Exception as e:
+                logger.error(f"Écoute du canal {REDIS_CHANNEL} interrompue: {e}")
+                if reload is not None:
+                    reload.cancel()
+                recent_readings.invalidate()
+                await asyncio.sleep(5)
+
+
+stream_hub = StreamHub()
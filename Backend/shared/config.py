@@ -52,6 +52,10 @@ class Settings(BaseSettings):
     alert_service_port: int = 8003
     mqtt_service_port: int = 8004
     
+    # Partitions des espaces entre instances du moteur d'alertes (fixe : le
+    # service de données publie chaque mesure sur le canal de sa partition)
+    alert_partitions: int = 256
+    
     # Email (pour les alertes)
     smtp_host: str = "smtp.gmail.com"
     smtp_port: int = 587
@@ -112,19 +116,81 @@ class DataServiceSettings(Settings):
     sensor_data_retention_days: int = 90
     aggregated_data_retention_years: int = 5
     
-    # Export
-    max_export_records: int = 100000
+    # Partitionnement mensuel de donnees_capteurs
+    partition_months_ahead: int = 3
+    partition_maintenance_interval: int = 3600  # en secondes
+    
+    # Export (lecture en flux par lots, None = pas de limite)
+    max_export_records: Optional[int] = None
+    export_chunk_size: int = 10000
+    
+    # Jobs d'export asynchrones
+    export_dir: str = "exports"
+    export_max_concurrent_jobs: int = 2
+    export_disk_quota_mb: int = 2048
+    export_job_max_size_mb: int = 512  # réservé sur le quota à l'acceptation du job
+    export_job_ttl_hours: int = 24
+    
+    # Vérification périodique des compteurs par espace
+    space_counters_reconcile_interval: int = 900  # en secondes
+    
+    # Flux en direct (WebSocket / SSE)
+    stream_queue_size: int = 256  # mesures en attente par connexion
+    stream_heartbeat_interval: int = 15  # en secondes
+    
+    # Tampon mémoire des mesures récentes
+    ring_buffer_window_hours: int = 24
+    ring_buffer_max_points: int = 20000  # par capteur
+    ring_buffer_memory_mb: int = 256
+    
+    # Compactage des mesures anciennes en blocs compressés (stockage froid)
+    compaction_enabled: bool = False
+    compaction_after_days: int = 7
+    compaction_interval: int = 3600  # en secondes
+    block_cache_size: int = 128  # blocs décodés gardés en mémoire
+    
+    # Requêtes multi-capteurs alignées sur une grille commune
+    aligned_max_buckets: int = 100000
+    
+    # Agrégats horaires avec esquisses de quantiles (percentiles, histogrammes)
+    rollup_interval: int = 300  # en secondes
+    rollup_lag_minutes: int = 5  # délai avant de clore une heure
 
 
 class AlertServiceSettings(Settings):
     """Configuration spécifique au service d'alertes"""
     
-    # Fréquence de vérification des alertes (en secondes)
-    alert_check_interval: int = 60
-    
-    # Délai de répétition des notifications (en minutes)
+    # Les mesures sont évaluées à leur arrivée ; rechargement complet des
+    # règles en filet de sécurité (en secondes)
+    alert_rules_reload_interval: int = 300
+    # Fenêtre glissante maximale des règles agrégées (en secondes)
+    alert_max_window: int = 7 * 24 * 3600
+    # Rejeu des règles sur l'historique : période maximale, lue par tranches (en jours)
+    alert_backtest_max_days: int = 366
+    alert_backtest_chunk_days: int = 31
+    # Corrélation : déclenchements d'un espace regroupés en un incident (en secondes),
+    # nœud considéré hors ligne sans mesure depuis alert_node_timeout, écriture des incidents
+    alert_correlation_window: int = 300
+    alert_node_timeout: int = 900
+    alert_incident_interval: int = 30
+    # Répartition entre instances : présence et baux des partitions dans Redis (en secondes)
+    alert_member_heartbeat: int = 10
+    alert_lease_ttl: int = 30
+    # Mesures relues en base à la prise d'une partition, au plus sur cette durée (en secondes)
+    alert_replay_window: int = 900
+    
+    # Délai de répétition des notifications (en minutes, doublé à chaque essai)
     notification_retry_delay: int = 5
     max_notification_retries: int = 3
+    # Envoi : tâches concurrentes, connexions SMTP partagées, taille des lots
+    notification_workers: int = 4
+    notification_smtp_pool_size: int = 2
+    notification_batch_size: int = 100
+    # Email réservé par une instance, remis en envoi sans accusé dans ce délai (en secondes)
+    notification_claim_timeout: int = 300
+    # Alertes d'un même destinataire regroupées en un seul email (en secondes)
+    notification_digest_window: int = 120
+    notification_sender: str = "alertes@gardenconnect.local"
     
     # Templates email
     email_template_dir: str = "templates/email"
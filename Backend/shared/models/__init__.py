@@ -4,10 +4,10 @@ Modèles SQLModel pour GardenConnect
 
 from shared.models.base import BaseModel, TimestampMixin
 from shared.models.user import Utilisateur, Role, TokenRafraichissement
-from shared.models.space import Espace, EspaceUtilisateur
+from shared.models.space import Espace, EspaceUtilisateur, EspaceHierarchie, CompteurEspace
 from shared.models.node import NoeudArduino
-from shared.models.sensor import Capteur, DonneesCapteur
-from shared.models.alert import Alerte, HistoriqueAlerte
+from shared.models.sensor import Capteur, DonneesCapteur, DonneesCapteurBloc, DonneesCapteurRollup, StatistiqueCapteur
+from shared.models.alert import Alerte, ConditionAlerte, HistoriqueAlerte, Incident
 
 __all__ = [
     "BaseModel",
@@ -17,9 +17,16 @@ __all__ = [
     "TokenRafraichissement",
     "Espace",
     "EspaceUtilisateur",
+    "EspaceHierarchie",
+    "CompteurEspace",
     "NoeudArduino",
     "Capteur",
     "DonneesCapteur",
+    "DonneesCapteurBloc",
+    "DonneesCapteurRollup",
+    "StatistiqueCapteur",
     "Alerte",
+    "ConditionAlerte",
     "HistoriqueAlerte",
+    "Incident",
 ]
\ No newline at end of file
@@ -17,11 +17,40 @@ class Alerte(BaseModel, table=True):
     capteur_id: int = Field(foreign_key="capteurs.id", index=True)
     condition: str = Field(max_length=20, index=True)  # lt, lte, eq, gte, gt
     seuil: float = Field(index=True)
+    hysteresis: float = Field(default=0.0)  # écart au seuil requis pour le retour à la normale
+    duree_minimale: int = Field(default=0)  # secondes de dépassement avant déclenchement
+    # Règle sur fenêtre glissante : avg, min, max ou rate (variation par heure)
+    agregation: Optional[str] = Field(default=None, max_length=10)
+    fenetre: Optional[int] = Field(default=None)  # secondes
+    # Combinaison avec les conditions supplémentaires : and, or
+    combinaison: Optional[str] = Field(default=None, max_length=3)
+    # Alerte supprimée (rattachée sans notification) tant que la parente est active
+    alerte_parente_id: Optional[int] = Field(default=None, foreign_key="alertes.id", index=True)
     est_active: bool = Field(default=True, index=True)
     
     # Relations
     capteur: "Capteur" = Relationship(back_populates="alertes")
     historique: List["HistoriqueAlerte"] = Relationship(back_populates="alerte")
+    conditions: List["ConditionAlerte"] = Relationship(
+        back_populates="alerte", sa_relationship_kwargs={"cascade": "all, delete-orphan"}
+    )
+
+
+class ConditionAlerte(SQLModel, table=True):
+    """Condition supplémentaire d'une alerte composite, éventuellement sur un autre capteur"""
+    
+    __tablename__ = "conditions_alertes"
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    alerte_id: int = Field(foreign_key="alertes.id", index=True)
+    capteur_id: int = Field(foreign_key="capteurs.id", index=True)
+    condition: str = Field(max_length=20)  # lt, lte, eq, gte, gt
+    seuil: float
+    agregation: Optional[str] = Field(default=None, max_length=10)
+    fenetre: Optional[int] = Field(default=None)
+    
+    # Relations
+    alerte: "Alerte" = Relationship(back_populates="conditions")
 
 
 class HistoriqueAlerte(SQLModel, table=True):
@@ -35,10 +64,28 @@ class HistoriqueAlerte(SQLModel, table=True):
     resolue_a: Optional[datetime] = Field(default=None, index=True)
     message: Optional[str] = Field(default=None)
     statut: str = Field(max_length=20, default="active", index=True)
+    incident_id: Optional[int] = Field(default=None, foreign_key="incidents.id", index=True)
     
     # Relations
     alerte: "Alerte" = Relationship(back_populates="historique")
 
 
+class Incident(SQLModel, table=True):
+    """Déclenchements corrélés d'un espace, notifiés une seule fois"""
+    
+    __tablename__ = "incidents"
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    espace_id: int = Field(foreign_key="espaces.id", index=True)
+    noeud_id: Optional[int] = Field(default=None, foreign_key="noeuds_arduino.id", index=True)  # nœud hors ligne
+    message: Optional[str] = Field(default=None)
+    debut: datetime = Field(default_factory=datetime.utcnow, index=True)
+    fin: Optional[datetime] = Field(default=None, index=True)
+    derniere_activite: datetime = Field(default_factory=datetime.utcnow)
+    nombre_alertes: int = Field(default=0)
+    nombre_supprimees: int = Field(default=0)  # alertes dépendantes non notifiées
+    statut: str = Field(max_length=20, default="ouvert", index=True)  # ouvert, resolu
+
+
 # Import pour éviter les références circulaires
 from shared.models.sensor import Capteur
\ No newline at end of file
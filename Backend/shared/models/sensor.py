@@ -2,8 +2,9 @@
 Modèles capteurs et données
 """
 
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional, List
+from sqlalchemy import Column, Index, LargeBinary, UniqueConstraint, text
 from sqlmodel import SQLModel, Field, Relationship
 from shared.models.base import BaseModel
 
@@ -34,17 +35,80 @@ class DonneesCapteur(SQLModel, table=True):
     """Modèle des données de capteurs (série temporelle)"""
     
     __tablename__ = "donnees_capteurs"
+    # Un seul index secondaire : toutes les lectures filtrent par capteur et plage de temps
+    __table_args__ = (
+        Index("idx_donnees_capteurs_capteur_horodatage", "capteur_id", text("horodatage DESC")),
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True)
-    capteur_id: int = Field(foreign_key="capteurs.id", index=True)
-    valeur: float = Field(index=True)
-    horodatage: datetime = Field(default_factory=datetime.utcnow, index=True)
+    capteur_id: int = Field(foreign_key="capteurs.id")
+    valeur: float
+    horodatage: datetime = Field(default_factory=datetime.utcnow)
     niveau_batterie: Optional[float] = Field(default=None)
     
     # Relations
     capteur: "Capteur" = Relationship(back_populates="donnees")
 
 
+class DonneesCapteurBloc(SQLModel, table=True):
+    """Mesures compressées d'un capteur sur une journée (stockage froid)"""
+    
+    __tablename__ = "donnees_capteurs_blocs"
+    __table_args__ = (UniqueConstraint("capteur_id", "jour", name="uq_donnees_capteurs_blocs_capteur_jour"),)
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    capteur_id: int = Field(foreign_key="capteurs.id")
+    jour: date
+    debut: datetime
+    fin: datetime
+    nombre: int
+    valeur_min: float
+    valeur_max: float
+    donnees: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    date_creation: datetime = Field(default_factory=datetime.utcnow)
+
+
+class DonneesCapteurRollup(SQLModel, table=True):
+    """Agrégat horaire d'un capteur, avec une esquisse de quantiles fusionnable"""
+    
+    __tablename__ = "donnees_capteurs_rollups"
+    __table_args__ = (UniqueConstraint("capteur_id", "debut", name="uq_donnees_capteurs_rollups_capteur_debut"),)
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    capteur_id: int = Field(foreign_key="capteurs.id")
+    debut: datetime
+    nombre: int
+    somme: float
+    valeur_min: float
+    valeur_max: float
+    m2: float  # somme des carrés des écarts à la moyenne
+    premiere: datetime
+    derniere: datetime
+    sketch: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+
+
+class StatistiqueCapteur(SQLModel, table=True):
+    """
+    Statistiques cumulées d'un capteur (Welford), à jour jusqu'au filigrane.
+
+    Les mesures antérieures à ``filigrane`` sont comptées via les agrégats
+    horaires ; les suivantes sont ajoutées à la lecture.
+    """
+    
+    __tablename__ = "statistiques_capteurs"
+    
+    capteur_id: int = Field(foreign_key="capteurs.id", primary_key=True)
+    nombre: int = Field(default=0)
+    moyenne: float = Field(default=0.0)
+    m2: float = Field(default=0.0)
+    valeur_min: Optional[float] = Field(default=None)
+    valeur_max: Optional[float] = Field(default=None)
+    premiere_mesure: Optional[datetime] = Field(default=None)
+    derniere_mesure: Optional[datetime] = Field(default=None)
+    filigrane: Optional[datetime] = Field(default=None)
+    date_modification: Optional[datetime] = Field(default=None)
+
+
 # Import pour éviter les références circulaires
 from shared.models.node import NoeudArduino
 from shared.models.alert import Alerte
\ No newline at end of file
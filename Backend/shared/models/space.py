@@ -2,7 +2,9 @@
 Modèles espaces et associations
 """
 
+from datetime import datetime
 from typing import Optional, List
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field, Relationship
 from shared.models.base import BaseModel
 
@@ -32,6 +34,14 @@ class EspaceUtilisateur(BaseModel, table=True):
     """Association entre utilisateurs et espaces avec rôles"""
     
     __tablename__ = "espace_utilisateurs"
+    __table_args__ = (
+        # Index couvrant pour les listes d'espaces et contrôles d'accès par utilisateur
+        Index(
+            "idx_espace_utilisateurs_utilisateur_espace",
+            "utilisateur_id", "espace_id",
+            postgresql_include=["role_id"],
+        ),
+    )
     
     utilisateur_id: int = Field(foreign_key="utilisateurs.id", primary_key=True)
     espace_id: int = Field(foreign_key="espaces.id", primary_key=True)
@@ -43,6 +53,28 @@ class EspaceUtilisateur(BaseModel, table=True):
     role: "Role" = Relationship()
 
 
+class EspaceHierarchie(SQLModel, table=True):
+    """Table de fermeture de la hiérarchie des espaces (un lien par couple ancêtre/descendant)"""
+    
+    __tablename__ = "espaces_hierarchie"
+    
+    ancetre_id: int = Field(foreign_key="espaces.id", primary_key=True)
+    descendant_id: int = Field(foreign_key="espaces.id", primary_key=True, index=True)
+    profondeur: int = Field(default=0)
+
+
+class CompteurEspace(SQLModel, table=True):
+    """Compteurs agrégés sur le sous-arbre d'un espace (maintenus à chaque modification)"""
+    
+    __tablename__ = "compteurs_espaces"
+    
+    espace_id: int = Field(foreign_key="espaces.id", primary_key=True)
+    nombre_noeuds: int = Field(default=0)
+    nombre_capteurs: int = Field(default=0)
+    nombre_alertes_actives: int = Field(default=0)
+    date_modification: Optional[datetime] = Field(default=None)
+
+
 # Import pour éviter les références circulaires
 from shared.models.user import Utilisateur, Role
 from shared.models.node import NoeudArduino
\ No newline at end of file
@@ -39,6 +39,7 @@ from shared.schemas.space import (
     EspaceUpdate,
     EspaceResponse,
     EspaceWithHierarchy,
+    EspaceTree,
     EspaceWithStats,
     EspaceUtilisateurCreate,
     EspaceUtilisateurResponse,
@@ -66,6 +67,7 @@ from shared.schemas.sensor import (
     DonneesCapteurWithDetails,
     DataQueryParams,
     DataExportParams,
+    ExportJobResponse,
     CapteurStats,
     DataAggregated,
     CapteurListResponse,
@@ -83,6 +85,8 @@ from shared.schemas.alert import (
     AlerteStats,
     AlerteListResponse,
     HistoriqueListResponse,
+    IncidentResponse,
+    IncidentListResponse,
     AlerteNotification,
     AlerteCheckResult,
 )
@@ -123,6 +127,7 @@ __all__ = [
     "EspaceUpdate",
     "EspaceResponse",
     "EspaceWithHierarchy",
+    "EspaceTree",
     "EspaceWithStats",
     "EspaceUtilisateurCreate",
     "EspaceUtilisateurResponse",
@@ -148,6 +153,7 @@ __all__ = [
     "DonneesCapteurWithDetails",
     "DataQueryParams",
     "DataExportParams",
+    "ExportJobResponse",
     "CapteurStats",
     "DataAggregated",
     "CapteurListResponse",
@@ -164,6 +170,8 @@ __all__ = [
     "AlerteStats",
     "AlerteListResponse",
     "HistoriqueListResponse",
+    "IncidentResponse",
+    "IncidentListResponse",
     "AlerteNotification",
     "AlerteCheckResult",
 ]
\ No newline at end of file
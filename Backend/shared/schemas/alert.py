@@ -7,11 +7,39 @@ from typing import Optional, List
 from pydantic import BaseModel, Field, validator
 
 
-class AlerteBase(BaseModel):
-    """Schéma de base pour les alertes"""
-    nom: str = Field(..., min_length=1, max_length=100)
+class ConditionAlerteBase(BaseModel):
+    """Condition sur un capteur : valeur instantanée ou agrégat sur une fenêtre glissante"""
     condition: str = Field(..., pattern=r'^(lt|lte|eq|gte|gt)$')
     seuil: float
+    agregation: Optional[str] = Field(None, pattern=r'^(avg|min|max|rate)$')
+    fenetre: Optional[int] = Field(None, ge=1)  # secondes
+    
+    @validator('fenetre', always=True)
+    def validate_fenetre(cls, v, values):
+        if (v is None) != (values.get('agregation') is None):
+            raise ValueError('agregation et fenetre doivent être renseignées ensemble')
+        return v
+
+
+class ConditionAlerteCreate(ConditionAlerteBase):
+    """Condition supplémentaire d'une alerte composite"""
+    capteur_id: int
+
+
+class ConditionAlerteResponse(ConditionAlerteCreate):
+    id: int
+    
+    class Config:
+        from_attributes = True
+
+
+class AlerteBase(ConditionAlerteBase):
+    """Schéma de base pour les alertes"""
+    nom: str = Field(..., min_length=1, max_length=100)
+    hysteresis: float = Field(default=0.0, ge=0)
+    duree_minimale: int = Field(default=0, ge=0)
+    combinaison: Optional[str] = Field(None, pattern=r'^(and|or)$')
+    alerte_parente_id: Optional[int] = None  # supprimée tant que la parente est active
     
     @validator('condition')
     def validate_condition(cls, v):
@@ -25,6 +53,7 @@ class AlerteCreate(AlerteBase):
     """Schéma pour créer une alerte"""
     capteur_id: int
     est_active: bool = Field(default=True)
+    conditions: List[ConditionAlerteCreate] = Field(default_factory=list)
 
 
 class AlerteUpdate(BaseModel):
@@ -32,6 +61,13 @@ class AlerteUpdate(BaseModel):
     nom: Optional[str] = Field(None, min_length=1, max_length=100)
     condition: Optional[str] = Field(None, pattern=r'^(lt|lte|eq|gte|gt)$')
     seuil: Optional[float] = None
+    hysteresis: Optional[float] = Field(None, ge=0)
+    duree_minimale: Optional[int] = Field(None, ge=0)
+    agregation: Optional[str] = Field(None, pattern=r'^(avg|min|max|rate)$')
+    fenetre: Optional[int] = Field(None, ge=1)
+    combinaison: Optional[str] = Field(None, pattern=r'^(and|or)$')
+    conditions: Optional[List[ConditionAlerteCreate]] = None  # remplace toutes les conditions
+    alerte_parente_id: Optional[int] = None
     est_active: Optional[bool] = None
 
 
@@ -42,6 +78,7 @@ class AlerteResponse(AlerteBase):
     est_active: bool
     date_creation: datetime
     date_modification: Optional[datetime] = None
+    conditions: List[ConditionAlerteResponse] = []
     
     class Config:
         from_attributes = True
@@ -64,6 +101,7 @@ class HistoriqueAlerteResponse(BaseModel):
     resolue_a: Optional[datetime] = None
     message: Optional[str] = None
     statut: str
+    incident_id: Optional[int] = None
     
     class Config:
         from_attributes = True
@@ -90,15 +128,39 @@ class AlerteStats(BaseModel):
 
 class AlerteListResponse(BaseModel):
     """Schéma de réponse pour les listes d'alertes"""
-    alertes: List[AlerteResponse]
+    alertes: List[AlerteWithDetails]
     total: int
     page: int
     per_page: int
 
 
 class HistoriqueListResponse(BaseModel):
-    """Schéma de réponse pour l'historique des alertes"""
-    historique: List[HistoriqueAlerteResponse]
+    """Historique paginé par curseur, du plus récent au plus ancien (sans comptage total)"""
+    historique: List[HistoriqueAlerteWithDetails]
+    per_page: int
+    next_cursor: Optional[str] = None  # à passer en "after" pour la page suivante
+
+
+class IncidentResponse(BaseModel):
+    """Déclenchements corrélés d'un espace"""
+    id: int
+    espace_id: int
+    noeud_id: Optional[int] = None
+    message: Optional[str] = None
+    debut: datetime
+    fin: Optional[datetime] = None
+    derniere_activite: datetime
+    nombre_alertes: int
+    nombre_supprimees: int
+    statut: str
+    
+    class Config:
+        from_attributes = True
+
+
+class IncidentListResponse(BaseModel):
+    """Schéma de réponse pour les listes d'incidents"""
+    incidents: List[IncidentResponse]
     total: int
     page: int
     per_page: int
@@ -116,6 +178,31 @@ class AlerteNotification(BaseModel):
     message: Optional[str] = None
 
 
+class AlerteBacktestRequest(ConditionAlerteCreate):
+    """Règle à rejouer sur l'historique de son capteur, avant de la créer"""
+    hysteresis: float = Field(default=0.0, ge=0)
+    duree_minimale: int = Field(default=0, ge=0)
+    date_debut: Optional[datetime] = None
+    date_fin: Optional[datetime] = None
+
+
+class IntervalleBacktest(BaseModel):
+    """Déclenchement qu'aurait produit la règle"""
+    declenchee_a: datetime
+    resolue_a: Optional[datetime] = None
+
+
+class AlerteBacktestResponse(BaseModel):
+    """Résultat du rejeu d'une règle (rien n'est écrit dans historique_alertes)"""
+    capteur_id: int
+    date_debut: datetime
+    date_fin: datetime
+    mesures: int
+    declenchements: int
+    duree_active: float  # secondes
+    intervalles: List[IntervalleBacktest]
+
+
 class AlerteCheckResult(BaseModel):
     """Résultat de vérification d'alerte"""
     alerte_id: int
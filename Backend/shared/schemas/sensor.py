@@ -5,6 +5,7 @@ Schémas Pydantic pour les capteurs et données
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 from pydantic import BaseModel, Field, validator
+from shared.schemas.common import ExportResponse
 
 
 class CapteurBase(BaseModel):
@@ -93,6 +94,16 @@ class DataQueryParams(BaseModel):
     offset: int = Field(default=0, ge=0)
     aggregation: Optional[str] = Field(None, pattern=r'^(avg|min|max|sum)$')
     interval: Optional[str] = Field(None, pattern=r'^(1m|5m|15m|1h|1d)$')
+    downsample: Optional[int] = Field(None, ge=3, le=10000)  # points max par capteur
+    downsample_method: str = Field(default="lttb", pattern=r'^(lttb|minmax)$')
+
+
+class DataAlignedParams(DataQueryParams):
+    """Paramètres d'une requête multi-capteurs alignée sur une grille commune"""
+    capteurs_ids: List[int] = Field(..., min_length=1, max_length=50)
+    aggregation: str = Field(default="avg", pattern=r'^(avg|min|max|sum)$')
+    interval: str = Field(default="1h", pattern=r'^(1m|5m|15m|1h|1d)$')
+    fill: str = Field(default="null", pattern=r'^(null|locf|linear)$')
 
 
 class DataExportParams(BaseModel):
@@ -100,22 +111,63 @@ class DataExportParams(BaseModel):
     capteurs_ids: List[int]
     start: datetime
     end: datetime
-    format: str = Field(default="csv", pattern=r'^(csv|json|xlsx)$')
+    format: str = Field(default="csv", pattern=r'^(csv|json|ndjson|parquet|xlsx)$')
     include_metadata: bool = Field(default=True)
 
 
+class ExportJobResponse(BaseModel):
+    """Statut d'un job d'export asynchrone"""
+    job_id: str
+    statut: str  # en_attente, en_cours, termine, erreur
+    format: str
+    progression: float = 0.0
+    lignes_exportees: int = 0
+    lignes_totales: Optional[int] = None
+    cree_a: datetime
+    termine_a: Optional[datetime] = None
+    erreur: Optional[str] = None
+    export: Optional[ExportResponse] = None
+
+
 class CapteurStats(BaseModel):
     """Statistiques d'un capteur"""
     nombre_mesures: int = 0
     valeur_moyenne: Optional[float] = None
     valeur_min: Optional[float] = None
     valeur_max: Optional[float] = None
+    ecart_type: Optional[float] = None
     derniere_mesure: Optional[datetime] = None
     premiere_mesure: Optional[datetime] = None
+    # Période couverte ; start absent : cumul depuis le début du suivi
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+
+
+class CapteurPercentiles(BaseModel):
+    """Percentiles approchés d'un capteur sur une période"""
+    capteur_id: int
+    start: datetime
+    end: datetime
+    nombre_mesures: int = 0
+    valeur_min: Optional[float] = None
+    valeur_max: Optional[float] = None
+    percentiles: Dict[str, Optional[float]]  # {"p5": ..., "p50": ..., "p95": ...}
+    precision_relative: float
+
+
+class CapteurHistogram(BaseModel):
+    """Distribution approchée des valeurs d'un capteur"""
+    capteur_id: int
+    start: datetime
+    end: datetime
+    nombre_mesures: int = 0
+    bornes: List[float]  # len(effectifs) + 1 bornes croissantes
+    effectifs: List[int]
 
 
 class DataAggregated(BaseModel):
     """Données agrégées"""
+    capteur_id: Optional[int] = None
     horodatage: datetime
     valeur_avg: Optional[float] = None
     valeur_min: Optional[float] = None
@@ -124,6 +176,16 @@ class DataAggregated(BaseModel):
     count: int = 0
 
 
+class DataAlignedResponse(BaseModel):
+    """Table large : une ligne par bucket, une colonne par capteur (ordre de capteurs_ids)"""
+    capteurs_ids: List[int]
+    horodatages: List[datetime]
+    valeurs: List[List[Optional[float]]]
+    total: int
+    page: int
+    per_page: int
+
+
 class CapteurListResponse(BaseModel):
     """Schéma de réponse pour les listes de capteurs"""
     capteurs: List[CapteurResponse]
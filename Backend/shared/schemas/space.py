@@ -47,6 +47,12 @@ class EspaceWithHierarchy(EspaceResponse):
     niveau: int = 0
 
 
+class EspaceTree(EspaceResponse):
+    """Arborescence complète sous un espace"""
+    niveau: int = 0
+    enfants: List["EspaceTree"] = []
+
+
 class EspaceWithStats(EspaceResponse):
     """Espace avec statistiques"""
     nombre_noeuds: int = 0
@@ -78,5 +84,6 @@ class EspaceListResponse(BaseModel):
     """Schéma de réponse pour les listes d'espaces"""
     espaces: List[EspaceResponse]
     total: int
-    page: int
-    per_page: int
\ No newline at end of file
+    page: Optional[int] = None
+    per_page: int
+    next_cursor: Optional[int] = None  # id à passer en "after" pour la page suivante
\ No newline at end of file
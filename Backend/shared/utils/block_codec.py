@@ -0,0 +1,184 @@
+"""
+Encodage compressé des séries, décodable en bloc avec NumPy
+
+Un bloc contient les mesures d'un capteur triées par horodatage, colonne
+par colonne :
+
+- horodatages (µs) et ids en delta-de-delta ;
+- valeurs et niveaux de batterie : entiers décimaux (20.1 -> 201 à
+  l'échelle 1) en delta quand la série le permet sans perte, sinon XOR
+  avec la valeur précédente ; les NaN sont un masque d'un bit par mesure.
+
+Les entiers obtenus (zigzag) sont rangés sur une largeur fixe de bits,
+choisie par colonne ; les rares valeurs plus larges (saut, première
+valeur) sont stockées à part avec leur position. Encodage et décodage sont
+des opérations NumPy sur toute la colonne, sans boucle par mesure.
+"""
+import struct
+from typing import Tuple
+
+import numpy as np
+
+VERSION = 2
+HEADER = struct.Struct(">BI")  # version, nombre de mesures
+COLUMN = struct.Struct(">BI")  # largeur en bits, nombre d'exceptions
+MAX_SCALE = 6  # décimales essayées pour les flottants
+XOR_MODE = 0xFF
+
+Block = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+def _zigzag(values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.int64, copy=False)
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+
+def _unzigzag(values: np.ndarray) -> np.ndarray:
+    return ((values >> np.uint64(1)).view(np.int64)) ^ -(values & np.uint64(1)).view(np.int64)
+
+
+def _bit_lengths(values: np.ndarray) -> np.ndarray:
+    """Nombre de bits significatifs de chaque entier (recherche dichotomique, 6 passes)"""
+    lengths = np.zeros(len(values), dtype=np.int64)
+    values = values.copy()
+    for shift in (32, 16, 8, 4, 2, 1):
+        wide = values >= np.uint64(1 << shift)
+        lengths[wide] += shift
+        values[wide] >>= np.uint64(shift)
+    return lengths + (values != 0)
+
+
+def _pack_uints(values: np.ndarray) -> bytes:
+    """
+    Entiers non signés sur la largeur minimisant la taille totale, les valeurs
+    plus larges étant stockées en exceptions (position 32 bits, valeur 64 bits).
+    """
+    lengths = _bit_lengths(values)
+    histogram = np.bincount(lengths, minlength=65)
+    wider = len(values) - np.cumsum(histogram)  # valeurs de plus de w bits, pour w = 0..64
+    costs = np.arange(65) * len(values) + wider * 96
+    width = int(np.argmin(costs))
+    positions = np.flatnonzero(lengths > width).astype(">u4")
+    packed = values.copy()
+    packed[positions] = 0
+    bits = (packed[:, None] >> np.arange(width - 1, -1, -1, dtype=np.uint64)) & np.uint64(1)
+    return b"".join((
+        COLUMN.pack(width, len(positions)),
+        positions.tobytes(),
+        values[positions].astype(">u8").tobytes(),
+        np.packbits(bits.astype(np.uint8)).tobytes(),
+    ))
+
+
+def _unpack_uints(data: bytes, offset: int, count: int) -> Tuple[np.ndarray, int]:
+    width, exceptions = COLUMN.unpack_from(data, offset)
+    offset += COLUMN.size
+    positions = np.frombuffer(data, ">u4", exceptions, offset)
+    offset += 4 * exceptions
+    wide = np.frombuffer(data, ">u8", exceptions, offset)
+    offset += 8 * exceptions
+    nbytes = (count * width + 7) // 8
+    bits = np.unpackbits(np.frombuffer(data, np.uint8, nbytes, offset), count=count * width)
+    offset += nbytes
+    weights = np.uint64(1) << np.arange(width - 1, -1, -1, dtype=np.uint64)
+    values = bits.reshape(count, width).astype(np.uint64) @ weights if width else np.zeros(count, np.uint64)
+    values[positions] = wide
+    return values, offset
+
+
+def _pack_ints(values: np.ndarray, order: int) -> bytes:
+    """Entiers en différences d'ordre ``order`` (arithmétique modulo 2^64, sans perte)"""
+    residuals = np.asarray(values, dtype=np.int64)
+    with np.errstate(over="ignore"):
+        for _ in range(order):
+            residuals = np.diff(residuals, prepend=np.int64(0))
+    return _pack_uints(_zigzag(residuals))
+
+
+def _unpack_ints(data: bytes, offset: int, count: int, order: int) -> Tuple[np.ndarray, int]:
+    residuals, offset = _unpack_uints(data, offset, count)
+    values = _unzigzag(residuals)
+    with np.errstate(over="ignore"):
+        for _ in range(order):
+            values = np.cumsum(values, dtype=np.int64)
+    return values, offset
+
+
+def _pack_floats(values: np.ndarray) -> bytes:
+    values = np.asarray(values, dtype=np.float64)
+    nans = np.isnan(values)
+    parts = [struct.pack(">B", int(nans.any()))]
+    if nans.any():
+        parts.append(np.packbits(nans).tobytes())
+        # Répéter la valeur précédente à la place des NaN : delta nul
+        previous = np.where(nans, 0, np.arange(len(values)))
+        np.maximum.accumulate(previous, out=previous)
+        values = values[previous]
+        values[np.isnan(values)] = 0.0
+    bits = values.view(np.uint64)
+    if np.isfinite(values).all():
+        for scale in range(MAX_SCALE + 1):
+            factor = 10.0 ** scale
+            scaled = np.round(values * factor)
+            if np.abs(scaled).max() < 2 ** 53 and np.array_equal((scaled / factor).view(np.uint64), bits):
+                return b"".join(parts) + struct.pack(">B", scale) + _pack_ints(scaled.astype(np.int64), 1)
+    xor = bits ^ np.concatenate(([np.uint64(0)], bits[:-1]))
+    # Zéros de poids faible communs à tous les XOR non nuls (bit le plus bas : x & -x)
+    nonzero = xor[xor != 0]
+    trailing = int(_bit_lengths(nonzero & (~nonzero + np.uint64(1))).min()) - 1 if len(nonzero) else 0
+    return b"".join(parts) + struct.pack(">BB", XOR_MODE, trailing) + _pack_uints(xor >> np.uint64(trailing))
+
+
+def _unpack_floats(data: bytes, offset: int, count: int) -> Tuple[np.ndarray, int]:
+    has_nans = data[offset]
+    offset += 1
+    nans = None
+    if has_nans:
+        nbytes = (count + 7) // 8
+        nans = np.unpackbits(np.frombuffer(data, np.uint8, nbytes, offset), count=count).astype(bool)
+        offset += nbytes
+    mode = data[offset]
+    offset += 1
+    if mode == XOR_MODE:
+        trailing = data[offset]
+        xor, offset = _unpack_uints(data, offset + 1, count)
+        values = np.bitwise_xor.accumulate(xor << np.uint64(trailing)).view(np.float64)
+    else:
+        scaled, offset = _unpack_ints(data, offset, count, 1)
+        values = scaled.astype(np.float64) / 10.0 ** mode
+    if nans is not None:
+        values[nans] = np.nan
+    return values, offset
+
+
+def encode_block(ts: np.ndarray, values: np.ndarray, ids: np.ndarray, batteries: np.ndarray) -> bytes:
+    """
+    Encoder une série triée par horodatage.
+
+    ``ts`` en microsecondes depuis l'epoch ; ``batteries`` contient NaN pour
+    une mesure sans niveau de batterie.
+    """
+    count = len(ts)
+    if count == 0:
+        return HEADER.pack(VERSION, 0)
+    return b"".join((
+        HEADER.pack(VERSION, count),
+        _pack_ints(ts, 2),
+        _pack_floats(values),
+        _pack_floats(batteries),
+        _pack_ints(ids, 2),
+    ))
+
+
+def decode_block(data: bytes) -> Block:
+    """Décoder un bloc : (horodatages µs, valeurs, ids, niveaux de batterie)"""
+    version, count = HEADER.unpack_from(data)
+    if version != VERSION:
+        raise ValueError(f"Version de bloc inconnue: {version}")
+    if count == 0:
+        return np.empty(0, np.int64), np.empty(0), np.empty(0, np.int64), np.empty(0)
+    ts, offset = _unpack_ints(data, HEADER.size, count, 2)
+    values, offset = _unpack_floats(data, offset, count)
+    batteries, offset = _unpack_floats(data, offset, count)
+    ids, offset = _unpack_ints(data, offset, count, 2)
+    return ts, values, ids, batteries
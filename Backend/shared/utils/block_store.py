@@ -0,0 +1,101 @@
+"""Lecture des mesures compactées en blocs (donnees_capteurs_blocs), seules ou avec les brutes"""
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlmodel import Session, func, select
+
+from shared.config import get_data_settings
+from shared.models.sensor import DonneesCapteur, DonneesCapteurBloc
+from shared.utils.block_codec import Block, decode_block
+from shared.utils.series import Series, merge_series, rows_to_series, to_us
+
+settings = get_data_settings()
+
+# Les blocs ne changent qu'à la fusion de mesures en retard (contenu différent)
+_decode = lru_cache(maxsize=settings.block_cache_size)(decode_block)
+
+
+class BlockStore:
+    """Blocs journaliers d'un ensemble de capteurs, décodés à la demande"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    @staticmethod
+    def _where(query, capteurs_ids: Optional[List[int]], start: datetime, end: Optional[datetime]):
+        # jour d'abord : c'est lui qui est indexé (capteur_id, jour)
+        query = query.where(DonneesCapteurBloc.jour >= start.date(), DonneesCapteurBloc.fin >= start)
+        if end is not None:
+            query = query.where(DonneesCapteurBloc.jour <= end.date(), DonneesCapteurBloc.debut < end)
+        if capteurs_ids:
+            query = query.where(DonneesCapteurBloc.capteur_id.in_(capteurs_ids))
+        return query
+
+    def has_blocks(self, capteurs_ids: Optional[List[int]], start: datetime, end: Optional[datetime]) -> bool:
+        query = self._where(select(DonneesCapteurBloc.id), capteurs_ids, start, end)
+        return self.db.execute(query.limit(1)).first() is not None
+
+    def blocks(
+        self, capteurs_ids: Optional[List[int]], start: datetime, end: Optional[datetime], newest_first: bool = False
+    ) -> List[DonneesCapteurBloc]:
+        query = self._where(select(DonneesCapteurBloc), capteurs_ids, start, end)
+        if newest_first:
+            query = query.order_by(DonneesCapteurBloc.fin.desc(), DonneesCapteurBloc.capteur_id)
+        else:
+            query = query.order_by(DonneesCapteurBloc.capteur_id, DonneesCapteurBloc.jour)
+        return self.db.execute(query).scalars().all()
+
+    @staticmethod
+    def window(bloc: DonneesCapteurBloc, start: datetime, end: Optional[datetime]) -> Block:
+        """Mesures d'un bloc comprises dans ``[start, end)``"""
+        ts, valeurs, ids, batteries = _decode(bloc.donnees)
+        i = int(np.searchsorted(ts, to_us(start), side="left"))
+        j = len(ts) if end is None else int(np.searchsorted(ts, to_us(end), side="left"))
+        return ts[i:j], valeurs[i:j], ids[i:j], batteries[i:j]
+
+    def count(self, capteurs_ids: Optional[List[int]], start: datetime, end: Optional[datetime]) -> int:
+        """Nombre de mesures compactées dans la plage (seuls les blocs en bordure sont décodés)"""
+        inside = DonneesCapteurBloc.debut >= start
+        if end is not None:
+            inside = inside & (DonneesCapteurBloc.fin < end)
+        total = self.db.execute(
+            self._where(select(func.coalesce(func.sum(DonneesCapteurBloc.nombre), 0)), capteurs_ids, start, end)
+            .where(inside)
+        ).scalar_one()
+        edges = self.db.execute(
+            self._where(select(DonneesCapteurBloc), capteurs_ids, start, end).where(~inside)
+        ).scalars().all()
+        return int(total) + sum(len(self.window(bloc, start, end)[0]) for bloc in edges)
+
+    def series(self, capteurs_ids: Optional[List[int]], start: datetime, end: Optional[datetime]) -> List[Series]:
+        """Séries décodées de chaque capteur sur ``[start, end)``, triées par capteur puis temps"""
+        grouped: Dict[int, List[Block]] = {}
+        for bloc in self.blocks(capteurs_ids, start, end):
+            grouped.setdefault(bloc.capteur_id, []).append(self.window(bloc, start, end))
+        return [
+            (capteur_id, *(np.concatenate([part[k] for part in parts]) for k in range(4)))
+            for capteur_id, parts in grouped.items()
+        ]
+
+
+def sensor_series(db: Session, capteur_id: int, start: datetime, end: datetime) -> Optional[Series]:
+    """Mesures d'un capteur sur ``[start, end)``, brutes et compactées"""
+    rows = db.execute(
+        select(
+            DonneesCapteur.id,
+            DonneesCapteur.capteur_id,
+            DonneesCapteur.valeur,
+            DonneesCapteur.horodatage,
+            DonneesCapteur.niveau_batterie,
+        )
+        .where(
+            DonneesCapteur.capteur_id == capteur_id,
+            DonneesCapteur.horodatage >= start,
+            DonneesCapteur.horodatage < end,
+        )
+        .order_by(DonneesCapteur.horodatage)
+    ).all()
+    series = merge_series(rows_to_series(rows), BlockStore(db).series([capteur_id], start, end))
+    return series[0] if series else None
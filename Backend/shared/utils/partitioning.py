@@ -0,0 +1,249 @@
+"""
+Partitionnement natif PostgreSQL de la table des données capteurs
+
+La table ``donnees_capteurs`` est partitionnée par plage mensuelle sur
+``horodatage``. Une partition par défaut recueille les mesures hors plage
+(horloge de nœud déréglée) ; ses lignes sont déplacées dès que la partition
+mensuelle correspondante est créée, ou supprimées une fois hors rétention.
+
+Si TimescaleDB est disponible, la table devient une hypertable à la place.
+"""
+
+import re
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+PARTITIONED_TABLE = "donnees_capteurs"
+DEFAULT_PARTITION = f"{PARTITIONED_TABLE}_defaut"
+LEGACY_TABLE = f"{PARTITIONED_TABLE}_legacy"
+SENSOR_DATA_INDEX = "idx_donnees_capteurs_capteur_horodatage"
+
+_PARTITION_RE = re.compile(rf"^{PARTITIONED_TABLE}_(\d{{4}})_(\d{{2}})$")
+
+
+def month_start(value: datetime | date) -> date:
+    """Premier jour du mois contenant ``value``"""
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    """Ajouter (ou retirer) un nombre de mois à un premier jour de mois"""
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    """Nom de la partition couvrant le mois ``month``"""
+    return f"{PARTITIONED_TABLE}_{month:%Y_%m}"
+
+
+def is_partitioned(conn: Connection) -> bool:
+    """Indiquer si donnees_capteurs est déjà une table partitionnée"""
+    return conn.execute(
+        text("""
+            SELECT 1 FROM pg_partitioned_table pt
+            JOIN pg_class c ON c.oid = pt.partrelid
+            WHERE c.relname = :table
+        """),
+        {"table": PARTITIONED_TABLE},
+    ).first() is not None
+
+
+def has_timescaledb(conn: Connection) -> bool:
+    """Indiquer si l'extension TimescaleDB est installée dans la base"""
+    return conn.execute(
+        text("SELECT 1 FROM pg_extension WHERE extname = 'timescaledb'")
+    ).first() is not None
+
+
+def is_hypertable(conn: Connection) -> bool:
+    """Indiquer si donnees_capteurs est une hypertable TimescaleDB"""
+    if not has_timescaledb(conn):
+        return False
+    return conn.execute(
+        text("SELECT 1 FROM timescaledb_information.hypertables WHERE hypertable_name = :table"),
+        {"table": PARTITIONED_TABLE},
+    ).first() is not None
+
+
+def convert_to_hypertable(conn: Connection) -> bool:
+    """
+    Convertir donnees_capteurs en hypertable TimescaleDB.
+
+    TimescaleDB exige que la clé primaire contienne la colonne de temps :
+    elle devient (id, horodatage), comme pour le partitionnement natif.
+    Retourne False si la table est déjà une hypertable.
+    """
+    if is_hypertable(conn):
+        return False
+    pkey = conn.execute(
+        text("SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:table) AND contype = 'p'"),
+        {"table": PARTITIONED_TABLE},
+    ).scalar()
+    if pkey:
+        conn.execute(text(f'ALTER TABLE {PARTITIONED_TABLE} DROP CONSTRAINT "{pkey}"'))
+    conn.execute(text(f"ALTER TABLE {PARTITIONED_TABLE} ADD PRIMARY KEY (id, horodatage)"))
+    conn.execute(text(f"SELECT create_hypertable('{PARTITIONED_TABLE}', 'horodatage', migrate_data => TRUE)"))
+    return True
+
+
+def list_partitions(conn: Connection) -> List[Tuple[str, date]]:
+    """Lister les partitions mensuelles existantes, triées par mois"""
+    rows = conn.execute(
+        text("""
+            SELECT child.relname FROM pg_inherits i
+            JOIN pg_class parent ON parent.oid = i.inhparent
+            JOIN pg_class child ON child.oid = i.inhrelid
+            WHERE parent.relname = :table
+        """),
+        {"table": PARTITIONED_TABLE},
+    ).scalars().all()
+
+    partitions = []
+    for name in rows:
+        match = _PARTITION_RE.match(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def create_partition(conn: Connection, month: date) -> Optional[str]:
+    """
+    Créer et attacher la partition d'un mois.
+
+    Les lignes de la partition par défaut tombant dans la plage y sont
+    déplacées avant l'ATTACH, sinon PostgreSQL refuserait la partition.
+    Retourne le nom créé, ou None si elle existait déjà.
+    """
+    name = partition_name(month)
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None:
+        return None
+
+    bounds = {"start": datetime.combine(month, datetime.min.time()),
+              "end": datetime.combine(add_months(month, 1), datetime.min.time())}
+
+    conn.execute(text(f'CREATE TABLE "{name}" (LIKE {PARTITIONED_TABLE} INCLUDING DEFAULTS)'))
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": DEFAULT_PARTITION}).scalar():
+        conn.execute(
+            text(f"""
+                INSERT INTO "{name}" SELECT * FROM {DEFAULT_PARTITION}
+                WHERE horodatage >= :start AND horodatage < :end
+            """),
+            bounds,
+        )
+        conn.execute(
+            text(f"DELETE FROM {DEFAULT_PARTITION} WHERE horodatage >= :start AND horodatage < :end"),
+            bounds,
+        )
+    conn.execute(
+        text(f"""
+            ALTER TABLE {PARTITIONED_TABLE} ATTACH PARTITION "{name}"
+            FOR VALUES FROM ('{bounds["start"].isoformat()}') TO ('{bounds["end"].isoformat()}')
+        """)
+    )
+    return name
+
+
+def ensure_future_partitions(conn: Connection, now: datetime, months_ahead: int) -> List[str]:
+    """Créer les partitions du mois courant et des ``months_ahead`` mois suivants"""
+    current = month_start(now)
+    created = []
+    for offset in range(months_ahead + 1):
+        name = create_partition(conn, add_months(current, offset))
+        if name:
+            created.append(name)
+    return created
+
+
+def drop_expired_partitions(conn: Connection, now: datetime, retention_days: int) -> List[str]:
+    """
+    Détacher puis supprimer les partitions entièrement hors rétention.
+
+    Une partition n'est supprimée que si sa borne haute est antérieure à la
+    limite de rétention : aucune mesure encore conservée n'est perdue.
+    """
+    cutoff = (now - timedelta(days=retention_days)).date()
+    dropped = []
+    for name, month in list_partitions(conn):
+        if add_months(month, 1) > cutoff:
+            break
+        conn.execute(text(f'ALTER TABLE {PARTITIONED_TABLE} DETACH PARTITION "{name}"'))
+        conn.execute(text(f'DROP TABLE "{name}"'))
+        dropped.append(name)
+    return dropped
+
+
+def prune_default_partition(conn: Connection, now: datetime, retention_days: int) -> int:
+    """
+    Supprimer les mesures hors rétention de la partition par défaut.
+
+    Les mesures hors plage qui n'ont jamais rejoint de partition mensuelle
+    y resteraient indéfiniment. Retourne le nombre de lignes supprimées.
+    """
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": DEFAULT_PARTITION}).scalar() is None:
+        return 0
+    return conn.execute(
+        text(f"DELETE FROM {DEFAULT_PARTITION} WHERE horodatage < :cutoff"),
+        {"cutoff": now - timedelta(days=retention_days)},
+    ).rowcount
+
+
+def convert_to_partitioned(conn: Connection, now: datetime, months_ahead: int) -> List[str]:
+    """
+    Convertir une table donnees_capteurs classique en table partitionnée.
+
+    La table existante est renommée, la table parente est recréée avec la même
+    structure, les partitions couvrant l'historique sont créées, puis les
+    lignes sont recopiées (identifiants conservés) avant suppression de
+    l'ancienne table. À exécuter dans une transaction.
+    """
+    if is_partitioned(conn):
+        return []
+
+    conn.execute(text(f"ALTER TABLE {PARTITIONED_TABLE} RENAME TO {LEGACY_TABLE}"))
+    for index_name in conn.execute(
+        text("SELECT indexname FROM pg_indexes WHERE tablename = :table"),
+        {"table": LEGACY_TABLE},
+    ).scalars().all():
+        conn.execute(text(f'ALTER INDEX "{index_name}" RENAME TO "{index_name}_legacy"'))
+
+    conn.execute(text(f"""
+        CREATE TABLE {PARTITIONED_TABLE} (LIKE {LEGACY_TABLE} INCLUDING DEFAULTS)
+        PARTITION BY RANGE (horodatage)
+    """))
+    conn.execute(text(f"ALTER TABLE {PARTITIONED_TABLE} ALTER COLUMN horodatage SET NOT NULL"))
+    conn.execute(text(f"ALTER TABLE {PARTITIONED_TABLE} ADD PRIMARY KEY (id, horodatage)"))
+    conn.execute(text(f"""
+        ALTER TABLE {PARTITIONED_TABLE}
+        ADD FOREIGN KEY (capteur_id) REFERENCES capteurs (id)
+    """))
+
+    # La séquence de l'id doit survivre à la suppression de l'ancienne table
+    sequence = conn.execute(
+        text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": LEGACY_TABLE}
+    ).scalar()
+    if sequence:
+        conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {PARTITIONED_TABLE}.id"))
+
+    conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {PARTITIONED_TABLE} DEFAULT"))
+
+    oldest = conn.execute(text(f"SELECT min(horodatage) FROM {LEGACY_TABLE}")).scalar()
+    month = month_start(oldest or now)
+    created = []
+    while month <= add_months(month_start(now), months_ahead):
+        name = create_partition(conn, month)
+        if name:
+            created.append(name)
+        month = add_months(month, 1)
+
+    conn.execute(text(f"INSERT INTO {PARTITIONED_TABLE} SELECT * FROM {LEGACY_TABLE}"))
+    conn.execute(text(f"DROP TABLE {LEGACY_TABLE}"))
+
+    # Seul index secondaire : chaque index en plus est payé à chaque ingestion
+    conn.execute(text(f"""
+        CREATE INDEX {SENSOR_DATA_INDEX} ON {PARTITIONED_TABLE} (capteur_id, horodatage DESC)
+    """))
+    return created
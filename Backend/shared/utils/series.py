@@ -0,0 +1,55 @@
+"""
+Séries de mesures en colonnes NumPy, partagées entre les services
+
+Horodatages naïfs (UTC) convertis en microsecondes depuis l'epoch.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1)
+
+# (capteur_id, horodatages en µs, valeurs, ids, niveaux de batterie)
+Series = Tuple[int, np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+def to_us(horodatage: datetime) -> int:
+    """Horodatage naïf (UTC) en microsecondes depuis l'epoch"""
+    return (horodatage - EPOCH) // timedelta(microseconds=1)
+
+
+def from_us(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=int(value))
+
+
+def rows_to_series(rows: Sequence[tuple]) -> List[Series]:
+    """Lignes (id, capteur_id, valeur, horodatage, batterie) triées par capteur en séries"""
+    if not rows:
+        return []
+    ids, capteurs, valeurs, horodatages, batteries = zip(*rows)
+    capteurs = np.asarray(capteurs, dtype=np.int64)
+    ts = np.asarray(horodatages, dtype="datetime64[us]").astype(np.int64)
+    valeurs = np.asarray(valeurs, dtype=np.float64)
+    ids = np.asarray(ids, dtype=np.int64)
+    batteries = np.asarray([np.nan if b is None else b for b in batteries], dtype=np.float64)
+    boundaries = np.concatenate(([0], np.flatnonzero(np.diff(capteurs)) + 1, [len(capteurs)]))
+    return [
+        (int(capteurs[lo]), ts[lo:hi], valeurs[lo:hi], ids[lo:hi], batteries[lo:hi])
+        for lo, hi in zip(boundaries[:-1], boundaries[1:])
+    ]
+
+
+def merge_series(*groups: List[Series]) -> List[Series]:
+    """Fusionner des séries par capteur, triées par (horodatage, id)"""
+    parts: Dict[int, List[Series]] = {}
+    for group in groups:
+        for series in group:
+            parts.setdefault(series[0], []).append(series)
+    merged = []
+    for capteur_id in sorted(parts):
+        ts, valeurs, ids, batteries = (np.concatenate([s[k] for s in parts[capteur_id]]) for k in range(1, 5))
+        order = np.lexsort((ids, ts))
+        merged.append((capteur_id, ts[order], valeurs[order], ids[order], batteries[order]))
+    return merged
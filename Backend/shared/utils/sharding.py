@@ -0,0 +1,43 @@
+"""
+Répartition des espaces entre les instances du moteur d'alertes
+
+Un espace et tous ses capteurs tombent dans la même partition : les
+incidents d'un espace et la suppression par une alerte parente du même
+espace restent ainsi locaux à une instance.
+"""
+
+import hashlib
+from functools import lru_cache
+from typing import Dict, Iterable, Set
+
+# Mesures d'une partition, publiées par le service de données
+ALERT_READINGS_PREFIX = "gardenconnect:alertes:mesures:"
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+@lru_cache(maxsize=None)
+def space_slot(espace_id: int, partitions: int) -> int:
+    """Partition fixe d'un espace, indépendante du nombre d'instances"""
+    return _hash(str(espace_id)) % partitions
+
+
+def slot_channel(slot: int) -> str:
+    return f"{ALERT_READINGS_PREFIX}{slot}"
+
+
+def assign_slots(members: Iterable[str], partitions: int) -> Dict[str, Set[int]]:
+    """
+    Hachage de rendez-vous : chaque partition revient au membre de plus fort
+    poids pour elle. À l'arrivée ou au départ d'un membre, seules les
+    partitions qu'il prend ou libère changent de propriétaire.
+    """
+    members = sorted(set(members))
+    owners: Dict[str, Set[int]] = {member: set() for member in members}
+    if not members:
+        return owners
+    for slot in range(partitions):
+        owners[max(members, key=lambda member: _hash(f"{member}:{slot}"))].add(slot)
+    return owners
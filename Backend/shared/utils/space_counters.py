@@ -0,0 +1,189 @@
+"""
+Compteurs par espace (nœuds, capteurs, alertes actives)
+
+Chaque ligne de ``compteurs_espaces`` contient les totaux du sous-arbre de
+l'espace. Les écritures appliquent un delta à l'espace concerné et à tous ses
+ancêtres (table de fermeture) dans la transaction de la modification ; un
+vérificateur périodique recalcule les totaux pour corriger toute dérive.
+"""
+
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import delete, insert, text, update
+from sqlmodel import Session, func, select
+
+from shared.models.alert import Alerte
+from shared.models.node import NoeudArduino
+from shared.models.sensor import Capteur
+from shared.models.space import CompteurEspace, Espace, EspaceHierarchie
+
+Counts = Tuple[int, int, int]
+
+# Verrou consultatif PostgreSQL réservant la vérification à une seule instance
+RECONCILE_LOCK_KEY = 0x47430033
+
+
+def init_space_counters(db: Session, espace_id: int):
+    """Créer la ligne de compteurs (à zéro) d'un nouvel espace"""
+    db.execute(insert(CompteurEspace).values(espace_id=espace_id, date_modification=datetime.utcnow()))
+
+
+def apply_counter_delta(
+    db: Session, espace_id: Optional[int], noeuds: int = 0, capteurs: int = 0, alertes_actives: int = 0
+):
+    """Appliquer un delta à un espace et à tous ses ancêtres"""
+    if espace_id is None or not (noeuds or capteurs or alertes_actives):
+        return
+    ancestors = select(EspaceHierarchie.ancetre_id).where(EspaceHierarchie.descendant_id == espace_id)
+    db.execute(
+        update(CompteurEspace)
+        .where(CompteurEspace.espace_id.in_(ancestors))
+        .values(
+            nombre_noeuds=CompteurEspace.nombre_noeuds + noeuds,
+            nombre_capteurs=CompteurEspace.nombre_capteurs + capteurs,
+            nombre_alertes_actives=CompteurEspace.nombre_alertes_actives + alertes_actives,
+            date_modification=datetime.utcnow(),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def get_space_counters(db: Session, espace_id: int) -> Counts:
+    """Lire les compteurs d'un espace (lecture d'une seule ligne)"""
+    counters = db.get(CompteurEspace, espace_id)
+    if counters is None:
+        return 0, 0, 0
+    return counters.nombre_noeuds, counters.nombre_capteurs, counters.nombre_alertes_actives
+
+
+def move_space_counters(db: Session, espace_id: int, old_parent_id: Optional[int], new_parent_id: Optional[int]):
+    """Reporter les totaux d'un sous-arbre déplacé de l'ancien parent vers le nouveau"""
+    noeuds, capteurs, alertes = get_space_counters(db, espace_id)
+    apply_counter_delta(db, old_parent_id, -noeuds, -capteurs, -alertes)
+    apply_counter_delta(db, new_parent_id, noeuds, capteurs, alertes)
+
+
+def delete_space_counters(db: Session, espace_id: int, parent_id: Optional[int]):
+    """Retirer les totaux d'un espace supprimé de ses ancêtres et supprimer sa ligne"""
+    noeuds, capteurs, alertes = get_space_counters(db, espace_id)
+    apply_counter_delta(db, parent_id, -noeuds, -capteurs, -alertes)
+    db.execute(delete(CompteurEspace).where(CompteurEspace.espace_id == espace_id))
+
+
+def node_counts(db: Session, noeud_id: int) -> Counts:
+    """Contribution d'un nœud aux compteurs : lui-même, ses capteurs et leurs alertes actives"""
+    capteurs = db.execute(
+        select(func.count()).select_from(Capteur).where(Capteur.noeud_id == noeud_id)
+    ).scalar_one()
+    alertes = db.execute(
+        select(func.count()).select_from(Alerte)
+        .join(Capteur, Capteur.id == Alerte.capteur_id)
+        .where(Capteur.noeud_id == noeud_id, Alerte.est_active == True)
+    ).scalar_one()
+    return 1, capteurs, alertes
+
+
+def sensor_space_id(db: Session, capteur_id: int) -> Optional[int]:
+    """Espace d'un capteur (via son nœud)"""
+    return db.execute(
+        select(NoeudArduino.espace_id)
+        .join(Capteur, Capteur.noeud_id == NoeudArduino.id)
+        .where(Capteur.id == capteur_id)
+    ).scalar_one_or_none()
+
+
+def compute_space_counters(db: Session) -> Dict[int, Counts]:
+    """Recalculer tous les totaux par sous-arbre à partir des tables sources"""
+    counts: Dict[int, list] = {
+        espace_id: [0, 0, 0] for espace_id in db.execute(select(Espace.id)).scalars().all()
+    }
+    base = select(EspaceHierarchie.ancetre_id, func.count()).join(
+        NoeudArduino, NoeudArduino.espace_id == EspaceHierarchie.descendant_id
+    )
+    queries = [
+        base,
+        base.join(Capteur, Capteur.noeud_id == NoeudArduino.id),
+        base.join(Capteur, Capteur.noeud_id == NoeudArduino.id)
+        .join(Alerte, Alerte.capteur_id == Capteur.id)
+        .where(Alerte.est_active == True),
+    ]
+    for position, query in enumerate(queries):
+        for espace_id, total in db.execute(query.group_by(EspaceHierarchie.ancetre_id)).all():
+            if espace_id in counts:
+                counts[espace_id][position] = total
+    return {espace_id: tuple(values) for espace_id, values in counts.items()}
+
+
+@contextmanager
+def _reconcile_lock(db: Session):
+    """Verrou consultatif de session, tenu sur une connexion dédiée (sans effet hors PostgreSQL)"""
+    engine = db.get_bind()
+    if engine.dialect.name != "postgresql":
+        yield True
+        return
+    with engine.connect() as conn:
+        acquired = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": RECONCILE_LOCK_KEY}).scalar()
+        conn.commit()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": RECONCILE_LOCK_KEY})
+                conn.commit()
+
+
+def reconcile_space_counters(db: Session) -> int:
+    """
+    Corriger les compteurs divergents, retourne le nombre d'espaces corrigés.
+
+    Totaux attendus et stockés sont lus dans un même instantané (REPEATABLE
+    READ), puis l'écart est appliqué en delta : les deltas écrits entre-temps
+    par l'ingestion ou le CRUD ne sont pas écrasés. Si une autre instance
+    vérifie déjà, le passage est sauté.
+    """
+    with _reconcile_lock(db) as acquired:
+        if not acquired:
+            return 0
+        if db.get_bind().dialect.name == "postgresql":
+            db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        expected = compute_space_counters(db)
+        stored = {
+            espace_id: (noeuds, capteurs, alertes)
+            for espace_id, noeuds, capteurs, alertes in db.execute(select(
+                CompteurEspace.espace_id, CompteurEspace.nombre_noeuds,
+                CompteurEspace.nombre_capteurs, CompteurEspace.nombre_alertes_actives,
+            )).all()
+        }
+        db.commit()  # fin de l'instantané de lecture
+
+        corrected = 0
+        now = datetime.utcnow()
+        for espace_id, (noeuds, capteurs, alertes) in expected.items():
+            current = stored.pop(espace_id, None)
+            if current is None:
+                db.add(CompteurEspace(
+                    espace_id=espace_id, nombre_noeuds=noeuds, nombre_capteurs=capteurs,
+                    nombre_alertes_actives=alertes, date_modification=now,
+                ))
+            elif current != (noeuds, capteurs, alertes):
+                db.execute(
+                    update(CompteurEspace)
+                    .where(CompteurEspace.espace_id == espace_id)
+                    .values(
+                        nombre_noeuds=CompteurEspace.nombre_noeuds + (noeuds - current[0]),
+                        nombre_capteurs=CompteurEspace.nombre_capteurs + (capteurs - current[1]),
+                        nombre_alertes_actives=CompteurEspace.nombre_alertes_actives + (alertes - current[2]),
+                        date_modification=now,
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+            else:
+                continue
+            corrected += 1
+        if stored:
+            db.execute(delete(CompteurEspace).where(CompteurEspace.espace_id.in_(list(stored))))
+            corrected += len(stored)
+        db.commit()
+        return corrected
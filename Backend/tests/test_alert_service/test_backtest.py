@@ -0,0 +1,43 @@
+"""Tests du rejeu vectorisé des règles"""
+import numpy as np
+from services.alert_service.services.backtest import replay, window_values
+from services.alert_service.services.rule_index import Rule
+from services.alert_service.services.rule_state import ACTIVE, OK_STATE, RESOLVED, step
+from services.alert_service.services.windows import SlidingWindow
+from shared.utils.series import from_us
+
+def _step_by_step(rule, ts, valeurs):
+    state, intervals = OK_STATE, []
+    for t, valeur in zip(ts, valeurs):
+        new = step(rule, state, valeur, from_us(t))
+        if new.etat == ACTIVE and state.etat != ACTIVE:
+            intervals.append([new.depuis, None])
+        elif new.etat == RESOLVED:
+            intervals[-1][1] = from_us(t)
+            new = OK_STATE
+        state = new
+    return intervals
+
+def test_replay_matches_the_state_machine():
+    rng = np.random.default_rng(3)
+    ts = np.cumsum(rng.integers(30, 90, 5000)).astype(np.int64) * 10**6
+    valeurs = np.round(20 + np.cumsum(rng.normal(0, 0.4, len(ts))))
+    for condition, duree in (("gt", 300), ("lte", 300), ("eq", 0)):
+        rule = Rule(1, 1, "r", condition, float(np.median(valeurs)), hysteresis=1.0, duree_minimale=duree)
+        starts, resolved = replay(ts, valeurs, rule.condition, rule.seuil, rule.hysteresis, rule.duree_minimale)
+        expected = _step_by_step(rule, ts, valeurs)
+        assert len(expected) > 3
+        assert [[from_us(ts[s]), from_us(ts[r]) if r >= 0 else None] for s, r in zip(starts, resolved)] == expected
+
+def test_window_values_match_the_sliding_window():
+    rng = np.random.default_rng(5)
+    ts = np.cumsum(rng.integers(10, 120, 400)).astype(np.int64) * 10**6
+    valeurs = rng.normal(20, 5, len(ts))
+    since = int(ts[0])
+    for agregation in ("avg", "min", "max", "rate"):
+        vectorized = window_values(ts, valeurs, agregation, 900, since)
+        window = SlidingWindow(900, from_us(since))
+        for t, valeur, expected in zip(ts, valeurs, vectorized):
+            window.push(from_us(t), valeur)
+            value = window.value(agregation, from_us(t))
+            assert (value is None and np.isnan(expected)) or np.isclose(value, expected)
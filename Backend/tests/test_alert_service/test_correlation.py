@@ -0,0 +1,69 @@
+"""Tests du regroupement des déclenchements en incidents"""
+from datetime import datetime, timedelta
+from services.alert_service.services.correlation import ATTACH, OPEN, SUPPRESS, Correlator
+from services.alert_service.services.rule_index import Rule
+from services.alert_service.services.rule_state import ACTIVE, RuleState
+
+# capteurs 1-3 sur le nœud 10 (espace 1), capteur 4 sur le nœud 20 (espace 2)
+TOPOLOGY = [(1, 10, 1, "serre", "en_ligne"), (2, 10, 1, "serre", "en_ligne"),
+            (3, 10, 1, "serre", "en_ligne"), (4, 20, 2, "verger", "en_ligne")]
+
+def test_storm_opens_a_single_incident_per_space():
+    correlator = Correlator(window=300, node_timeout=900)
+    correlator.load_topology(TOPOLOGY)
+    t0 = datetime(2024, 6, 1, 12)
+    rules = [Rule(i, 1 + i % 3, f"r{i}", "gt", 30.0) for i in range(50)]
+    actions = [correlator.assign(rule, t0 + timedelta(seconds=i), "", {})[0] for i, rule in enumerate(rules)]
+    assert actions.count(OPEN) == 1 and actions.count(ATTACH) == 49
+    assert correlator.assign(Rule(99, 4, "verger", "lt", 2.0), t0, "", {})[0] == OPEN
+    assert len(correlator.drain_created()) == 2
+
+    # L'incident reste ouvert tant qu'une alerte est active, puis pendant la fenêtre
+    incident = correlator.incidents[1]
+    for rule in rules:
+        correlator.release(rule.id, t0 + timedelta(minutes=1))
+    assert correlator.check(t0 + timedelta(minutes=5))[2] == []
+    closed = correlator.check(t0 + timedelta(minutes=7))[2]
+    assert incident in closed and incident.alertes == 50
+    assert correlator.assign(rules[0], t0 + timedelta(minutes=8), "", {})[0] == OPEN
+
+def test_children_suppressed_by_parent_or_offline_node():
+    correlator = Correlator(window=300, node_timeout=900)
+    correlator.load_topology(TOPOLOGY)
+    t0 = datetime(2024, 6, 1, 12)
+    parent = Rule(1, 1, "ventilation", "eq", 0.0)
+    child = Rule(2, 2, "chaud", "gt", 30.0, parent_id=1)
+    assert correlator.assign(parent, t0, "", {})[0] == OPEN
+    states = {1: RuleState(ACTIVE, t0, 7)}
+    assert correlator.assign(child, t0, "", states)[0] == SUPPRESS
+    correlator.release(2, t0)
+    assert correlator.assign(child, t0, "", {})[0] == ATTACH
+
+    # Nœud silencieux au-delà du délai : ses alertes sont supprimées jusqu'à la prochaine mesure
+    correlator.observe(4, t0)
+    correlator.check(t0 + timedelta(minutes=20))
+    assert 20 in correlator.down
+    incident = correlator.incidents[2]
+    assert incident.noeud_id == 20
+    assert correlator.assign(Rule(3, 4, "gel", "lt", 2.0), t0 + timedelta(minutes=21), "", {})[0] == SUPPRESS
+    correlator.observe(4, t0 + timedelta(minutes=22))
+    assert 20 not in correlator.down and not incident.noeuds
+
+def test_correlation_bounded_by_window_since_last_new_member():
+    correlator = Correlator(window=300, node_timeout=900)
+    correlator.load_topology(TOPOLOGY)
+    t0 = datetime(2024, 6, 1, 12)
+    assert correlator.assign(Rule(1, 1, "chaud", "gt", 30.0), t0, "", {})[0] == OPEN
+    assert correlator.assign(Rule(2, 2, "sec", "lt", 20.0), t0 + timedelta(minutes=4), "", {})[0] == ATTACH
+    first = correlator.incidents[1]
+
+    # Alertes toujours actives, mais plus de nouveau membre depuis la fenêtre : nouvel incident
+    assert correlator.assign(Rule(3, 3, "vent", "gt", 50.0), t0 + timedelta(minutes=10), "", {})[0] == OPEN
+    assert correlator.incidents[1] is not first and correlator.superseded == [first]
+    assert correlator.check(t0 + timedelta(minutes=11))[2] == []
+
+    # L'ancien incident est clos une fois ses alertes retombées et la fenêtre écoulée
+    correlator.release(1, t0 + timedelta(minutes=11))
+    correlator.release(2, t0 + timedelta(minutes=11))
+    assert correlator.check(t0 + timedelta(minutes=17))[2] == [first]
+    assert correlator.superseded == [] and correlator.incidents[1].membres == {3}
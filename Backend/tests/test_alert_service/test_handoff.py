@@ -0,0 +1,125 @@
+"""Tests de la reprise des partitions entre instances du moteur d'alertes"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fakeredis import FakeAsyncRedis
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from shared.models.alert import Alerte, HistoriqueAlerte
+from shared.models.node import NoeudArduino
+from shared.models.sensor import Capteur, DonneesCapteur
+from shared.models.space import Espace
+from shared.utils.sharding import assign_slots, space_slot
+from services.alert_service.services import engine as engine_module
+from services.alert_service.services import notifications
+from services.alert_service.services.engine import STATES_KEY, AlertEngine, settings
+from services.alert_service.services.membership import ShardMembership
+from services.alert_service.services.rule_state import ACTIVE, RuleState
+
+@pytest.fixture
+def env(monkeypatch):
+    db_engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(db_engine)
+    redis_conn = FakeAsyncRedis()
+
+    async def get_redis():
+        return redis_conn
+
+    monkeypatch.setattr(engine_module, "SessionLocal", lambda: Session(db_engine))
+    monkeypatch.setattr(engine_module, "get_redis", get_redis)
+    monkeypatch.setattr(notifications, "get_redis", get_redis)
+    return db_engine, redis_conn
+
+def _space_owned_by(member):
+    """Un espace dont la partition revient à ``member`` quand "a" et "b" sont présents"""
+    owners = assign_slots(["a", "b"], settings.alert_partitions)
+    return next(e for e in range(1, 1000) if space_slot(e, settings.alert_partitions) in owners[member])
+
+def _sensor(db, espace_id):
+    db.add(Espace(id=espace_id, nom=f"espace {espace_id}", type="serre"))
+    noeud = NoeudArduino(nom=f"n{espace_id}", espace_id=espace_id, cle_api=f"k{espace_id}", statut="en_ligne")
+    db.add(noeud)
+    db.commit()
+    capteur = Capteur(nom="t", type="temperature_air", modele="DHT22", unite_mesure="°C", noeud_id=noeud.id)
+    db.add(capteur)
+    db.commit()
+    return capteur.id
+
+def _reading(db, capteur_id, valeur, horodatage):
+    donnee = DonneesCapteur(capteur_id=capteur_id, valeur=valeur, horodatage=horodatage)
+    db.add(donnee)
+    db.commit()
+    return donnee.id
+
+def test_readings_published_during_handoff_are_replayed(env):
+    db_engine, redis_conn = env
+    with Session(db_engine) as db:
+        capteur_id = _sensor(db, _space_owned_by("b"))
+        alerte = Alerte(nom="chaud", capteur_id=capteur_id, condition="gt", seuil=30.0)
+        db.add(alerte)
+        db.commit()
+        alerte_id = alerte.id
+    a, b = AlertEngine(), AlertEngine()
+    a.membership, b.membership = ShardMembership("a"), ShardMembership("b")
+    now = datetime.utcnow()
+
+    async def scenario():
+        pubsub_a, pubsub_b = redis_conn.pubsub(), redis_conn.pubsub()
+        await a.load()
+        await b.load()
+        await a.rebalance(redis_conn, pubsub_a)
+        assert len(a.owned) == settings.alert_partitions
+        with Session(db_engine) as db:
+            first = _reading(db, capteur_id, 35.0, now)
+        await a.handle_reading(capteur_id, 35.0, now, first)
+        assert a._states[alerte_id].etat == ACTIVE
+
+        # "b" arrive : "a" cède la partition, une mesure est publiée avant que "b" ne la prenne
+        assert await b.rebalance(redis_conn, pubsub_b) == set()
+        await a.rebalance(redis_conn, pubsub_a)
+        assert alerte_id not in a._states
+        with Session(db_engine) as db:
+            missed = _reading(db, capteur_id, 20.0, now + timedelta(seconds=10))
+        acquired = await b.rebalance(redis_conn, pubsub_b)
+        await b.replay(acquired)
+
+        with Session(db_engine) as db:
+            historique = db.execute(select(HistoriqueAlerte).where(HistoriqueAlerte.alerte_id == alerte_id)).scalar_one()
+            assert historique.resolue_a == now + timedelta(seconds=10)
+        assert alerte_id not in b._states and b.stats["resolutions"] == 1
+
+        # La même mesure reçue ensuite par le canal n'est pas réévaluée
+        mesures = b.stats["mesures"]
+        await b.handle_reading(capteur_id, 20.0, now + timedelta(seconds=10), missed)
+        assert b.stats["mesures"] == mesures
+
+    asyncio.run(scenario())
+
+def test_parent_on_another_partition_suppresses_child(env):
+    db_engine, redis_conn = env
+    with Session(db_engine) as db:
+        parent_sensor, child_sensor = _sensor(db, _space_owned_by("a")), _sensor(db, _space_owned_by("b"))
+        parent = Alerte(nom="ventilation", capteur_id=parent_sensor, condition="eq", seuil=0.0)
+        db.add(parent)
+        db.commit()
+        child = Alerte(nom="chaud", capteur_id=child_sensor, condition="gt", seuil=30.0, alerte_parente_id=parent.id)
+        db.add(child)
+        db.commit()
+        parent_id, child_id = parent.id, child.id
+    engine = AlertEngine()
+    now = datetime.utcnow()
+
+    async def scenario():
+        await engine.load()
+        engine.owned = {engine._slot(child_sensor)}
+        engine.correlator.load_topology(engine._owned_topology())
+        assert not engine.owns(parent_sensor)
+        await redis_conn.hset(STATES_KEY, str(parent_id), RuleState(ACTIVE, now, 1).to_json())
+        await engine.handle_reading(child_sensor, 35.0, now)
+        assert engine._states[child_id].etat == ACTIVE
+        assert engine.stats["supprimees"] == 1
+        assert await redis_conn.llen(notifications.QUEUE_KEY) == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,67 @@
+"""Tests de l'historique des alertes : curseur, pagination et noms joints"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlmodel import select
+
+from shared.models.alert import Alerte, HistoriqueAlerte
+from shared.models.node import NoeudArduino
+from shared.models.sensor import Capteur
+from shared.models.space import Espace
+from shared.utils.exceptions import ValidationException
+from services.alert_service.services.alert_service import AlertService, decode_cursor, encode_cursor
+
+def test_cursor_round_trip():
+    declenchee_a = datetime(2024, 5, 1, 12, 30, 15, 250000)
+    assert decode_cursor(encode_cursor(declenchee_a, 42)) == (declenchee_a, 42)
+
+@pytest.mark.parametrize("cursor", ["", "42", "hier_42", "2024-05-01T12:30:00_x"])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValidationException):
+        decode_cursor(cursor)
+
+def test_history_pages_through_equal_timestamps(test_db):
+    test_db.add(Espace(id=1, nom="serre nord", type="serre"))
+    noeud = NoeudArduino(nom="n1", espace_id=1, cle_api="k", statut="en_ligne")
+    test_db.add(noeud)
+    test_db.commit()
+    capteur = Capteur(nom="air", type="temperature_air", modele="DHT22", unite_mesure="°C", noeud_id=noeud.id)
+    test_db.add(capteur)
+    test_db.commit()
+    alerte = Alerte(nom="chaud", capteur_id=capteur.id, condition="gt", seuil=30.0)
+    test_db.add(alerte)
+    test_db.commit()
+    t0 = datetime(2024, 6, 1, 12, 0)
+    # Trois déclenchements à la même seconde, encadrés par deux autres
+    instants = [t0, t0 + timedelta(minutes=1), t0 + timedelta(minutes=1), t0 + timedelta(minutes=1), t0 + timedelta(minutes=2)]
+    test_db.add_all([
+        HistoriqueAlerte(alerte_id=alerte.id, declenchee_a=instant, statut="resolue" if i == 2 else "active")
+        for i, instant in enumerate(instants)
+    ])
+    test_db.commit()
+    service = AlertService(test_db)
+
+    seen, after = [], None
+    while True:
+        page = asyncio.run(service.get_history(after=after, per_page=1))
+        assert len(page.historique) == 1
+        seen.append(page.historique[0])
+        if page.next_cursor is None:
+            break
+        after = page.next_cursor
+    expected = test_db.execute(
+        select(HistoriqueAlerte.id).order_by(HistoriqueAlerte.declenchee_a.desc(), HistoriqueAlerte.id.desc())
+    ).scalars().all()
+    assert [h.id for h in seen] == expected
+    assert {(h.alerte_nom, h.capteur_nom, h.capteur_type, h.noeud_nom, h.espace_nom) for h in seen} == {
+        ("chaud", "air", "temperature_air", "n1", "serre nord")
+    }
+
+    resolues = asyncio.run(service.get_history(statut="resolue"))
+    assert [h.statut for h in resolues.historique] == ["resolue"] and resolues.next_cursor is None
+
+    alertes = asyncio.run(service.get_alerts()).alertes
+    assert [(a.nom, a.capteur_nom, a.capteur_unite, a.noeud_nom, a.espace_nom) for a in alertes] == [
+        ("chaud", "air", "°C", "n1", "serre nord")
+    ]
@@ -0,0 +1,121 @@
+"""Tests des notifications : mise en forme, regroupement, relances et reprise après arrêt"""
+import asyncio
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+from fakeredis import FakeAsyncRedis
+
+from shared.schemas.alert import AlerteNotification
+from services.alert_service.services.notifications import (
+    CLAIMED_KEY,
+    DISPATCHERS_KEY,
+    OUTBOX_KEY,
+    QUEUE_KEY,
+    NotificationDispatcher,
+    build_email,
+    settings,
+)
+
+def _notification(i):
+    return AlerteNotification(
+        alerte_id=i, alerte_nom=f"alerte {i}", capteur_nom="serre nord", valeur_actuelle=36.0, seuil=35.0,
+        condition="gt", declenchee_a=datetime(2024, 6, 1, 12, i), message=f"alerte {i}: 36.0 > 35.0",
+    )
+
+def test_single_alert_and_digest():
+    subject, body = build_email([_notification(1)])
+    assert subject == "[GardenConnect] Alerte : alerte 1"
+    assert "serre nord" in body and "12:01" in body
+
+    subject, body = build_email([_notification(i) for i in range(3)])
+    assert subject == "[GardenConnect] 3 alertes"
+    assert body.count("36.0 > 35.0") == 3
+
+class _Pool:
+    def __init__(self, fail=False):
+        self.fail, self.sent = fail, []
+
+    async def send(self, message):
+        if self.fail:
+            raise ConnectionError("smtp indisponible")
+        self.sent.append(message)
+
+def _alerte(i):
+    return SimpleNamespace(id=i, nom=f"alerte {i}", seuil=35.0, condition="gt")
+
+def _payload(i, minute):
+    return json.dumps({"alerte_id": i, "valeur": 36.0, "declenchee_a": f"2024-06-01T12:{minute:02d}:00"})
+
+def _envoi(attempt=0):
+    return json.dumps({"to": "a@x", "subject": "s", "body": "b", "attempt": attempt, "created": 0})
+
+def test_intake_digests_per_recipient(monkeypatch):
+    monkeypatch.setattr(settings, "notification_digest_window", 0)
+    dispatcher = NotificationDispatcher("a")
+    dispatcher._resolve = lambda ids: {
+        1: (_alerte(1), "serre nord", ["a@x", "b@x"]),
+        2: (_alerte(2), "serre sud", ["a@x"]),
+    }
+
+    async def scenario():
+        redis_conn = FakeAsyncRedis()
+        await redis_conn.lpush(QUEUE_KEY, _payload(1, 0), _payload(2, 1), _payload(1, 2), _payload(3, 3))
+        assert await dispatcher._intake(redis_conn) == 4
+        assert await redis_conn.llen(dispatcher.processing_key) == 0
+        await dispatcher._flush_digests(redis_conn)
+        envois = {e["to"]: e for _, e in await dispatcher._claim_due(redis_conn)}
+        assert envois["a@x"]["subject"] == "[GardenConnect] 3 alertes"
+        assert envois["b@x"]["subject"] == "[GardenConnect] 2 alertes"
+
+    asyncio.run(scenario())
+
+def test_failed_send_backs_off_then_is_acknowledged():
+    dispatcher = NotificationDispatcher("a")
+
+    async def scenario():
+        redis_conn = FakeAsyncRedis()
+        await redis_conn.zadd(OUTBOX_KEY, {_envoi(): 0})
+        [(raw, envoi)] = await dispatcher._claim_due(redis_conn)
+        await dispatcher._deliver(_Pool(fail=True), redis_conn, raw, envoi)
+        assert await redis_conn.zcard(CLAIMED_KEY) == 0
+        [(retry, due)] = await redis_conn.zrange(OUTBOX_KEY, 0, -1, withscores=True)
+        assert json.loads(retry)["attempt"] == 1
+        assert await dispatcher._claim_due(redis_conn, now=due - 1) == []
+
+        [(raw, envoi)] = await dispatcher._claim_due(redis_conn, now=due)
+        pool = _Pool()
+        await dispatcher._deliver(pool, redis_conn, raw, envoi)
+        assert len(pool.sent) == 1
+        assert await redis_conn.zcard(OUTBOX_KEY) == await redis_conn.zcard(CLAIMED_KEY) == 0
+
+        await redis_conn.zadd(OUTBOX_KEY, {_envoi(settings.max_notification_retries): 0})
+        [(raw, envoi)] = await dispatcher._claim_due(redis_conn)
+        await dispatcher._deliver(_Pool(fail=True), redis_conn, raw, envoi)
+        assert await redis_conn.zcard(OUTBOX_KEY) == await redis_conn.zcard(CLAIMED_KEY) == 0
+        assert dispatcher.stats["abandonnees"] == 1
+
+    asyncio.run(scenario())
+
+def test_work_of_a_stopped_instance_is_recovered():
+    crashed, survivor = NotificationDispatcher("a"), NotificationDispatcher("b")
+
+    async def scenario():
+        redis_conn = FakeAsyncRedis()
+        await crashed._heartbeat(redis_conn, now=1000)
+        await redis_conn.lpush(QUEUE_KEY, _payload(1, 0))
+        await redis_conn.lmove(QUEUE_KEY, crashed.processing_key, "RIGHT", "LEFT")
+        await redis_conn.zadd(OUTBOX_KEY, {_envoi(): 0})
+        assert len(await crashed._claim_due(redis_conn, now=1000)) == 1
+
+        # Instance encore présente : rien n'est repris
+        await survivor._heartbeat(redis_conn, now=1001)
+        assert await redis_conn.llen(QUEUE_KEY) == 0
+        assert await survivor._claim_due(redis_conn, now=1001) == []
+
+        await survivor._heartbeat(redis_conn, now=1001 + settings.alert_lease_ttl)
+        assert await redis_conn.lrange(QUEUE_KEY, 0, -1) == [_payload(1, 0).encode()]
+        assert await redis_conn.zscore(DISPATCHERS_KEY, "a") is None
+        assert len(await survivor._claim_due(redis_conn, now=1001 + settings.notification_claim_timeout)) == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,78 @@
+"""Tests de l'index des règles d'alerte"""
+import itertools
+import random
+from datetime import datetime
+
+import numpy as np
+
+from shared.models.alert import Alerte
+from services.alert_service.services.backtest import recovered_mask
+from services.alert_service.services.rule_index import OPERATORS, CompositeRule, Rule, RuleIndex, Term
+
+def test_index_evaluates_only_active_rules_of_the_sensor():
+    index = RuleIndex()
+    index.load([
+        Alerte(id=1, nom="chaud", capteur_id=1, condition="gt", seuil=30.0),
+        Alerte(id=2, nom="froid", capteur_id=1, condition="lte", seuil=5.0),
+        Alerte(id=3, nom="sec", capteur_id=2, condition="lt", seuil=20.0),
+        Alerte(id=4, nom="off", capteur_id=1, condition="gt", seuil=0.0, est_active=False),
+    ])
+    assert [r.id for r in index.evaluate(1, 31.0)] == [1]
+    assert [r.id for r in index.evaluate(1, 5.0)] == [2]
+    assert index.evaluate(3, 0.0) == []
+
+    # Rechargement à chaud : modification, désactivation
+    index.upsert(Alerte(id=1, nom="chaud", capteur_id=1, condition="gt", seuil=40.0))
+    index.upsert(Alerte(id=3, nom="sec", capteur_id=2, condition="lt", seuil=20.0, est_active=False))
+    assert index.evaluate(1, 31.0) == []
+    assert index.sensors() == [1] and len(index) == 2
+
+def test_transitions_match_a_full_evaluation():
+    rng = random.Random(7)
+    index = RuleIndex()
+    index.load([
+        Alerte(id=i, nom=f"r{i}", capteur_id=1, condition=rng.choice(["lt", "lte", "eq", "gte", "gt"]),
+               seuil=float(rng.randint(0, 20)))
+        for i in range(1, 200)
+    ])
+    previous = 10.0
+    for _ in range(500):
+        valeur = float(rng.randint(-2, 22))
+        before = {r.id for r in index.evaluate(1, previous)}
+        after = {r.id for r in index.evaluate(1, valeur)}
+        activated, deactivated = index.transitions(1, previous, valeur)
+        assert {r.id for r in activated} == after - before
+        assert {r.id for r in deactivated} == before - after
+        assert before == {r.id for r in index.rules(1) if r.matches(previous)}
+        previous = valeur
+
+def test_compiled_rules_match_the_reference_evaluation():
+    conditions = ["lt", "lte", "eq", "gte", "gt"]
+    valeurs = [x / 2 for x in range(-4, 25)]
+    for condition, hysteresis in itertools.product(conditions, (0.0, 1.5)):
+        rule = Rule(1, 1, "r", condition, 5.0, hysteresis)
+        recovered = recovered_mask(condition, 5.0, hysteresis, np.array(valeurs))
+        for v, expected in zip(valeurs, recovered.tolist()):
+            assert rule.matches(v) == OPERATORS[condition](v, 5.0)
+            assert rule.recovered(v) == expected
+    for (c1, c2), combinaison in itertools.product(itertools.product(conditions, repeat=2), ("and", "or")):
+        rule = CompositeRule(1, 1, "r", [Term(1, c1, 5.0), Term(2, c2, 8.0, "avg", 60)], combinaison, 1.0)
+        combine = all if combinaison == "and" else any
+        for pair in itertools.product(valeurs[::3], repeat=2):
+            assert rule.matches(pair) == combine(OPERATORS[c](v, s) for c, s, v in zip((c1, c2), (5.0, 8.0), pair))
+            assert rule.recovered(pair) == (not combine(
+                not recovered_mask(c, s, 1.0, np.float64(v)) for c, s, v in zip((c1, c2), (5.0, 8.0), pair)
+            ))
+
+def test_reload_recompiles_only_modified_rules():
+    created = datetime(2024, 6, 1)
+    alertes = [Alerte(id=i, nom=f"r{i}", capteur_id=1, condition="gt", seuil=float(i), date_creation=created)
+               for i in range(1, 11)]
+    index = RuleIndex()
+    index.load(alertes)
+    rule = index.get(3)
+    alertes[2] = Alerte(id=3, nom="r3", capteur_id=1, condition="lt", seuil=3.0, date_creation=created,
+                        date_modification=datetime(2024, 6, 2))
+    index.load(alertes[1:])
+    assert index.compilations == 11 and index.get(2) is not None and index.get(1) is None
+    assert index.get(3) is not rule and index.get(3).matches(2.0)
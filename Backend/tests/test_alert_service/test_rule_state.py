@@ -0,0 +1,24 @@
+"""Tests de la machine d'états des règles d'alerte"""
+from datetime import datetime, timedelta
+from services.alert_service.services.rule_index import Rule
+from services.alert_service.services.rule_state import ACTIVE, OK, OK_STATE, PENDING, RESOLVED, step
+
+def test_debounce_and_hysteresis():
+    rule = Rule(1, 1, "chaud", "gt", 30.0, hysteresis=2.0, duree_minimale=60)
+    t0 = datetime(2024, 6, 1, 12)
+    state = step(rule, OK_STATE, 31.0, t0)
+    assert state.etat == PENDING
+    # Retour sous le seuil avant la durée minimale : aucune écriture
+    assert step(rule, state, 29.0, t0 + timedelta(seconds=30)).etat == OK
+    state = step(rule, state, 31.5, t0 + timedelta(seconds=60))
+    assert state.etat == ACTIVE and state.depuis == t0
+
+    # Oscillation autour du seuil : reste active dans la bande
+    for valeur in (29.5, 30.5, 28.5):
+        assert step(rule, state, valeur, t0 + timedelta(minutes=5)) is state
+    resolved = step(rule, state, 28.0, t0 + timedelta(minutes=6))
+    assert resolved.etat == RESOLVED and resolved.depuis == t0 + timedelta(minutes=6)
+
+def test_state_round_trips_through_json():
+    state = step(Rule(2, 1, "froid", "lt", 5.0, duree_minimale=600), OK_STATE, 4.0, datetime(2024, 6, 1))
+    assert type(state).from_json(state.to_json()) == state
@@ -0,0 +1,19 @@
+"""Tests de la répartition des partitions entre instances du moteur d'alertes"""
+from shared.utils.sharding import assign_slots, space_slot
+
+def test_every_slot_has_exactly_one_owner():
+    owners = assign_slots(["a", "b", "c", "d"], 256)
+    slots = [slot for owned in owners.values() for slot in owned]
+    assert sorted(slots) == list(range(256))
+    assert all(32 <= len(owned) <= 96 for owned in owners.values())
+    assert assign_slots(["d", "c", "b", "a"], 256) == owners
+    assert 0 <= space_slot(12345, 256) < 256
+
+def test_join_and_leave_move_only_the_member_slots():
+    before = assign_slots(["a", "b", "c"], 256)
+    after = assign_slots(["a", "b", "c", "d"], 256)
+    for member in ("a", "b", "c"):
+        # Le nouveau membre ne prend que des partitions ; aucune ne passe entre anciens membres
+        assert after[member] <= before[member]
+    assert after["d"] == set().union(*(before[m] - after[m] for m in ("a", "b", "c")))
+    assert assign_slots(["a", "b", "c"], 256) == before
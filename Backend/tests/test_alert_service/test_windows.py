@@ -0,0 +1,35 @@
+"""Tests des fenêtres glissantes et des règles composites"""
+from datetime import datetime, timedelta
+from shared.models.alert import Alerte, ConditionAlerte
+from services.alert_service.services.rule_index import RuleIndex
+from services.alert_service.services.windows import SlidingWindow
+
+def test_sliding_window_matches_a_recomputation():
+    t0 = datetime(2024, 6, 1)
+    window = SlidingWindow(600, since=t0)
+    valeurs = [20.0, 25.0, 18.0, 30.0, 22.0, 19.0, 27.0, 21.0]
+    for i, valeur in enumerate(valeurs):
+        now = t0 + timedelta(seconds=150 * i)
+        window.push(now, valeur)
+        if now - t0 < timedelta(seconds=600):
+            assert window.value("avg", now) is None  # fenêtre pas encore couverte
+            continue
+        inside = valeurs[max(0, i - 4):i + 1]  # 600 s = 4 intervalles de 150 s
+        assert window.value("avg", now) == sum(inside) / len(inside)
+        assert window.value("min", now) == min(inside)
+        assert window.value("max", now) == max(inside)
+        assert window.value("rate", now) == (inside[-1] - inside[0]) * 3600 / 600
+
+def test_composite_rule_across_sensors():
+    alerte = Alerte(
+        id=1, nom="canicule", capteur_id=1, condition="gt", seuil=35.0, combinaison="and", hysteresis=1.0,
+        conditions=[ConditionAlerte(capteur_id=2, condition="lt", seuil=40.0, agregation="avg", fenetre=7200)],
+    )
+    index = RuleIndex()
+    index.load([alerte])
+    rule = index.get(1)
+    assert index.derived(2) == [rule] and index.windows() == {(2, 7200)}
+    assert index.evaluate(1, 36.0) == []  # pas dans les tableaux de seuils
+    assert rule.matches([36.0, 35.0]) and not rule.matches([36.0, 45.0])
+    assert not rule.recovered([34.5, 35.0])  # dans la bande d'hystérésis
+    assert rule.recovered([33.9, 35.0]) and rule.recovered([36.0, 41.5])
@@ -0,0 +1,19 @@
+"""Tests de l'alignement multi-capteurs"""
+import numpy as np
+from services.data_service.services.alignment import align, fill_gaps
+
+def test_align_places_buckets_in_request_order():
+    grid = np.arange(0, 600, 60)
+    matrix = align([7, 3], np.array([3, 7, 7, 9]), np.array([0, 60, 540, 60]), np.array([1.0, 2.0, 3.0, 4.0]), grid)
+    assert matrix.shape == (10, 2)
+    assert matrix[0, 1] == 1.0 and matrix[1, 0] == 2.0 and matrix[9, 0] == 3.0
+    assert np.isnan(matrix).sum() == 17  # capteur 9 non demandé
+
+def test_fill_strategies():
+    column = np.array([[np.nan], [1.0], [np.nan], [np.nan], [4.0], [np.nan]])
+    assert np.isnan(fill_gaps(column, "null")).sum() == 4
+    locf = fill_gaps(column, "locf")[:, 0]
+    assert np.isnan(locf[0]) and locf[1:].tolist() == [1.0, 1.0, 1.0, 4.0, 4.0]
+    linear = fill_gaps(column, "linear")[:, 0]
+    assert linear[1:5].tolist() == [1.0, 2.0, 3.0, 4.0]
+    assert np.isnan(linear[0]) and np.isnan(linear[5])
@@ -0,0 +1,43 @@
+"""Tests de l'encodage des blocs compressés"""
+import numpy as np
+import pytest
+from shared.utils.block_codec import decode_block, encode_block
+
+def test_block_roundtrip_is_lossless_and_compact():
+    rng = np.random.default_rng(0)
+    n = 8640
+    ts = 1_700_000_000_000_000 + np.arange(n, dtype=np.int64) * 10_000_000 + rng.integers(-500, 500, n)
+    values = np.round(20 + 5 * np.sin(np.arange(n) / 500), 1)
+    values[4000:4100] = values[4000]  # valeur stable
+    batteries = np.where(np.arange(n) % 7 == 0, np.nan, 91.5)
+    ids = np.arange(n, dtype=np.int64) * 3 + 17
+
+    data = encode_block(ts, values, ids, batteries)
+    decoded = decode_block(data)
+
+    assert np.array_equal(decoded[0], ts)
+    assert np.array_equal(decoded[1], values)
+    assert np.array_equal(decoded[2], ids)
+    assert np.array_equal(decoded[3], batteries, equal_nan=True)
+    assert len(data) < n * 3  # une ligne brute coûte plus de 100 octets avec ses index
+
+def test_empty_and_single_point_blocks():
+    assert len(decode_block(encode_block(np.array([]), np.array([]), np.array([]), np.array([])))[0]) == 0
+    ts, values, ids, batteries = decode_block(encode_block(np.array([-5]), np.array([1.5]), np.array([2]), np.array([np.nan])))
+    assert ts.tolist() == [-5] and values.tolist() == [1.5] and ids.tolist() == [2] and np.isnan(batteries[0])
+
+def test_unscaled_and_extreme_values_roundtrip():
+    values = np.array([0.1 + 0.2, -0.0, np.inf, 1e300, -7.25, np.nan])
+    ts = np.array([-2**63, 2**63 - 1, 0, 5, 5, 6], dtype=np.int64)
+    ids = np.array([2**62, 1, 2, 3, 4, 5], dtype=np.int64)
+    batteries = np.full(6, np.nan)
+    decoded = decode_block(encode_block(ts, values, ids, batteries))
+    assert np.array_equal(decoded[0], ts) and np.array_equal(decoded[2], ids)
+    assert np.array_equal(decoded[1].view(np.uint64), values.view(np.uint64))
+    assert np.isnan(decoded[3]).all()
+
+def test_unknown_version_is_rejected():
+    data = bytearray(encode_block(np.array([0]), np.array([1.5]), np.array([1]), np.array([np.nan])))
+    data[0] = 1
+    with pytest.raises(ValueError):
+        decode_block(bytes(data))
@@ -0,0 +1,29 @@
+"""Tests du sous-échantillonnage des séries"""
+import numpy as np
+from services.data_service.services.downsampling import lttb, minmax
+
+def test_lttb_keeps_bounds_and_size():
+    x = np.arange(10000, dtype=np.float64)
+    y = np.sin(x / 100)
+    indices = lttb(x, y, 100)
+    assert len(indices) == 100
+    assert indices[0] == 0 and indices[-1] == 9999
+    assert np.all(np.diff(indices) > 0)
+
+def test_minmax_keeps_short_spike():
+    x = np.arange(10000, dtype=np.float64)
+    y = np.full(10000, 20.0)
+    y[4321] = -3.0  # gel de quelques minutes
+    indices = minmax(x, y, 50)
+    assert len(indices) <= 50
+    assert 4321 in indices
+
+def test_minmax_small_threshold_still_reduces():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.full(1000, 20.0)
+    y[321] = 35.0
+    assert list(minmax(x, y, 3)) == [0, 321, 999]
+
+def test_small_series_unchanged():
+    x = np.arange(5, dtype=np.float64)
+    assert list(lttb(x, x, 10)) == [0, 1, 2, 3, 4]
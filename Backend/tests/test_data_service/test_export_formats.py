@@ -0,0 +1,84 @@
+"""Tests des formats d'export, mesures brutes et blocs compactés confondus"""
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import openpyxl
+import pyarrow.parquet as pq
+import pytest
+from sqlmodel import select
+
+from shared.models.node import NoeudArduino
+from shared.models.sensor import Capteur, DonneesCapteur, DonneesCapteurBloc
+from shared.models.space import Espace
+from shared.schemas.sensor import DataExportParams
+from services.data_service.services import compaction_service, export_service
+from services.data_service.services.compaction_service import CompactionService
+from services.data_service.services.export_service import ExportService
+
+NOW = datetime(2024, 6, 20, 12, 0)
+
+@pytest.fixture
+def dataset(test_db, monkeypatch):
+    """Deux capteurs ; les mesures de plus de 7 jours du premier sont compactées"""
+    monkeypatch.setattr(compaction_service.settings, "compaction_enabled", True)
+    monkeypatch.setattr(export_service.settings, "export_chunk_size", 3)
+    test_db.add(Espace(id=1, nom="serre", type="serre"))
+    noeud = NoeudArduino(nom="n1", espace_id=1, cle_api="k", statut="en_ligne")
+    test_db.add(noeud)
+    test_db.commit()
+    air, sol = (
+        Capteur(nom=nom, type=type_, modele="DHT22", unite_mesure="°C", noeud_id=noeud.id)
+        for nom, type_ in (("air", "temperature_air"), ("sol", "temperature_sol"))
+    )
+    test_db.add_all([air, sol])
+    test_db.commit()
+    readings = [
+        DonneesCapteur(capteur_id=air.id, valeur=20.5 + i, horodatage=NOW - timedelta(days=10, hours=i), niveau_batterie=90.0)
+        for i in range(4)
+    ] + [
+        DonneesCapteur(capteur_id=air.id, valeur=25.0 + i, horodatage=NOW - timedelta(hours=i)) for i in range(2)
+    ] + [
+        DonneesCapteur(capteur_id=sol.id, valeur=12.25 + i, horodatage=NOW - timedelta(hours=i), niveau_batterie=80.0)
+        for i in range(3)
+    ]
+    test_db.add_all(readings)
+    test_db.commit()
+    expected = sorted(
+        (r.capteur_id, r.horodatage, r.valeur, r.niveau_batterie,
+         "air" if r.capteur_id == air.id else "sol",
+         "temperature_air" if r.capteur_id == air.id else "temperature_sol", "°C", "n1")
+        for r in readings
+    )
+
+    assert CompactionService(test_db.get_bind()).compact(now=NOW)["mesures"] == 4
+    assert len(test_db.execute(select(DonneesCapteurBloc)).all()) == 1
+    params = dict(capteurs_ids=[air.id, sol.id], start=NOW - timedelta(days=30), end=NOW + timedelta(hours=1))
+    return ExportService(test_db), params, expected
+
+def _read_back(export_format, data):
+    if export_format == "csv":
+        rows = list(csv.reader(io.StringIO(data.decode("utf-8"))))[1:]
+        return [
+            (int(r[0]), datetime.fromisoformat(r[1]), float(r[2]), float(r[3]) if r[3] else None, *r[4:])
+            for r in rows
+        ]
+    if export_format in ("json", "ndjson"):
+        objects = json.loads(data) if export_format == "json" else [json.loads(line) for line in data.splitlines()]
+        for o in objects:
+            o["horodatage"] = datetime.fromisoformat(o["horodatage"])
+        return [(*o.values(),) for o in objects]
+    if export_format == "parquet":
+        return [tuple(row.values()) for row in pq.read_table(io.BytesIO(data)).to_pylist()]
+    sheet = openpyxl.load_workbook(io.BytesIO(data), read_only=True)["donnees"]
+    return [tuple(row) for row in sheet.iter_rows(min_row=2, values_only=True)]
+
+@pytest.mark.parametrize("export_format", ["csv", "json", "ndjson", "parquet", "xlsx"])
+def test_export_formats_round_trip(dataset, export_format):
+    service, params, expected = dataset
+    exported = []
+    data = b"".join(service.stream(DataExportParams(format=export_format, **params), exported.append))
+    assert sorted(_read_back(export_format, data)) == expected
+    assert sum(exported) == len(expected) and max(exported) <= 3
+    assert service.count(DataExportParams(format=export_format, **params)) == len(expected)
@@ -0,0 +1,61 @@
+"""Tests du quota, de la purge et du téléchargement des jobs d'export"""
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from shared.schemas.sensor import DataExportParams
+from shared.utils.exceptions import RateLimitException
+from services.data_service.routes import exports
+from services.data_service.services import export_job_service
+from services.data_service.services.export_job_service import ExportJob, ExportJobService
+
+MB = 1024 * 1024
+
+@pytest.fixture
+def export_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_job_service.settings, "export_dir", str(tmp_path))
+    monkeypatch.setattr(export_job_service.settings, "export_disk_quota_mb", 3)
+    monkeypatch.setattr(export_job_service.settings, "export_job_max_size_mb", 2)
+    return tmp_path
+
+def _job():
+    return ExportJob(DataExportParams(capteurs_ids=[1], start=datetime(2024, 1, 1), end=datetime(2024, 2, 1)), user_id=1)
+
+def test_reservations_share_the_quota(export_dir):
+    (export_dir / "ancien.csv").write_bytes(b"x" * (MB // 2))
+    service = ExportJobService()
+    first, second = _job(), _job()
+    service._reserve(first)
+    service._reserve(second)
+    assert first.reserve == 2 * MB and second.reserve == MB // 2
+    with pytest.raises(RateLimitException):
+        service._reserve(_job())
+    first.reserve = 0  # terminé : seul son fichier (absent) compte désormais
+    service._reserve(_job())
+
+def test_purge_sweeps_untracked_files_by_mtime(export_dir):
+    service = ExportJobService()
+    orphan, recent = export_dir / "orphelin.csv", export_dir / "recent.csv"
+    orphan.write_bytes(b"x")
+    recent.write_bytes(b"x")
+    old = time.time() - 25 * 3600
+    os.utime(orphan, (old, old))
+    service.purge_expired(datetime.utcnow())
+    assert not orphan.exists() and recent.exists()
+
+def test_expired_export_is_gone_before_purge(export_dir, monkeypatch):
+    service = ExportJobService()
+    monkeypatch.setattr(exports, "export_jobs", service)
+    job = _job()
+    job.statut, job.expires_at = "termine", datetime.utcnow() - timedelta(seconds=1)
+    service.jobs[job.id] = job
+    with open(job.path, "wb") as f:
+        f.write(b"x")
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(exports.download_export(job.id, None, current_user=SimpleNamespace(id=1)))
+    assert excinfo.value.status_code == 410
@@ -0,0 +1,34 @@
+"""Tests du préchauffage du cache des dernières valeurs"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from shared.models.sensor import DonneesCapteur, DonneesCapteurBloc
+from shared.utils.block_codec import encode_block
+from shared.utils.series import to_us
+from services.data_service.services.last_value_cache import LastValueCache
+
+def _bloc(capteur_id, horodatages, valeurs):
+    ts = np.array([to_us(h) for h in horodatages], dtype=np.int64)
+    return DonneesCapteurBloc(
+        capteur_id=capteur_id, jour=horodatages[0].date(), debut=horodatages[0], fin=horodatages[-1],
+        nombre=len(ts), valeur_min=min(valeurs), valeur_max=max(valeurs),
+        donnees=encode_block(ts, np.array(valeurs), np.arange(len(ts)), np.full(len(ts), np.nan)),
+    )
+
+def test_warm_falls_back_to_latest_block(test_db):
+    day = datetime(2024, 6, 1)
+    test_db.add_all([
+        # Capteur 1 : mesures brutes récentes et un bloc ancien
+        DonneesCapteur(capteur_id=1, valeur=21.0, horodatage=day + timedelta(days=10)),
+        _bloc(1, [day, day + timedelta(hours=1)], [5.0, 6.0]),
+        # Capteur 2 : tout est compacté, le bloc le plus récent fait foi
+        _bloc(2, [day, day + timedelta(hours=2)], [1.0, 2.0]),
+        _bloc(2, [day + timedelta(days=1), day + timedelta(days=1, hours=3)], [3.0, 4.5]),
+    ])
+    test_db.commit()
+
+    cache = LastValueCache()
+    assert cache.warm(test_db) == 2
+    assert cache.get(1) == (21.0, day + timedelta(days=10))
+    assert cache.get(2) == (4.5, day + timedelta(days=1, hours=3))
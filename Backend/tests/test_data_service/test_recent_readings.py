@@ -0,0 +1,42 @@
+"""Tests du tampon des mesures récentes"""
+from datetime import datetime, timedelta
+from services.data_service.services.recent_readings import RecentReadings
+
+def test_ring_keeps_newest_points_and_tracks_coverage():
+    now = datetime.utcnow()
+    buffer = RecentReadings(window_hours=24, max_points=300, memory_mb=8)
+    buffer.load([], now - timedelta(seconds=1))
+    for k in range(1000):
+        buffer.append(1, k, float(k), now + timedelta(seconds=k))
+    buffer.append(1, 1000, -1.0, now + timedelta(seconds=998, milliseconds=500))  # en retard
+
+    assert buffer.covers([1, 2], now + timedelta(seconds=700))
+    assert not buffer.covers([1], now)
+    assert buffer.covers([2], now)  # aucun point pour ce capteur depuis le chargement
+    [(capteur_id, ts, values, ids, _)] = buffer.query([1], now + timedelta(seconds=997), None)
+    assert capteur_id == 1
+    assert ids.tolist() == [997, 998, 1000, 999]
+    assert (ts[1:] >= ts[:-1]).all()
+
+def test_appends_during_load_are_replayed_once():
+    now = datetime.utcnow()
+    buffer = RecentReadings(window_hours=24, max_points=300, memory_mb=8)
+    generation = buffer.begin_load()
+    buffer.append(1, 2, 2.0, now - timedelta(seconds=20))  # déjà lue en base
+    buffer.append(1, 3, 3.0, now - timedelta(seconds=10))  # ingérée pendant le chargement
+    assert not buffer.covers([1], now - timedelta(hours=1))
+    rows = [(1, 1, 1.0, now - timedelta(seconds=30), None), (2, 1, 2.0, now - timedelta(seconds=20), None)]
+    buffer.load(rows, now - timedelta(seconds=1), generation)
+    buffer.append(1, 1, 1.0, now - timedelta(seconds=30))  # redistribution en retard
+    buffer.append(1, 3, 3.0, now - timedelta(seconds=10))
+
+    [(_, _, _, ids, _)] = buffer.query([1], now - timedelta(hours=1), None)
+    assert ids.tolist() == [1, 2, 3]
+
+def test_stale_load_is_discarded():
+    now = datetime.utcnow()
+    buffer = RecentReadings(window_hours=24, max_points=300, memory_mb=8)
+    stale = buffer.begin_load()
+    buffer.invalidate()
+    buffer.load([(1, 1, 1.0, now, None)], now, stale)
+    assert not buffer.ready
@@ -0,0 +1,19 @@
+"""Tests des statistiques cumulées"""
+import numpy as np
+from services.data_service.services.running_stats import RunningStats
+
+def test_merge_and_remove_match_direct_computation():
+    values = np.random.default_rng(5).normal(18, 4, 1000)
+    stats = RunningStats()
+    for chunk in np.array_split(values, 37):
+        stats.merge(RunningStats.from_values(chunk))
+    assert stats.count == 1000
+    assert np.isclose(stats.mean, values.mean()) and np.isclose(stats.variance, values.var(ddof=1))
+    assert (stats.min, stats.max) == (values.min(), values.max())
+
+    # Remplacer une heure par sa version recalculée (mesure en retard ajoutée)
+    hour = values[:100]
+    stats.remove(RunningStats.from_values(hour)).merge(RunningStats.from_values(np.append(hour, 30.0)))
+    expected = np.append(values, 30.0)
+    assert stats.count == 1001
+    assert np.isclose(stats.mean, expected.mean()) and np.isclose(stats.variance, expected.var(ddof=1))
@@ -0,0 +1,37 @@
+"""Tests des statistiques cumulées et de la suppression d'un capteur"""
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlmodel import select
+
+from shared.models.node import NoeudArduino
+from shared.models.space import Espace, EspaceHierarchie
+from shared.models.sensor import Capteur, DonneesCapteur, DonneesCapteurRollup, StatistiqueCapteur
+from services.data_service.services.rollup_service import RollupService
+from services.data_service.services.sensor_service import SensorService
+
+def test_stats_rows_only_for_sensors_with_readings_and_removed_on_delete(test_db):
+    test_db.add(Espace(id=1, nom="serre", type="serre"))
+    test_db.add(EspaceHierarchie(ancetre_id=1, descendant_id=1, profondeur=0))
+    noeud = NoeudArduino(nom="n1", espace_id=1, cle_api="k", statut="en_ligne")
+    test_db.add(noeud)
+    test_db.commit()
+    actif, muet = (
+        Capteur(nom=nom, type="temperature_air", modele="DHT22", unite_mesure="°C", noeud_id=noeud.id)
+        for nom in ("actif", "muet")
+    )
+    test_db.add_all([actif, muet])
+    test_db.commit()
+    now = datetime.utcnow().replace(minute=30, second=0, microsecond=0)
+    test_db.add_all([
+        DonneesCapteur(capteur_id=actif.id, valeur=20.0 + i, horodatage=now - timedelta(hours=3, minutes=i))
+        for i in range(5)
+    ])
+    test_db.commit()
+
+    RollupService(test_db.get_bind()).refresh(now=now)
+    assert test_db.execute(select(StatistiqueCapteur.capteur_id)).scalars().all() == [actif.id]
+
+    asyncio.run(SensorService(test_db).delete_sensor(actif.id))
+    for model in (StatistiqueCapteur, DonneesCapteurRollup, DonneesCapteur):
+        assert test_db.execute(select(model)).first() is None
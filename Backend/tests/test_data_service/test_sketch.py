@@ -0,0 +1,18 @@
+"""Tests des esquisses de quantiles"""
+import numpy as np
+from services.data_service.services.sketch import RELATIVE_ACCURACY, DDSketch
+
+def test_merged_sketches_keep_relative_accuracy():
+    values = np.random.default_rng(3).normal(10, 15, 50000)  # valeurs négatives et positives
+    parts = [DDSketch.from_bytes(DDSketch.from_values(chunk).to_bytes()) for chunk in np.array_split(values, 100)]
+    sketch = DDSketch.merged(parts)
+    assert sketch.count == len(values)
+    assert sketch.quantiles([0, 1]) == [values.min(), values.max()]
+    for q, estimate in zip([0.05, 0.5, 0.95], sketch.quantiles([0.05, 0.5, 0.95])):
+        exact = np.quantile(values, q, method="lower")
+        assert abs(estimate - exact) <= 2 * RELATIVE_ACCURACY * abs(exact) + 0.05
+
+def test_histogram_counts_every_value():
+    sketch = DDSketch.from_values(np.array([0.0, 1.0, 1.0, 2.5, 9.0]))
+    assert sketch.histogram(np.linspace(0, 10, 6)).tolist() == [3, 1, 0, 0, 1]
+    assert DDSketch.empty().quantiles([0.5]) == [None]
@@ -0,0 +1,54 @@
+"""Tests de l'accès aux espaces selon les appartenances"""
+import asyncio
+
+import pytest
+
+from shared.models.space import EspaceUtilisateur
+from shared.schemas.space import EspaceCreate
+from shared.utils.exceptions import AuthorizationException
+from services.data_service.services.space_service import SpaceService
+
+def _create(service, nom, parent=None):
+    data = EspaceCreate(nom=nom, type="serre", espace_parent_id=parent.id if parent else None)
+    return asyncio.run(service.create_space(data, user_id=1))
+
+@pytest.fixture
+def farm(test_db):
+    """Deux arbres : ferme > serre > rang et champ > parcelle ; l'utilisateur 7 est membre de la serre"""
+    service = SpaceService(test_db)
+    ferme, champ = _create(service, "ferme"), _create(service, "champ")
+    serre = _create(service, "serre", ferme)
+    rang = _create(service, "rang", serre)
+    parcelle = _create(service, "parcelle", champ)
+    test_db.add(EspaceUtilisateur(id=1, utilisateur_id=7, espace_id=serre.id, role_id=1))
+    test_db.commit()
+    return service, {e.nom: e.id for e in (ferme, champ, serre, rang, parcelle)}
+
+def test_member_sees_own_spaces_and_descendants_only(farm):
+    service, ids = farm
+    page = asyncio.run(service.get_user_spaces(7))
+    assert [e.id for e in page.espaces] == [ids["serre"], ids["rang"]]
+    assert page.total == 2 and page.next_cursor is None
+
+    asyncio.run(service.check_access(ids["rang"], 7))
+    for nom in ("ferme", "champ", "parcelle"):
+        with pytest.raises(AuthorizationException):
+            asyncio.run(service.check_access(ids[nom], 7))
+
+def test_admin_sees_every_space(farm):
+    service, ids = farm
+    page = asyncio.run(service.get_user_spaces(1, is_admin=True))
+    assert sorted(e.id for e in page.espaces) == sorted(ids.values())
+    asyncio.run(service.check_access(ids["parcelle"], 1, is_admin=True))
+
+def test_cursor_walks_every_page_once(farm):
+    service, ids = farm
+    seen, after = [], None
+    while True:
+        page = asyncio.run(service.get_user_spaces(1, is_admin=True, after=after, per_page=2))
+        assert page.total == len(ids)
+        seen.extend(e.id for e in page.espaces)
+        if page.next_cursor is None:
+            break
+        after = page.next_cursor
+    assert seen == sorted(ids.values())
@@ -0,0 +1,20 @@
+"""Tests de la vérification des compteurs par espace"""
+from shared.models.node import NoeudArduino
+from shared.models.space import CompteurEspace, Espace, EspaceHierarchie
+from shared.utils.space_counters import get_space_counters, reconcile_space_counters
+
+def test_reconcile_corrects_drift_as_a_delta(test_db):
+    test_db.add_all([Espace(id=1, nom="ferme", type="exploitation"), Espace(id=2, nom="serre", type="serre")])
+    test_db.add_all([
+        EspaceHierarchie(ancetre_id=1, descendant_id=1, profondeur=0),
+        EspaceHierarchie(ancetre_id=2, descendant_id=2, profondeur=0),
+        EspaceHierarchie(ancetre_id=1, descendant_id=2, profondeur=1),
+    ])
+    test_db.add(CompteurEspace(espace_id=1, nombre_noeuds=5))  # dérive ; espace 2 sans ligne
+    test_db.add(NoeudArduino(nom="n1", espace_id=2, cle_api="k", statut="en_ligne"))
+    test_db.commit()
+
+    assert reconcile_space_counters(test_db) == 2
+    assert get_space_counters(test_db, 1) == (1, 0, 0)
+    assert get_space_counters(test_db, 2) == (1, 0, 0)
+    assert reconcile_space_counters(test_db) == 0
@@ -0,0 +1,64 @@
+"""Tests de la table de fermeture de la hiérarchie des espaces"""
+import asyncio
+
+import pytest
+from sqlmodel import select
+
+from shared.models.space import EspaceHierarchie
+from shared.schemas.space import EspaceCreate, EspaceUpdate
+from shared.utils.exceptions import SpaceHierarchyException
+from services.data_service.services.space_service import SpaceService
+
+def _create(service, nom, parent=None):
+    data = EspaceCreate(nom=nom, type="serre", espace_parent_id=parent.id if parent else None)
+    return asyncio.run(service.create_space(data, user_id=1))
+
+def _links(db):
+    rows = db.execute(select(EspaceHierarchie.ancetre_id, EspaceHierarchie.descendant_id, EspaceHierarchie.profondeur))
+    return set(rows.all())
+
+def test_create_links_to_all_ancestors(test_db):
+    service = SpaceService(test_db)
+    ferme = _create(service, "ferme")
+    serre = _create(service, "serre", ferme)
+    rang = _create(service, "rang", serre)
+    assert _links(test_db) == {
+        (ferme.id, ferme.id, 0), (serre.id, serre.id, 0), (rang.id, rang.id, 0),
+        (ferme.id, serre.id, 1), (serre.id, rang.id, 1), (ferme.id, rang.id, 2),
+    }
+
+def test_move_subtree_relinks_descendants(test_db):
+    service = SpaceService(test_db)
+    ferme, champ = _create(service, "ferme"), _create(service, "champ")
+    serre = _create(service, "serre", ferme)
+    rang = _create(service, "rang", serre)
+    asyncio.run(service.update_space(serre.id, EspaceUpdate(espace_parent_id=champ.id), user_id=1))
+    assert _links(test_db) == {
+        (ferme.id, ferme.id, 0), (champ.id, champ.id, 0), (serre.id, serre.id, 0), (rang.id, rang.id, 0),
+        (champ.id, serre.id, 1), (serre.id, rang.id, 1), (champ.id, rang.id, 2),
+    }
+    asyncio.run(service.update_space(serre.id, EspaceUpdate(espace_parent_id=None), user_id=1))
+    assert _links(test_db) == {
+        (ferme.id, ferme.id, 0), (champ.id, champ.id, 0), (serre.id, serre.id, 0), (rang.id, rang.id, 0),
+        (serre.id, rang.id, 1),
+    }
+
+def test_move_under_own_descendant_is_rejected(test_db):
+    service = SpaceService(test_db)
+    ferme = _create(service, "ferme")
+    serre = _create(service, "serre", ferme)
+    rang = _create(service, "rang", serre)
+    before = _links(test_db)
+    for moved, target in ((serre, rang), (ferme, rang), (ferme, ferme)):
+        with pytest.raises(SpaceHierarchyException):
+            asyncio.run(service.update_space(moved.id, EspaceUpdate(espace_parent_id=target.id), user_id=1))
+    assert _links(test_db) == before
+
+def test_delete_removes_links_and_refuses_parents(test_db):
+    service = SpaceService(test_db)
+    ferme = _create(service, "ferme")
+    serre = _create(service, "serre", ferme)
+    with pytest.raises(SpaceHierarchyException):
+        asyncio.run(service.delete_space(ferme.id, user_id=1))
+    asyncio.run(service.delete_space(serre.id, user_id=1))
+    assert _links(test_db) == {(ferme.id, ferme.id, 0)}
@@ -0,0 +1,20 @@
+"""Tests du hub de diffusion en direct"""
+import asyncio
+from services.data_service.services.stream_hub import StreamHub
+
+def test_deliver_routes_by_sensor_and_drops_oldest():
+    async def scenario():
+        hub = StreamHub()
+        slow = hub.subscribe([1, 2], maxsize=2)
+        other = hub.subscribe([3], maxsize=2)
+        for valeur in (1.0, 2.0, 3.0):
+            hub.deliver({"capteur_id": 1, "valeur": valeur})
+        assert not other.queue
+        assert slow.take_dropped() == 1
+        assert (await slow.get(0.1))["valeur"] == 2.0
+        assert (await slow.get(0.1))["valeur"] == 3.0
+        assert await slow.get(0.01) is None
+        hub.unsubscribe(slow)
+        hub.deliver({"capteur_id": 1, "valeur": 4.0})
+        assert not slow.queue
+    asyncio.run(scenario())
@@ -0,0 +1,42 @@
+"""Tests des règles du conseiller d'index"""
+from scripts.index_advisor import drop_statement, find_redundant, find_unused
+
+def _index(name, keys, table="donnees_capteurs", scans=10, size=8192, options=None, **flags):
+    return {
+        "table_name": table, "index_name": name, "scans": scans, "size": size,
+        "is_primary": flags.get("is_primary", False), "is_unique": flags.get("is_unique", False),
+        "is_partial": flags.get("is_partial", False), "on_partitioned": flags.get("on_partitioned", False),
+        "keys": keys, "options": options or " ".join("0" for _ in keys.split()),
+    }
+
+def test_unused_keeps_primary_unique_and_small_indexes():
+    indexes = [
+        _index("idx_inutile", "2", scans=0),
+        _index("idx_petit", "3", scans=0, size=1024),
+        _index("idx_utilise", "4", scans=3),
+        _index("pk", "1", scans=0, is_primary=True),
+        _index("uq", "2 4", scans=0, is_unique=True),
+    ]
+    assert [i["index_name"] for i in find_unused(indexes, min_size=4096)] == ["idx_inutile"]
+
+def test_redundant_prefixes_and_duplicates():
+    indexes = [
+        _index("idx_capteur", "2"),
+        _index("idx_capteur_horodatage", "2 3"),
+        _index("idx_b_doublon", "4 3"),
+        _index("idx_a_doublon", "4 3"),
+        _index("idx_capteur_desc", "2", options="3"),  # ordre de tri différent
+        _index("uq_capteur", "2", is_unique=True),
+        _index("idx_partiel", "5 2", is_partial=True),
+        _index("idx_noeud", "5"),  # seul index complet sur 5 : le partiel ne le couvre pas
+        _index("idx_autre_table", "2", table="capteurs"),
+    ]
+    assert {(i["index_name"], i["covered_by"]) for i in find_redundant(indexes)} == {
+        ("idx_capteur", "idx_capteur_horodatage"),
+        ("idx_b_doublon", "idx_a_doublon"),
+    }
+
+def test_drop_is_concurrent_unless_partitioned_or_hypertable():
+    assert drop_statement(_index("idx_a", "2"), set()) == "DROP INDEX CONCURRENTLY IF EXISTS idx_a;"
+    assert drop_statement(_index("idx_b", "2", on_partitioned=True), set()) == "DROP INDEX IF EXISTS idx_b;"
+    assert drop_statement(_index("idx_c", "2"), {"donnees_capteurs"}) == "DROP INDEX IF EXISTS idx_c;"